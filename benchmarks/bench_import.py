@@ -0,0 +1,68 @@
+"""
+    Title: bench_import.py
+    Author: Ashley Williams
+    Description: Measures how long it takes to import coast_search and its
+    most used submodules in a fresh interpreter, using python -X importtime.
+    Short-lived jobs that only generate queries or post-process results spend
+    much of their time importing, so these should stay well below the cost of
+    importing the Google API client.
+
+    Usage: python benchmarks/bench_import.py [--repeat N] [--max-ms MS]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    "coast_search",
+    "coast_search.query_generator",
+    "coast_search.streaming",
+    "coast_search.search",
+    "googleapiclient.discovery"
+]
+
+
+def import_time(module):
+    """
+        Imports a module in a new interpreter.
+        Args:
+            module: The name of the module to import.
+        Returns:
+            seconds: the cumulative import time of the module, as reported by -X importtime.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True
+    ).stderr
+
+    for line in reversed(output.splitlines()):
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000000.0
+
+    raise Exception("No import time reported for " + module)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure coast_search import times.")
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module; the median is reported")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="exit with an error if any coast_search module takes longer than this")
+    args = parser.parse_args(argv)
+
+    too_slow = []
+    for module in MODULES:
+        median_ms = statistics.median(import_time(module) for _ in range(args.repeat)) * 1000
+        print("{0:<32} {1:8.1f} ms".format(module, median_ms))
+        if args.max_ms is not None and module.startswith("coast_search") and median_ms > args.max_ms:
+            too_slow.append(module)
+
+    if too_slow:
+        print("Slower than {0} ms: {1}".format(args.max_ms, ", ".join(too_slow)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
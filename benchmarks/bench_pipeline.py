@@ -0,0 +1,63 @@
+"""
+    Title: bench_pipeline.py
+    Author: Ashley Williams
+    Description: Benchmarks of searching, from the queries to the extracted
+    results, against the local mock server (see coast_search.mock_server), so
+    the threaded and async engines can be compared without spending quota or
+    needing a network.
+
+    Usage: make bench
+"""
+import asyncio
+import importlib.util
+import shutil
+import tempfile
+
+import pytest
+
+from coast_search import async_search
+from coast_search import clients
+from coast_search import mock_server
+from coast_search import search
+
+pytest.importorskip("pytest_benchmark")
+
+SEGMENTS = 5
+RUNS = 2
+RESULTS = 30
+# roughly the latency of a real call
+LATENCY = 0.02
+
+QUERIES = [{"segment_id": segment_id, "query": '("software" OR "segment{0}")'.format(segment_id),
+            "api_key": "key", "search_engine_id": "cx"} for segment_id in range(SEGMENTS)]
+PAGES = SEGMENTS * RUNS * len(search.page_starts(RESULTS))
+
+
+@pytest.fixture(scope="module")
+def server():
+    with mock_server.MockSearchServer(latency=LATENCY) as running:
+        clients.set_root_url(running.url)
+        yield running
+    clients.set_root_url(None)
+
+
+@pytest.fixture
+def backup_dir():
+    directory = tempfile.mkdtemp()
+    yield directory
+    shutil.rmtree(directory)
+
+
+def test_run_all_queries(measure, server, backup_dir):
+    results = measure(PAGES, search.run_all_queries, QUERIES, RUNS, RESULTS, 1, backup_dir, 0, 1000,
+                      unit="pages")
+    assert sum(len(pages) for pages in results["results"]) == PAGES
+
+
+@pytest.mark.skipif(importlib.util.find_spec("aiohttp") is None, reason="aiohttp is not installed")
+def test_run_all_queries_async(measure, server, backup_dir):
+    def run():
+        return asyncio.run(async_search.run_all_queries_async(QUERIES, RUNS, RESULTS, 1, backup_dir, 0, 1000))
+
+    results = measure(PAGES, run, unit="pages")
+    assert sum(len(pages) for pages in results["results"]) == PAGES
@@ -0,0 +1,88 @@
+"""
+    Title: bench_postprocessing.py
+    Author: Ashley Williams
+    Description: Benchmarks of the functions that process a day's results,
+    on synthetic corpora from 10^3 links upwards (see corpus.py).
+
+    Usage: make bench
+"""
+import functools
+
+import pytest
+
+import corpus
+
+from coast_search import search
+
+pytest.importorskip("pytest_benchmark")
+
+SEGMENTS = 5
+PAGES = 10
+DUPLICATE_RATE = 0.2
+
+
+def _runs(links):
+    return corpus.runs_for_links(links, SEGMENTS, PAGES)
+
+
+@functools.lru_cache(maxsize=1)
+def raw_results(links):
+    return list(corpus.iter_raw_results(SEGMENTS, _runs(links), PAGES, DUPLICATE_RATE))
+
+
+@functools.lru_cache(maxsize=1)
+def results(links):
+    return corpus.make_corpus(SEGMENTS, _runs(links), PAGES, DUPLICATE_RATE)
+
+
+@pytest.fixture(scope="module")
+def results_files(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("corpus")
+
+    @functools.lru_cache(maxsize=None)
+    def results_file(links):
+        path = str(directory / "results_{0}.jsonl.gz".format(links))
+        return corpus.write_corpus(path, SEGMENTS, _runs(links), PAGES, DUPLICATE_RATE)
+
+    return results_file
+
+
+def test_corpus_shape():
+    json_data = corpus.make_corpus(SEGMENTS, 2, PAGES, DUPLICATE_RATE)
+    links = [link for item in search.iter_result_items(json_data) for link in item["links"]]
+
+    assert len(links) == 1000
+    assert len(json_data["results"]) == SEGMENTS
+    assert 0.1 < 1 - len(set(links)) / float(len(links)) < 0.3
+    assert json_data == corpus.make_corpus(SEGMENTS, 2, PAGES, DUPLICATE_RATE)
+
+
+@pytest.mark.parametrize("links", corpus.link_counts())
+def test_get_object_to_write(measure, links):
+    raw = raw_results(links)
+    measure(links, lambda: [search.get_object_to_write(result) for result in raw])
+
+
+@pytest.mark.parametrize("links", corpus.link_counts())
+def test_extract_search_results_from_JSON(measure, links):
+    measure(links, search.extract_search_results_from_JSON, results(links))
+
+
+@pytest.mark.parametrize("links", corpus.link_counts())
+def test_extract_search_hits(measure, links):
+    measure(links, search.extract_search_hits, results(links))
+
+
+@pytest.mark.parametrize("links", corpus.link_counts())
+def test_deduplicate_urls(measure, links):
+    measure(links, search.deduplicate_urls, results(links))
+
+
+@pytest.mark.parametrize("links", corpus.link_counts())
+def test_deduplicate_urls_hashed(measure, links):
+    measure(links, functools.partial(search.deduplicate_urls, hash_keys=True), results(links))
+
+
+@pytest.mark.parametrize("links", corpus.link_counts())
+def test_deduplicate_urls_stream(measure, results_files, links):
+    measure(links, search.deduplicate_urls_stream, results_files(links))
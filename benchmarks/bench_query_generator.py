@@ -0,0 +1,31 @@
+"""
+    Title: bench_query_generator.py
+    Author: Ashley Williams
+    Description: Benchmarks of generating the segments' queries. The number of
+    segments doubles with each dimension, so they are timed for growing numbers
+    of dimensions rather than links.
+
+    Usage: make bench
+"""
+import pytest
+
+from coast_search import query_generator
+
+pytest.importorskip("pytest_benchmark")
+
+WORDS_PER_DIMENSION = 5
+
+
+def dimensions(count):
+    dimensions_dict = {
+        "d{0}".format(i): ["word{0}x{1}".format(i, j) for j in range(WORDS_PER_DIMENSION)] for i in range(count)
+    }
+    return query_generator.build_dimensions_data(dimensions_dict)[0], list(dimensions_dict)
+
+
+@pytest.mark.parametrize("count", [3, 8, 12])
+def test_generate_result_list(measure, count):
+    dimensions_data, names = dimensions(count)
+    result_data = measure(query_generator.count_segments(count), query_generator.generate_result_list,
+                          dimensions_data, names, "software", "alpha beta gamma", unit="segments")
+    assert len(result_data) == query_generator.count_segments(count)
@@ -0,0 +1,51 @@
+"""
+    Title: conftest.py
+    Author: Ashley Williams
+    Description: Shared fixtures of the benchmark suite. Run it with
+    "make bench", which saves every run under .benchmarks so runs can be
+    compared over time ("make bench-compare"). Besides the timings, each
+    benchmark records the number of links (or segments) it processed, its
+    throughput per second and its peak memory in the saved "extra_info".
+
+    The corpus sizes are set by COAST_BENCH_MAX_LINKS (see corpus.link_counts).
+"""
+import tracemalloc
+
+import pytest
+
+
+def rounds_for(count):
+    # the largest corpora take seconds a round, so they are timed fewer times
+    return 5 if count <= 10 ** 5 else 2
+
+
+def peak_memory(function, *args, **kwargs):
+    """
+        Runs a function once while tracing memory allocations.
+        Returns:
+            peak: the most memory, in bytes, allocated at once while it ran.
+    """
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture
+def measure(benchmark):
+    """
+        Times a function with the benchmark fixture, then records its
+        throughput and peak memory alongside the timings.
+        Usage: measure(count, function, *args, unit="links"), where count is
+        the number of units (links, segments) the function processes.
+    """
+    def run(count, function, *args, unit="links"):
+        result = benchmark.pedantic(function, args=args, rounds=rounds_for(count), iterations=1)
+        benchmark.extra_info[unit] = count
+        if benchmark.stats is not None:
+            benchmark.extra_info[unit + "_per_second"] = round(count / benchmark.stats.stats.mean)
+        benchmark.extra_info["peak_memory_bytes"] = peak_memory(function, *args)
+        return result
+    return run
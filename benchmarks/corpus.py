@@ -0,0 +1,185 @@
+"""
+    Title: corpus.py
+    Author: Ashley Williams
+    Description: Generates synthetic search results for benchmarking the
+    post-processing functions at realistic sizes. The results have the same
+    shape as run_daily_search's, with a configurable number of segments, runs
+    and pages, and a configurable share of links that repeat a link found
+    earlier (in the same or another segment). Links are made from a number,
+    so no list of earlier links is kept and a corpus of 10^7 links can be
+    streamed to a JSON lines file without holding it in memory.
+
+    Usage: python benchmarks/corpus.py --links 1000000 results.jsonl.gz
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+from coast_search import jsonl
+from coast_search import search
+
+RESULTS_PER_PAGE = 10
+
+LINK_COUNTS = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+# 10^7 links takes several GB of memory for the in-memory functions, so only raise this on a machine with room
+MAX_LINKS = int(os.environ.get("COAST_BENCH_MAX_LINKS", 10 ** 5))
+
+_DOMAINS = ["medium.com", "stackoverflow.com", "github.com", "en.wikipedia.org", "dev.to", "reddit.com",
+            "news.ycombinator.com", "martinfowler.com", "blog.example.org", "softwareengineering.stackexchange.com"]
+_SECTIONS = ["blog", "questions", "wiki", "posts", "story", "articles", "r/programming/comments", "docs"]
+_WORDS = ["software", "testing", "because", "experience", "trustworthy", "we", "however", "conclude",
+          "practitioner", "code", "review", "quality", "agile", "debt", "bug", "release"]
+
+
+def link(number):
+    """
+        Returns:
+            url: the synthetic url for a number. The same number always gives the same url.
+    """
+    domain = _DOMAINS[number % len(_DOMAINS)]
+    section = _SECTIONS[(number // len(_DOMAINS)) % len(_SECTIONS)]
+    slug = "-".join(_WORDS[(number >> shift) % len(_WORDS)] for shift in (0, 4, 8, 12))
+    url = "https://{0}/{1}/{2}-{3}".format(domain, section, slug, number)
+    # a few of the variants that canonicalisation is for
+    if number % 7 == 0:
+        url += "?utm_source=feed"
+    elif number % 11 == 0:
+        url += "/"
+    return url
+
+
+def link_counts():
+    """
+        Returns:
+            counts: the corpus sizes to benchmark, from 10^3 links up to
+                    COAST_BENCH_MAX_LINKS (10^5 by default).
+    """
+    return [count for count in LINK_COUNTS if count <= MAX_LINKS]
+
+
+def runs_for_links(links, segments, pages):
+    """
+        Returns the number of runs that gives at least the number of links.
+    """
+    return max(1, int(math.ceil(links / float(segments * pages * RESULTS_PER_PAGE))))
+
+
+def iter_raw_results(segments=7, runs=1, pages=10, duplicate_rate=0.2, seed=0):
+    """
+        Yields synthetic API results, as returned by search.query_page.
+        Args:
+            segments: the number of segments.
+            runs: the number of runs of each segment.
+            pages: the number of pages in each run.
+            duplicate_rate: the share of links that repeat a link found earlier.
+            seed: the seed of the random choices, so a corpus can be made again.
+        Returns:
+            a generator of results, segment by segment, with 10 links on each page.
+    """
+    rng = random.Random(seed)
+    issued = 0
+
+    for segment_id in range(segments):
+        query = '("{0}" OR "{1}")'.format(_WORDS[segment_id % len(_WORDS)], _WORDS[(segment_id + 3) % len(_WORDS)])
+        for run in range(runs):
+            for page in range(pages):
+                start = page * RESULTS_PER_PAGE + 1
+                items = []
+                for _ in range(RESULTS_PER_PAGE):
+                    if issued and rng.random() < duplicate_rate:
+                        number = rng.randrange(issued)
+                    else:
+                        number = issued
+                        issued += 1
+                    items.append({
+                        "kind": "customsearch#result",
+                        "title": "Result {0} for {1}".format(number, query),
+                        "link": link(number),
+                        "snippet": " ".join(_WORDS[(number + i) % len(_WORDS)] for i in range(20))
+                    })
+
+                yield {
+                    "query": query,
+                    "number_of_results": pages * RESULTS_PER_PAGE,
+                    "api_key": "benchmark-key",
+                    "search_engine_id": "benchmark:cx",
+                    "segment_id": segment_id,
+                    "response": {
+                        "kind": "customsearch#search",
+                        "url": {
+                            "type": "application/json",
+                            "template": "https://www.googleapis.com/customsearch/v1?q={searchTerms}"
+                        },
+                        "queries": {
+                            "request": [{
+                                "cx": "benchmark:cx",
+                                "count": RESULTS_PER_PAGE,
+                                "totalResults": "1000000",
+                                "startIndex": start,
+                                "searchTerms": query
+                            }]
+                        },
+                        "searchInformation": {
+                            "searchTime": 0.3,
+                            "totalResults": "1000000"
+                        },
+                        "items": items
+                    }
+                }
+
+
+def iter_corpus_items(segments=7, runs=1, pages=10, duplicate_rate=0.2, seed=0):
+    """
+        Yields synthetic extracted results (the output of search.get_object_to_write).
+        Takes the same arguments as iter_raw_results.
+    """
+    for result in iter_raw_results(segments, runs, pages, duplicate_rate, seed):
+        yield search.get_object_to_write(result)
+
+
+def make_corpus(segments=7, runs=1, pages=10, duplicate_rate=0.2, seed=0):
+    """
+        Builds a synthetic corpus in memory.
+        Takes the same arguments as iter_raw_results.
+        Returns:
+            corpus: {"results": [...]}, one list of results per segment, as from run_all_queries.
+    """
+    results = [[] for _ in range(segments)]
+    for item in iter_corpus_items(segments, runs, pages, duplicate_rate, seed):
+        results[item["segment_id"]].append(item)
+    return {"results": results}
+
+
+def write_corpus(path, segments=7, runs=1, pages=10, duplicate_rate=0.2, seed=0):
+    """
+        Streams a synthetic corpus to a JSON lines results file (compressed if
+        the path ends in .gz or .zst), one result at a time.
+        Returns:
+            path: the path written.
+    """
+    with jsonl.JsonLinesWriter(path) as ofile:
+        for item in iter_corpus_items(segments, runs, pages, duplicate_rate, seed):
+            ofile.write(item)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic coast_search results file.")
+    parser.add_argument("path", help="the file to write (.jsonl, .jsonl.gz or .jsonl.zst)")
+    parser.add_argument("--links", type=int, default=100000, help="the number of links, rounded up to whole runs")
+    parser.add_argument("--segments", type=int, default=7)
+    parser.add_argument("--pages", type=int, default=10, help="pages per run")
+    parser.add_argument("--duplicate-rate", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    runs = runs_for_links(args.links, args.segments, args.pages)
+    write_corpus(args.path, args.segments, runs, args.pages, args.duplicate_rate, args.seed)
+    print("Wrote {0} links to {1}".format(args.segments * runs * args.pages * RESULTS_PER_PAGE, args.path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
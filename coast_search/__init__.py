@@ -8,9 +8,47 @@
 from __future__ import print_function
 from ._version import get_versions
 
-from coast_search import query_generator
-from coast_search import search
-from coast_search import utils
+import importlib
+
+# submodules are imported on first use (a module __getattr__, which needs Python 3.7),
+# so tools that only need a few of them don't pay for importing the Google API client and the rest
+_SUBMODULES = (
+    "async_search",
+    "backup",
+    "batch",
+    "bloom",
+    "clients",
+    "columnar",
+    "journal",
+    "jsonl",
+    "metrics",
+    "mock_server",
+    "planner",
+    "query_generator",
+    "query_plan",
+    "rate_limit",
+    "records",
+    "response_cache",
+    "search",
+    "streaming",
+    "url_index",
+    "urls",
+    "utils",
+    "writer",
+)
+
+__all__ = list(_SUBMODULES)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module("coast_search." + name)
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_SUBMODULES))
+
 
 __author__ = 'Ashley Williams'
 __email__ = 'ashley.williams@pg.canterbury.ac.nz'
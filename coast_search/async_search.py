@@ -0,0 +1,355 @@
+"""
+    Title: async_search.py
+    Author: Ashley Williams
+    Description: An asyncio engine for running searches. Calls the Custom
+    Search REST endpoint directly through one pooled aiohttp session, so every
+    segment can be searched at the same time, while calls on each api key are
+    still bounded and rate limited. Writes to disk and databases are done on
+    threads, so they never hold up the requests in flight. The results have
+    exactly the same structure as those from search.run_all_queries.
+    aiohttp is an optional dependency: pip install coast_search[async]
+"""
+import asyncio
+import functools
+import json
+import logging
+
+from time import time
+
+from coast_search import backup
+from coast_search import clients
+from coast_search import rate_limit
+from coast_search import search
+from coast_search import writer
+
+
+def _new_session():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError("The async engine requires aiohttp. Install it with: pip install coast_search[async]")
+
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(keepalive_timeout=60))
+
+
+async def _in_thread(function, *args):
+    # disk and database work (fsyncs, SQLite, a full writer queue) would otherwise stall every request in flight
+    future = asyncio.get_event_loop().run_in_executor(None, functools.partial(function, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # a thread can't be stopped, so wait for it, rather than let the caller clean up while it is still writing
+        await asyncio.wait([future])
+        raise
+
+
+async def _gather(coroutines):
+    # like asyncio.gather, but if one fails the others are cancelled and waited for, so none is still using the
+    # session or the writers when the caller closes them
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _call_api_async(session, params, api_key, segment_id, start, limiter, semaphore, run_metrics, max_retries,
+                          endpoint):
+    attempt = 0
+    while True:
+        status = None
+        body = b""
+        error = None
+        async with semaphore:
+            await limiter.acquire_async()
+            started = time()
+            try:
+                async with session.get(endpoint, params=params) as response:
+                    status = response.status
+                    body = await response.read()
+            except Exception as e:
+                error = e
+        seconds = time() - started
+
+        if error is None and status == 200:
+            if run_metrics is not None:
+                run_metrics.observe_call(api_key, segment_id, seconds, len(body))
+            try:
+                return json.loads(body.decode("utf-8"))
+            except ValueError as e:
+                raise Exception(str(e))
+
+        if run_metrics is not None:
+            run_metrics.observe_call(api_key, segment_id, seconds, len(body), error=True)
+        if error is None:
+            error = Exception("HTTP {0}: {1}".format(status, body.decode("utf-8", "replace")))
+            retryable = rate_limit.is_retryable(status)
+        else:
+            retryable = isinstance(error, (OSError, asyncio.TimeoutError))
+        if attempt >= max_retries or not retryable:
+            raise Exception(str(error))
+
+        attempt += 1
+        delay = rate_limit.retry_delay(attempt)
+        if run_metrics is not None:
+            run_metrics.record_retry(api_key)
+        logging.warning("Segment {0} : Page {1} failed ({2}), trying again in {3:.1f}s.".format(
+            segment_id, start, "HTTP {0}".format(status) if status is not None else error, delay))
+        await asyncio.sleep(delay)
+
+
+async def query_page_async(session, query, number_of_results, api_key, search_engine_id, segment_id, start,
+                           limiter, semaphore, cache=None, day=None, run=0, run_metrics=None, max_retries=0, pool=None):
+    """
+        Query the API for a single page of results, without blocking the event loop.
+        Args:
+            session: The aiohttp ClientSession to send the request through.
+            query: The query string to run.
+            number_of_results: The number of results you wish to be returned
+                               in total (stored alongside the response).
+            api_key: The api key of the search engine, provided by Google.
+            search_engine_id: The id of the Custom Search Engine provided by
+                              Google.
+            segment_id: The segment which the results belong to.
+            start: The index of the first result on the page.
+            limiter: The TokenBucket to wait on before calling the API.
+            semaphore: The asyncio.Semaphore bounding calls on this api key.
+            cache: A ResponseCache to consult before calling the API. None
+                   disables caching.
+            day: The day of the search period (part of the cache key).
+            run: The run within the day, starting from 0 (part of the cache key).
+            run_metrics: A metrics.Metrics to record the call in, or None.
+            max_retries: The number of times to try again after a rate limit,
+                         server or connection error (see search.query_page).
+            pool: The clients.ServicePool whose server to send the request to.
+                  Defaults to clients.default_pool.
+        Returns:
+            result: The page from Google as a JSON object, along with the query
+                    information, as returned by search.query_page.
+    """
+    params = {
+        "q": query,
+        "cx": search_engine_id,
+        "start": start,
+        "key": api_key,
+        "alt": "json"
+    }
+
+    result = None
+    if cache is not None:
+        result = await _in_thread(cache.get, query, search_engine_id, start, day, run)
+        if result is not None and run_metrics is not None:
+            run_metrics.record_cache_hit(api_key)
+
+    if result is None:
+        endpoint = clients.list_endpoint() if pool is None else pool.list_endpoint()
+        result = await _call_api_async(session, params, api_key, segment_id, start, limiter, semaphore, run_metrics,
+                                       max_retries, endpoint)
+
+        if cache is not None:
+            await _in_thread(cache.put, query, search_engine_id, start, day, run, result)
+
+    return {
+        "query": query,
+        "number_of_results": number_of_results,
+        "api_key": api_key,
+        "search_engine_id": search_engine_id,
+        "segment_id": segment_id,
+        "response": result
+    }
+
+
+async def run_query_async(session, query_string, number_of_runs, number_of_results, api_key, search_engine_id,
+                          segment_id, day, backup_dir, limiter, semaphore, cache=None,
+                          run_journal=None, record_writer=None, backup_writer=None, canonicaliser=None,
+                          index=None, variant=None, run_metrics=None, max_retries=0, pool=None):
+    """
+        The asyncio counterpart of search.run_query. Every page of every run is
+        requested at once, then the results are backed up and extracted in order.
+        Args:
+            session: The aiohttp ClientSession to send the requests through.
+            query_string: The query string to run.
+            number_of_runs: The number of runs you wish to be repeat for each
+                            day.
+            number_of_results: The number of results you wish to be returned.
+            api_key: The api key of the search engine, provided by Google.
+            search_engine_id: The id of the Custom Search Engine provided by
+                              Google.
+            segment_id: The segment which the results belong to.
+            day: The day of the search period that the result has originated
+                 from.
+            backup_dir: A directory that can be used for storing results
+                        as files.
+            limiter: The TokenBucket for this api key/search engine.
+            semaphore: The asyncio.Semaphore bounding calls on this api key.
+            cache: A ResponseCache to consult before calling the API, or None.
+            run_journal: A RunJournal of completed pages to skip and record
+                         into, or None.
+            record_writer: A JsonLinesWriter to stream each extracted result to,
+                           instead of returning it.
+            backup_writer: The writer (e.g. from backup.open_backup) to back up
+                           the raw results to. By default the day's backup file
+                           in backup_dir is opened and closed again.
+            canonicaliser: A function applied to each link of the extracted
+                           results (see search.get_object_to_write), or None.
+            index: A url_index.UrlIndex to record the links of each
+                   extracted result in, or None.
+            variant: The "variant" of the query, if its segment was split (see
+                     search.run_query).
+            run_metrics: A metrics.Metrics to record the calls and the time
+                         taken in, or None.
+            max_retries: The number of times to try a failed call again.
+            pool: The clients.ServicePool whose server to send the requests to,
+                  or None for clients.default_pool's.
+        Returns: extracted_results: list of results (empty if record_writer is given)
+    """
+    started = time()
+    units = [(run, start) for run in range(0, number_of_runs) for start in search.page_starts(number_of_results)]
+
+    variant_index = None if variant is None else variant["index"]
+
+    own_backup_writer = backup_writer is None
+    if own_backup_writer:
+        backup_writer = writer.BackgroundWriter(backup.open_backup(backup_dir, day),
+                                                metrics=run_metrics, name="backup")
+
+    async def fetch(run, start):
+        if run_journal is not None:
+            res = run_journal.get(segment_id, run, start, variant_index)
+            if res is not None:
+                # it was backed up when it was journaled
+                return res
+
+        res = await query_page_async(session, query_string, number_of_results, api_key, search_engine_id, segment_id,
+                                     start, limiter, semaphore, cache, day, run, run_metrics, max_retries, pool)
+        if variant is not None:
+            res["variant"] = variant
+
+        # written before it is journaled, so a resumed search never skips it
+        await _in_thread(backup_writer.write, res)
+        logging.info("Segment {0} : Run {1} : Page {2} : Written to file.".format(segment_id, run + 1, start))
+        if run_journal is not None:
+            await _in_thread(run_journal.record, segment_id, run, start, res, variant_index)
+        return res
+
+    logging.info("Segment {0} : Running {1} runs.".format(segment_id, number_of_runs))
+
+    extracted_results = []
+    try:
+        results = await _gather([fetch(run, start) for (run, start) in units])
+
+        for (run, start), res in zip(units, results):
+            object_to_write = search.get_object_to_write(res, canonicaliser)
+            if index is not None:
+                await _in_thread(index.add_result, object_to_write, day)
+
+            if record_writer is not None:
+                await _in_thread(record_writer.write, object_to_write)
+            else:
+                extracted_results.append(object_to_write)
+    finally:
+        if own_backup_writer:
+            await _in_thread(backup_writer.close)
+
+    if run_metrics is not None:
+        run_metrics.observe_segment(segment_id, time() - started)
+
+    return extracted_results
+
+
+async def run_all_queries_async(query_dict_list, number_of_runs, number_of_results, day, search_backup_dir,
+                                sleep_wait_time=1, burst=1, max_workers=search.DEFAULT_MAX_WORKERS, cache=None,
+                                run_journal=None, record_writer=None, backup_writer=None, canonicaliser=None,
+                                index=None, run_metrics=None, max_retries=0, pool=None, session=None):
+    """
+    The asyncio counterpart of search.run_all_queries. All segments are searched
+    concurrently, with at most max_workers calls in flight on each api key.
+    Args:
+        query_dict_list: list of query data for all of the queries wanting to be searched
+        number_of_runs: number of desired runs (from config file)
+        number_of_results: number of desired results (from config file)
+        day: Day number in search process (number of days since start date)
+        search_backup_dir: location to store file output of searches
+        sleep_wait_time: minimum number of seconds between calls on each api key (from config file)
+        burst: number of calls that may be made back to back on each api key (from config file)
+        max_workers: maximum number of calls in flight on each api key (from config file)
+        cache: a ResponseCache to consult before calling the API, or None
+        run_journal: a RunJournal of completed pages to skip and record into, or None
+        record_writer: a JsonLinesWriter to stream each extracted result to, instead
+                       of returning them
+        backup_writer: the writer (e.g. from backup.open_backup) to back up the raw
+                       results to. By default the day's backup file is opened, and
+                       closed again at the end.
+        canonicaliser: a function applied to each link of the extracted results, or None
+        index: a url_index.UrlIndex to record the links of the extracted results in, or None (see
+               search.run_all_queries)
+        run_metrics: a metrics.Metrics to record the calls and writes in, or None
+        max_retries: number of times to try a failed call again (from config file)
+        pool: the clients.ServicePool whose server to send the requests to, or None for clients.default_pool's
+        session: an aiohttp ClientSession to use. By default one is created, shared
+                 by every request, and closed afterwards.
+    Returns:
+        object containing results of all of the queries
+    """
+    own_session = session is None
+    if own_session:
+        session = _new_session()
+
+    own_backup_writer = backup_writer is None
+    if own_backup_writer:
+        backup_writer = writer.BackgroundWriter(backup.open_backup(search_backup_dir, day),
+                                                metrics=run_metrics, name="backup")
+
+    if index is not None:
+        index = search.VariantIndex(index)
+
+    semaphores = {}
+    for query_object in query_dict_list:
+        semaphores.setdefault(query_object['api_key'], asyncio.Semaphore(max_workers))
+
+    try:
+        results = await _gather([
+            run_query_async(
+                session,
+                query_object['query'],
+                number_of_runs,
+                number_of_results,
+                query_object['api_key'],
+                query_object['search_engine_id'],
+                query_object['segment_id'],
+                day,
+                search_backup_dir,
+                rate_limit.get_limiter(query_object['api_key'], query_object['search_engine_id'],
+                                       sleep_wait_time, burst),
+                semaphores[query_object['api_key']],
+                cache,
+                run_journal,
+                record_writer,
+                backup_writer,
+                canonicaliser,
+                index,
+                query_object.get('variant'),
+                run_metrics,
+                max_retries,
+                pool
+            )
+            for query_object in query_dict_list
+        ])
+
+        if index is not None:
+            await _in_thread(index.add_confirmed, day)
+    finally:
+        if own_session:
+            await session.close()
+        if own_backup_writer:
+            await _in_thread(backup_writer.close)
+
+    if record_writer is not None:
+        results = []
+
+    return {
+        "results": list(results)
+    }
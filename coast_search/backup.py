@@ -0,0 +1,101 @@
+"""
+    Title: backup.py
+    Author: Ashley Williams
+    Description: Backs up the raw responses from the Google Custom Search API
+    as they arrive. Each day's responses are written, as JSON lines, to a
+    compressed file, which is fsynced in batches rather than after every
+    write. Each time the day's backup is opened again, e.g. when a killed
+    search is resumed, a new part file is started next to it rather than
+    appending to a file that may have been left cut short. The responses of
+    every part can be read back with iter_backup.
+"""
+import os
+
+from coast_search import jsonl
+
+DEFAULT_FSYNC_EVERY = 50
+
+
+def backup_path(backup_dir, day, compression=jsonl.GZIP):
+    """
+        Returns the path of the backup file for the given day.
+        Args:
+            backup_dir: The directory used for storing backups.
+            day: The day of the search period.
+            compression: "gzip", "zstd" or None.
+    """
+    name = "day_" + str(day) + ".jsonl" + jsonl.EXTENSIONS[compression]
+    return os.path.join(backup_dir, "results_day_" + str(day), name)
+
+
+def part_path(path, part):
+    """
+        Returns the path of a part of a backup file: day_N.jsonl.gz for part 0,
+        then day_N.1.jsonl.gz, day_N.2.jsonl.gz and so on.
+        Args:
+            path: Path to the backup file (see backup_path).
+            part: The number of the part, from 0.
+    """
+    if not part:
+        return path
+    root, _, extension = path.rpartition(".jsonl")
+    return root + "." + str(part) + ".jsonl" + extension
+
+
+def backup_parts(path):
+    """
+        Returns:
+            paths: the paths of every part of a backup file that exists, in
+                   the order they were written.
+    """
+    paths = []
+    part = 0
+    while os.path.exists(part_path(path, part)):
+        paths.append(part_path(path, part))
+        part += 1
+    return paths
+
+
+def open_backup(backup_dir, day, compression=jsonl.GZIP, fsync_every=DEFAULT_FSYNC_EVERY):
+    """
+        Opens a new part of the backup file for the given day, ready to append
+        responses to.
+        Args:
+            backup_dir: The directory used for storing backups.
+            day: The day of the search period.
+            compression: "gzip", "zstd" or None.
+            fsync_every: The number of responses written between each fsync.
+        Returns:
+            writer: a jsonl.JsonLinesWriter.
+    """
+    path = backup_path(backup_dir, day, compression)
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    part = 0
+    while True:
+        try:
+            # created exclusively, so two writers opened at once never share a part
+            os.close(os.open(part_path(path, part), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            part += 1
+    return jsonl.JsonLinesWriter(part_path(path, part), fsync_every)
+
+
+def iter_backup(path):
+    """
+        Reads the responses back from every part of a backup file, in the
+        order they were written. If a part was cut short, e.g. because the
+        search was killed while writing, every complete response before that
+        point is returned, and reading carries on with the next part.
+        Args:
+            path: Path to the backup file (see backup_path).
+        Returns:
+            responses: a generator of the backed up responses, as written by
+                       search.query_page.
+    """
+    for part in backup_parts(path):
+        for response in jsonl.iter_json_lines(part):
+            yield response
@@ -0,0 +1,145 @@
+"""
+    Title: batch.py
+    Author: Ashley Williams
+    Description: Runs the daily search of many studies (one config file each)
+    together in one process, instead of one process per study. The studies
+    share the pooled API clients, the rate limiters of any keys they have in
+    common and the dimension files they read, and a combined report of how
+    each study went is returned. Also provides the coast-search-batch command.
+"""
+import argparse
+import json
+import logging
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+from coast_search import search
+from coast_search import utils
+
+DEFAULT_WORKERS = 4
+
+REQUIRED_KEYS = [
+    "dimensions",
+    "api_details_file",
+    "number_of_runs",
+    "number_of_results",
+    "search_backup_dir",
+    "results_output_dir",
+    "logging_file",
+    "start_date"
+]
+
+
+def load_config(config_file):
+    """
+        Loads and checks a study's config.
+        Args:
+            config_file: Path to the config file.
+        Returns:
+            config: the config.
+    """
+    config = utils.get_json_from_file(config_file)
+    if not isinstance(config, dict):
+        raise Exception("Could not read config file: " + str(config_file))
+
+    missing = [key for key in REQUIRED_KEYS if key not in config]
+    if missing:
+        raise Exception("Config file {0} is missing: {1}".format(config_file, ", ".join(missing)))
+
+    return config
+
+
+def _summarise(results):
+    # keep only a summary, so the batch doesn't hold every study's results in memory
+    if "results_file" in results:
+        return {"results_file": results["results_file"]}
+    return {"pages": sum(len(segment_results) for segment_results in results["results"])}
+
+
+def _run_study(config_file, config, write_to_file_flag, engine, resume):
+    started = time()
+    report = {"config_file": config_file}
+    try:
+        results = search.run_daily_search(config, write_to_file_flag, engine, resume)
+        report.update(_summarise(results))
+        report["status"] = "succeeded"
+    except Exception as e:
+        # run_daily_search has already logged the traceback to the study's log
+        logging.error("Study {0} failed: {1}".format(config_file, e))
+        report["status"] = "failed"
+        report["error"] = str(e)
+    report["seconds"] = round(time() - started, 3)
+    return report
+
+
+def run_daily_searches(config_files, workers=DEFAULT_WORKERS, write_to_file_flag=True, engine="threads",
+                       resume=False):
+    """
+        Runs the daily search of several studies concurrently. A study that
+        fails does not stop the others.
+        Args:
+            config_files: Paths to the config file of each study (see run_daily_search).
+            workers: The number of studies to run at once.
+            write_to_file_flag: boolean flag for writing to file, passed to run_daily_search.
+            engine: "threads" or "async", passed to run_daily_search.
+            resume: passed to run_daily_search.
+        Returns:
+            report: a dict of the number of studies that "succeeded" and "failed",
+                    the total "seconds" taken, and a "studies" list with the
+                    status, time taken and results file (or number of pages) or
+                    error of each study, in the order given.
+    """
+    started = time()
+    reports = [None] * len(config_files)
+
+    # every config is loaded up front, so a broken one is reported without holding up the rest
+    studies = []
+    for i, config_file in enumerate(config_files):
+        try:
+            studies.append((i, config_file, load_config(config_file)))
+        except Exception as e:
+            reports[i] = {"config_file": config_file, "status": "failed", "error": str(e), "seconds": 0}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="coast-search-study") as executor:
+        futures = [(i, executor.submit(_run_study, config_file, config, write_to_file_flag, engine, resume))
+                   for i, config_file, config in studies]
+        for i, future in futures:
+            reports[i] = future.result()
+
+    return {
+        "succeeded": sum(1 for report in reports if report["status"] == "succeeded"),
+        "failed": sum(1 for report in reports if report["status"] == "failed"),
+        "seconds": round(time() - started, 3),
+        "studies": reports
+    }
+
+
+def main(argv=None):
+    """
+        The coast-search-batch command. Prints the combined report as JSON, and
+        exits with status 1 if any study failed.
+    """
+    parser = argparse.ArgumentParser(description="Run the daily search of several coast_search studies.")
+    parser.add_argument("config_files", nargs="+", help="the config file of each study")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="studies to run at once")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads")
+    parser.add_argument("--resume", action="store_true", help="carry on from each study's journal")
+    parser.add_argument("--no-write", action="store_true", help="don't write the results to file")
+    parser.add_argument("--report", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = run_daily_searches(args.config_files, args.workers, not args.no_write, args.engine, args.resume)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.report:
+        with open(args.report, "w") as ofile:
+            ofile.write(output)
+
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+    Title: bloom.py
+    Author: Ashley Williams
+    Description: A Bloom filter backed by a memory-mapped file. It answers
+    whether a URL might have been seen before using a fixed number of bits per
+    URL, however many URLs there are, so the set of every URL ever seen does
+    not need to be held in memory. A "no" is always right; a "yes" is wrong
+    with the configured false positive rate, and should be confirmed against
+    an exact store such as the url_index.
+"""
+import math
+import mmap
+import os
+import struct
+
+DEFAULT_CAPACITY = 1000000
+DEFAULT_ERROR_RATE = 0.01
+
+_MAGIC = b"CSBLOOM1"
+# magic, number of bits, number of hashes, capacity, error rate, number of keys added when last flushed
+_HEADER = struct.Struct("<8sQIQdQ")
+_HEADER_SIZE = 64
+_MASK_64 = 2 ** 64 - 1
+_MASK_32 = 2 ** 32 - 1
+
+
+def optimal_size(capacity, error_rate):
+    """
+        Works out the size of a filter.
+        Args:
+            capacity: The number of keys the filter is expected to hold.
+            error_rate: The false positive rate wanted at that number of keys.
+        Returns:
+            (num_bits, num_hashes): the number of bits and of hash functions to use.
+    """
+    if not 0 < error_rate < 1:
+        raise Exception("The error rate must be between 0 and 1, got " + str(error_rate))
+
+    capacity = max(capacity, 1)
+    num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+    num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+    return num_bits, num_hashes
+
+
+class BloomFilter(object):
+    """
+        A Bloom filter of 64-bit integer keys (e.g. from urls.url_hash), stored
+        in a memory-mapped file.
+
+        The file records the number of keys added as of the last flush, so a
+        filter left behind by a crash can be spotted and rebuilt (see count).
+
+        Args:
+            path: Path to the file. It is created if it does not exist. An
+                  existing file is reused if it was made with the same capacity
+                  and error rate, and created again otherwise.
+            capacity: The number of keys the filter is sized for. Past this the
+                      false positive rate rises.
+            error_rate: The false positive rate at capacity.
+    """
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits, self.num_hashes = optimal_size(capacity, error_rate)
+        self.count = 0
+        self.created = False
+
+        size = _HEADER_SIZE + (self.num_bits + 7) // 8
+
+        if not self._matches_existing(size):
+            with open(path, "wb") as ofile:
+                ofile.truncate(size)
+            self.created = True
+
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), size)
+        if self.created:
+            self._write_header()
+        else:
+            self.count = _HEADER.unpack_from(self._map, 0)[5]
+
+    def _matches_existing(self, size):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) != size:
+            return False
+
+        with open(self.path, "rb") as ifile:
+            header = ifile.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            return False
+
+        magic, num_bits, num_hashes, capacity, error_rate, count = _HEADER.unpack(header)
+        return (magic == _MAGIC and num_bits == self.num_bits and num_hashes == self.num_hashes
+                and capacity == self.capacity and error_rate == self.error_rate)
+
+    def _write_header(self):
+        _HEADER.pack_into(self._map, 0, _MAGIC, self.num_bits, self.num_hashes, self.capacity, self.error_rate,
+                          self.count)
+
+    def _positions(self, key):
+        # double hashing: the low and high halves of the 64-bit key give every position
+        key &= _MASK_64
+        h1 = key & _MASK_32
+        h2 = (key >> 32) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key):
+        """
+            Adds a key to the filter.
+            Args:
+                key: a 64-bit integer, e.g. from urls.url_hash.
+        """
+        for position in self._positions(key):
+            offset = _HEADER_SIZE + (position >> 3)
+            self._map[offset] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        for position in self._positions(key):
+            if not self._map[_HEADER_SIZE + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def clear(self):
+        """
+            Removes every key from the filter.
+        """
+        self._map[_HEADER_SIZE:] = bytes(len(self._map) - _HEADER_SIZE)
+        self.count = 0
+        self._write_header()
+
+    def flush(self, count=None):
+        """
+            Writes the filter to disk.
+            Args:
+                count: The number of keys to record as added, e.g. the number
+                       of rows in the exact store the filter fronts. Defaults
+                       to the number of keys added.
+        """
+        if count is not None:
+            self.count = count
+        self._write_header()
+        self._map.flush()
+
+    def close(self):
+        self.flush()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
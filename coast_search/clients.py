@@ -0,0 +1,153 @@
+"""
+    Title: clients.py
+    Author: Ashley Williams
+    Description: Keeps a pool of Google Custom Search service objects so that
+    each api key is only built once per thread. The discovery document is
+    read from the copy bundled with this package, so building a service never
+    needs a network round-trip, and every service keeps its own persistent
+    HTTP connection. googleapiclient is slow to import, so it is only
+    imported when the first service is built.
+    The services can be pointed at another server than Google's, such as the
+    mock_server, by giving a ServicePool its root_url, or for the whole
+    process with set_root_url or the COAST_SEARCH_ROOT_URL environment
+    variable.
+"""
+import json
+import os
+import threading
+import weakref
+
+DISCOVERY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "discovery", "customsearch.v1.json")
+
+DEFAULT_ROOT_URL = "https://customsearch.googleapis.com/"
+ROOT_URL_VARIABLE = "COAST_SEARCH_ROOT_URL"
+LIST_PATH = "customsearch/v1"
+
+
+class ServicePool(object):
+    """
+        A pool of Custom Search services, keyed by api key and thread.
+        httplib2 connections are not thread-safe, so each thread that queries
+        a key gets its own service, which it then reuses. The services are
+        kept in thread-local storage, so a thread's services, and their
+        connections, go when the thread does.
+
+        Args:
+            discovery_file: Path to the discovery document used to build the
+                            services. Defaults to the bundled copy.
+            root_url: The server to send the requests to, e.g. the url of a
+                      mock_server. Defaults to COAST_SEARCH_ROOT_URL if it is
+                      set, otherwise Google's.
+    """
+
+    def __init__(self, discovery_file=DISCOVERY_FILE, root_url=None):
+        self.discovery_file = discovery_file
+        self.root_url = _with_slash(root_url or os.environ.get(ROOT_URL_VARIABLE) or DEFAULT_ROOT_URL)
+        self._document = None
+        self._local = threading.local()
+        # every service still alive, so clear can close them whichever thread built them
+        self._built = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def _get_document(self):
+        if self._document is None:
+            with open(self.discovery_file, encoding="utf-8") as ifile:
+                document = json.load(ifile)
+            document["rootUrl"] = self.root_url
+            document["baseUrl"] = self.root_url + document.get("servicePath", "")
+            self._document = document
+        return self._document
+
+    def set_root_url(self, root_url):
+        """
+            Sends the requests of every service built from now on to another
+            server. The pooled services are dropped and their connections
+            closed, so this should not be called while searches are running.
+            Args:
+                root_url: The server's url, or None for Google's.
+        """
+        self.clear()
+        with self._lock:
+            self.root_url = _with_slash(root_url or DEFAULT_ROOT_URL)
+            self._document = None
+
+    def get(self, api_key):
+        """
+            Returns the service for the given api key, building it on first use.
+            Args:
+                api_key: The api key of the search engine, provided by Google.
+            Returns:
+                service: A customsearch v1 service object.
+        """
+        local = self._local
+        services = getattr(local, "services", None)
+        if services is None:
+            services = local.services = {}
+
+        service = services.get(api_key)
+        if service is None:
+            from googleapiclient.discovery import build_from_document
+            from googleapiclient.http import build_http
+
+            with self._lock:
+                # build_http sets a timeout on the connection, which httplib2 keeps alive between calls
+                service = build_from_document(self._get_document(), developerKey=api_key, http=build_http())
+                self._built.add(service)
+            services[api_key] = service
+        return service
+
+    def list_endpoint(self):
+        """
+            Returns:
+                url: the url of the customsearch/v1 list method on the pool's server.
+        """
+        return self.root_url + LIST_PATH
+
+    def clear(self):
+        """
+            Drops every pooled service, closing their connections.
+        """
+        with self._lock:
+            for service in list(self._built):
+                service.close()
+            self._built = weakref.WeakSet()
+            self._local = threading.local()
+
+
+def _with_slash(url):
+    return url if url.endswith("/") else url + "/"
+
+
+default_pool = ServicePool()
+
+
+def get_service(api_key):
+    """
+        Returns the pooled service for the given api key from the default pool.
+        Args:
+            api_key: The api key of the search engine, provided by Google.
+        Returns:
+            service: A customsearch v1 service object.
+    """
+    return default_pool.get(api_key)
+
+
+def set_root_url(root_url):
+    """
+        Points the default pool, and the async engine, at another server than
+        Google's, e.g. a mock_server. This applies to the whole process; to
+        point a single search at another server, give it its own ServicePool.
+        Args:
+            root_url: The server's url, e.g. "http://127.0.0.1:8080/", or None
+                      to go back to Google's.
+    """
+    default_pool.set_root_url(root_url)
+
+
+def list_endpoint():
+    """
+        Returns:
+            url: the url of the customsearch/v1 list method on the server the
+                 default pool sends its requests to.
+    """
+    return default_pool.list_endpoint()
@@ -0,0 +1,216 @@
+"""
+    Title: columnar.py
+    Author: Ashley Williams
+    Description: Exports extracted search results to Parquet, for analysis
+    across many days of searches. There is one row per URL, the segment,
+    query and api columns are dictionary encoded so each distinct value is only
+    stored once, and each day is written as its own row group so that single
+    days and columns can be loaded without reading the rest of the file.
+    pyarrow is an optional dependency: pip install coast_search[parquet]
+"""
+from coast_search import search
+from coast_search import utils
+
+COLUMNS = [
+    "day",
+    "segment_id",
+    "query",
+    "api_key",
+    "search_engine_id",
+    "start_index",
+    "search_info_total_results",
+    "search_time",
+    "title",
+    "url"
+]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow. Install it with: pip install coast_search[parquet]")
+    return pyarrow
+
+
+def schema():
+    """
+        Returns:
+            schema: the pyarrow schema of the exported results.
+    """
+    pa = _pyarrow()
+    return pa.schema([
+        ("day", pa.int32()),
+        ("segment_id", pa.dictionary(pa.int32(), pa.int64())),
+        ("query", pa.dictionary(pa.int32(), pa.string())),
+        ("api_key", pa.dictionary(pa.int32(), pa.string())),
+        ("search_engine_id", pa.dictionary(pa.int32(), pa.string())),
+        ("start_index", pa.int32()),
+        ("search_info_total_results", pa.string()),
+        ("search_time", pa.float64()),
+        ("title", pa.string()),
+        ("url", pa.string())
+    ])
+
+
+def results_to_table(json_data, day):
+    """
+        Converts the results of a day's searches into a pyarrow Table.
+        Args:
+            json_data: the json output result from the searches, or an iterable of
+                       results (see search.iter_result_items). The pages of split segments'
+                       query variants are merged (see search.iter_merged_items).
+            day: Day number in search process (number of days since start date)
+        Returns:
+            table: a pyarrow Table with one row per URL.
+    """
+    pa = _pyarrow()
+    columns = dict((name, []) for name in COLUMNS)
+
+    for item in search.iter_merged_items(json_data):
+        requests = item["response_info"]["requests"]
+        page_values = {
+            "segment_id": item["segment_id"],
+            "query": item["query_string"],
+            "api_key": item["api_info"]["api_key"],
+            "search_engine_id": item["api_info"]["search_engine_id"],
+            "start_index": requests[0]["start_index"] if requests else None,
+            "search_info_total_results": item["response_info"]["search_info_total_results"],
+            "search_time": item["response_info"]["search_time"]
+        }
+
+        for res in item["results"]:
+            columns["day"].append(day)
+            for name, value in page_values.items():
+                columns[name].append(value)
+            columns["title"].append(res["title"])
+            columns["url"].append(res["link"])
+
+    table_schema = schema()
+    arrays = []
+    for field in table_schema:
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(columns[field.name], type=field.type.value_type).dictionary_encode()
+                          .cast(field.type))
+        else:
+            arrays.append(pa.array(columns[field.name], type=field.type))
+
+    return pa.Table.from_arrays(arrays, schema=table_schema)
+
+
+class ParquetExporter(object):
+    """
+        Writes days of results to a Parquet file, one row group per day.
+
+        Args:
+            path: Path to the Parquet file. An existing file is overwritten.
+            compression: The Parquet compression codec to use.
+    """
+
+    def __init__(self, path, compression="zstd"):
+        pa = _pyarrow()
+        self.path = path
+        self.days = []
+        self._writer = pa.parquet.ParquetWriter(path, schema(), compression=compression)
+
+    def write_day(self, day, json_data):
+        """
+            Adds a day of results to the file as a single row group.
+            Args:
+                day: Day number in search process (number of days since start date)
+                json_data: the json output result from the searches, or an iterable
+                           of results (see search.iter_result_items)
+        """
+        table = results_to_table(json_data, day)
+        self._writer.write_table(table, row_group_size=max(table.num_rows, 1))
+        self.days.append(day)
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+def export_days(path, days, compression="zstd"):
+    """
+        Writes several days of results to a Parquet file.
+        Args:
+            path: Path to the Parquet file.
+            days: a dict of day number: json output result (or path to a results
+                  JSON file) for that day.
+            compression: The Parquet compression codec to use.
+    """
+    with ParquetExporter(path, compression) as exporter:
+        for day in sorted(days):
+            json_data = days[day]
+            if isinstance(json_data, str):
+                json_data = utils.get_json_from_file(json_data)
+            exporter.write_day(day, json_data)
+
+
+def row_groups_for_days(path, days):
+    """
+        Finds the row groups holding the given days, from the file's metadata,
+        without reading any data.
+        Args:
+            path: Path to the Parquet file.
+            days: a list of day numbers.
+        Returns:
+            row_groups: a list of row group indexes.
+    """
+    pa = _pyarrow()
+    metadata = pa.parquet.ParquetFile(path).metadata
+    day_column = metadata.schema.names.index("day")
+    wanted = set(days)
+
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(day_column).statistics
+        if stats is None or not stats.has_min_max:
+            row_groups.append(i)
+        elif any(stats.min <= day <= stats.max for day in wanted):
+            row_groups.append(i)
+
+    return row_groups
+
+
+def load_results(path, columns=None, days=None):
+    """
+        Loads selected columns and days from an exported Parquet file, only
+        reading the row groups and columns needed.
+        Args:
+            path: Path to the Parquet file.
+            columns: the names of the columns to load (see COLUMNS). None loads
+                     every column.
+            days: the day numbers to load. None loads every day.
+        Returns:
+            table: a pyarrow Table.
+    """
+    pa = _pyarrow()
+    parquet_file = pa.parquet.ParquetFile(path)
+
+    if days is None:
+        return parquet_file.read(columns=columns)
+
+    row_groups = row_groups_for_days(path, days)
+    read_columns = columns
+    if columns is not None and "day" not in columns:
+        read_columns = list(columns) + ["day"]
+
+    table = parquet_file.read_row_groups(row_groups, columns=read_columns)
+
+    # a row group may hold more than one day if it was written by another tool
+    mask = pa.compute.is_in(table.column("day"), value_set=pa.array(list(days), type=pa.int32()))
+    table = table.filter(mask)
+
+    if read_columns is not columns:
+        table = table.select(columns)
+
+    return table
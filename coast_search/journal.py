@@ -0,0 +1,109 @@
+"""
+    Title: journal.py
+    Author: Ashley Williams
+    Description: A journal of the pages completed during a daily search. Each
+    page is appended to the journal as soon as it has been fetched, so if the
+    search fails part way through it can be resumed, skipping every page that
+    has already been completed.
+"""
+import json
+import os
+import threading
+
+
+class RunJournal(object):
+    """
+        An append-only JSON lines journal of completed (segment_id, run, start)
+        units and their results.
+
+        Args:
+            path: Path to the journal file.
+            resume: If True, the units already in the journal are loaded so
+                    they can be skipped. Otherwise the journal is started
+                    again from empty.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._completed = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        if resume and os.path.exists(path):
+            self._load()
+            self._file = open(path, "a", encoding="utf-8")
+        else:
+            self._file = open(path, "w", encoding="utf-8")
+
+    def _load(self):
+        end = 0
+        with open(self.path, "rb") as ifile:
+            for line in ifile:
+                if not line.endswith(b"\n"):
+                    # the last line is cut short if the previous run was killed mid write
+                    break
+                end += len(line)
+                try:
+                    entry = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    continue
+                key = (entry["segment_id"], entry.get("variant"), entry["run"], entry["start"])
+                self._completed[key] = entry["result"]
+
+        # cut off the partial line, so the next entry is not appended onto it
+        if end < os.path.getsize(self.path):
+            with open(self.path, "r+b") as ofile:
+                ofile.truncate(end)
+
+    def get(self, segment_id, run, start, variant=None):
+        """
+            Returns:
+                result: The journaled result for the unit, or None if it has not
+                        been completed.
+        """
+        return self._completed.get((segment_id, variant, run, start))
+
+    def record(self, segment_id, run, start, result, variant=None):
+        """
+            Appends a completed unit to the journal and flushes it to disk.
+            Args:
+                segment_id: The segment which the result belongs to.
+                run: The run within the day, starting from 0.
+                start: The index of the first result on the page.
+                result: The output from search.query_page.
+                variant: The index of the segment's query variant, if the
+                         segment was split (see query_generator.iter_segment_variants).
+        """
+        entry = {"segment_id": segment_id, "run": run, "start": start, "result": result}
+        if variant is not None:
+            entry["variant"] = variant
+        line = json.dumps(entry)
+
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def __len__(self):
+        """
+            Returns:
+                count: the number of units loaded from the journal when resuming.
+        """
+        return len(self._completed)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def journal_path(directory, day):
+    """
+        Returns the path of the journal for the given day.
+        Args:
+            directory: The directory journals are kept in.
+            day: The day of the search period.
+    """
+    return os.path.join(directory, "journal_day_" + str(day) + ".jsonl")
@@ -0,0 +1,165 @@
+"""
+    Title: jsonl.py
+    Author: Ashley Williams
+    Description: Reading and writing JSON Lines files, one JSON object per
+    line, optionally compressed with gzip (.gz) or zstandard (.zst). Records
+    are appended as soon as they are written, and read back lazily, so neither
+    side needs to hold a whole file in memory.
+    zstandard is an optional dependency: pip install coast_search[zstd]
+"""
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import zlib
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+EXTENSIONS = {
+    None: "",
+    GZIP: ".gz",
+    ZSTD: ".zst"
+}
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression requires zstandard. Install it with: pip install coast_search[zstd]")
+    return zstandard
+
+
+def compression_for_path(path):
+    """
+        Returns the compression implied by a file's extension: "gzip", "zstd" or None.
+    """
+    if path.endswith(".gz"):
+        return GZIP
+    if path.endswith(".zst"):
+        return ZSTD
+    return None
+
+
+def open_text(path, mode):
+    """
+        Opens a, possibly compressed, text file.
+        Args:
+            path: Path to the file. The compression is taken from the extension.
+            mode: "r", "w" or "a".
+        Returns:
+            file: a text file object.
+    """
+    compression = compression_for_path(path)
+
+    if compression == GZIP:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+
+    if compression == ZSTD:
+        zstandard = _zstandard()
+        if mode == "r":
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True,
+                                                             closefd=True)
+        else:
+            # every writer adds a new frame, and frames can be read back to back
+            raw = zstandard.ZstdCompressor().stream_writer(open(path, mode + "b"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+
+    return open(path, mode, encoding="utf-8")
+
+
+class JsonLinesWriter(object):
+    """
+        Appends JSON records to a file, one per line.
+
+        Args:
+            path: Path to the file. Compression is taken from the extension.
+                  The directory is created if it does not exist.
+            fsync_every: If set, the file is flushed and fsynced after every
+                         this many records, rather than left to the OS.
+    """
+
+    def __init__(self, path, fsync_every=None):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.records = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._file = open_text(path, "a")
+
+    def write(self, record):
+        """
+            Appends a record to the file.
+            Args:
+                record: any JSON serialisable object.
+        """
+        line = json.dumps(record)
+
+        with self._lock:
+            self._file.write(line + "\n")
+            self.records += 1
+            if self.fsync_every and self.records % self.fsync_every == 0:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def sync(self):
+        """
+            Flushes the file and asks the OS to write it to disk.
+        """
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self.fsync_every:
+                self._sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+def iter_json_lines(path):
+    """
+        Lazily reads the records back from a JSON lines file. If the file was
+        cut short, e.g. because the run writing it was killed, every complete
+        record before that point is returned and a warning is logged.
+        Args:
+            path: Path to the file. Compression is taken from the extension.
+        Returns:
+            records: a generator of the records, in the order they were written.
+    """
+    with open_text(path, "r") as ifile:
+        try:
+            for line in ifile:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # only the last line, which has no newline yet, can have been cut short
+                    if line.endswith("\n"):
+                        raise
+                    logging.warning("{0} is incomplete, its last line was cut short".format(path))
+                    return
+                yield record
+        except (EOFError, zlib.error) as e:
+            logging.warning("{0} is incomplete, stopped reading at: {1}".format(path, e))
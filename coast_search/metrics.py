@@ -0,0 +1,286 @@
+"""
+    Title: metrics.py
+    Author: Ashley Williams
+    Description: Collects metrics about a day's searches: how long each API
+    call took (as a histogram per api key and segment), the calls, errors,
+    retries, cache hits, quota used and response bytes of each api key, and
+    the time spent writing to disk. A run's metrics can be written as a JSON
+    summary next to the results, and as a Prometheus textfile for the
+    node_exporter textfile collector. Api keys are never written out in
+    full, only their last 4 characters and a short hash (see key_label).
+"""
+import hashlib
+import json
+import os
+import threading
+
+from time import time
+
+# seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WRITE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+PREFIX = "coast_search_"
+
+_KEY_COUNTERS = [
+    ("calls", "API calls made, including failed ones."),
+    ("errors", "API calls that failed."),
+    ("retries", "Failed API calls that were tried again."),
+    ("cache_hits", "Pages taken from the response cache instead of the API."),
+    ("quota_used", "API calls that succeeded, and so count against the daily quota."),
+    ("response_bytes", "Bytes of the API's responses.")
+]
+
+
+def key_label(api_key):
+    """
+        Returns:
+            label: the api key with all but its last 4 characters hidden,
+                   followed by a short hash of the whole key, so two keys
+                   ending in the same characters still get different labels,
+                   e.g. "****1234-9f86d081".
+    """
+    digest = hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()
+    return "****" + str(api_key)[-4:] + "-" + digest[:8]
+
+
+class Histogram(object):
+    """
+        Counts observed values into buckets, as a Prometheus histogram does.
+        Args:
+            buckets: The upper bounds of the buckets, in increasing order.
+                     Larger values are only counted in the total.
+    """
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+            Returns:
+                counts: a list of (upper bound, number of values at or below it),
+                        ending with ("+Inf", count).
+        """
+        total = 0
+        counts = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            counts.append((bound, total))
+        counts.append(("+Inf", self.count))
+        return counts
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "buckets": {str(bound): count for bound, count in self.cumulative()}
+        }
+
+
+class Metrics(object):
+    """
+        The metrics of a run. Safe to update from several threads at once.
+        Args:
+            latency_buckets: The buckets of the API call latency histograms.
+            write_buckets: The buckets of the disk write time histograms.
+    """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, write_buckets=WRITE_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self.write_buckets = write_buckets
+        self.started = time()
+        self.finished = None
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._latency = {}
+        self._writes = {}
+        self._segments = {}
+
+    def _key(self, api_key):
+        counters = self._keys.get(api_key)
+        if counters is None:
+            counters = self._keys[api_key] = {name: 0 for name, _ in _KEY_COUNTERS}
+        return counters
+
+    def observe_call(self, api_key, segment_id, seconds, response_bytes=0, error=False):
+        """
+            Records an API call.
+            Args:
+                api_key: The api key the call was made with.
+                segment_id: The segment the call was for.
+                seconds: How long the call took, not counting any wait on the rate limiter.
+                response_bytes: The size of the response body.
+                error: True if the call failed.
+        """
+        with self._lock:
+            counters = self._key(api_key)
+            counters["calls"] += 1
+            counters["response_bytes"] += response_bytes
+            if error:
+                counters["errors"] += 1
+            else:
+                counters["quota_used"] += 1
+
+            histogram = self._latency.get((api_key, segment_id))
+            if histogram is None:
+                histogram = self._latency[(api_key, segment_id)] = Histogram(self.latency_buckets)
+            histogram.observe(seconds)
+
+    def record_retry(self, api_key):
+        with self._lock:
+            self._key(api_key)["retries"] += 1
+
+    def record_cache_hit(self, api_key):
+        with self._lock:
+            self._key(api_key)["cache_hits"] += 1
+
+    def observe_write(self, target, seconds):
+        """
+            Records the time taken by a write to disk.
+            Args:
+                target: What was written, e.g. "backup" or "results".
+                seconds: How long the write took.
+        """
+        with self._lock:
+            histogram = self._writes.get(target)
+            if histogram is None:
+                histogram = self._writes[target] = Histogram(self.write_buckets)
+            histogram.observe(seconds)
+
+    def observe_segment(self, segment_id, seconds):
+        """
+            Records how long searching a segment took, from its first call to its last result.
+        """
+        with self._lock:
+            self._segments[segment_id] = self._segments.get(segment_id, 0) + seconds
+
+    def finish(self):
+        """
+            Marks the end of the run.
+        """
+        self.finished = time()
+
+    def key_totals(self, api_key):
+        """
+            Returns:
+                counters: the calls, errors, retries, cache_hits, quota_used and
+                          response_bytes of an api key.
+        """
+        with self._lock:
+            return dict(self._key(api_key))
+
+    def summary(self):
+        """
+            Returns:
+                summary: the metrics as a dict, ready to be written as JSON.
+        """
+        with self._lock:
+            keys = {}
+            for api_key, counters in self._keys.items():
+                keys[key_label(api_key)] = dict(counters, latency_seconds={})
+            for (api_key, segment_id), histogram in self._latency.items():
+                keys[key_label(api_key)]["latency_seconds"][str(segment_id)] = histogram.to_dict()
+
+            return {
+                "started": self.started,
+                "seconds": round((self.finished or time()) - self.started, 3),
+                "keys": keys,
+                "segment_seconds": {str(segment_id): round(seconds, 3)
+                                    for segment_id, seconds in self._segments.items()},
+                "write_seconds": {target: histogram.to_dict() for target, histogram in self._writes.items()}
+            }
+
+    def prometheus_text(self, labels=None):
+        """
+            Formats the metrics in the Prometheus text exposition format.
+            Args:
+                labels: A dict of labels to add to every sample, e.g. {"study": "credibility"}.
+            Returns:
+                text: the metrics.
+        """
+        common = sorted((labels or {}).items())
+
+        def sample(name, value, extra=()):
+            pairs = common + list(extra)
+            label_text = ",".join('{0}="{1}"'.format(key, _escape(value)) for key, value in pairs)
+            return "{0}{1}{2} {3}".format(PREFIX, name, "{" + label_text + "}" if pairs else "", value)
+
+        def header(name, kind, help_text):
+            return ["# HELP {0}{1} {2}".format(PREFIX, name, help_text), "# TYPE {0}{1} {2}".format(PREFIX, name, kind)]
+
+        def histogram_lines(name, histogram, extra):
+            lines = []
+            for bound, count in histogram.cumulative():
+                lines.append(sample(name + "_bucket", count, extra + [("le", bound)]))
+            lines.append(sample(name + "_sum", repr(histogram.sum), extra))
+            lines.append(sample(name + "_count", histogram.count, extra))
+            return lines
+
+        with self._lock:
+            lines = []
+            for counter, help_text in _KEY_COUNTERS:
+                lines += header(counter + "_total", "counter", help_text)
+                for api_key, counters in sorted(self._keys.items()):
+                    lines.append(sample(counter + "_total", counters[counter], [("api_key", key_label(api_key))]))
+
+            lines += header("request_latency_seconds", "histogram", "Time taken by each API call.")
+            for (api_key, segment_id), histogram in sorted(self._latency.items(), key=lambda item: str(item[0])):
+                lines += histogram_lines("request_latency_seconds", histogram,
+                                         [("api_key", key_label(api_key)), ("segment_id", segment_id)])
+
+            lines += header("disk_write_seconds", "histogram", "Time taken by each write to disk.")
+            for target, histogram in sorted(self._writes.items()):
+                lines += histogram_lines("disk_write_seconds", histogram, [("target", target)])
+
+            lines += header("run_seconds", "gauge", "Time taken by the run.")
+            lines.append(sample("run_seconds", round((self.finished or time()) - self.started, 3)))
+            lines += header("run_finished_timestamp_seconds", "gauge", "When the run finished.")
+            lines.append(sample("run_finished_timestamp_seconds", round(self.finished or time(), 3)))
+
+        return "\n".join(lines) + "\n"
+
+    def write_summary(self, path):
+        """
+            Writes the summary to a JSON file.
+            Returns:
+                path: the path written.
+        """
+        _write_atomically(path, json.dumps(self.summary(), indent=2))
+        return path
+
+    def write_prometheus(self, path, labels=None):
+        """
+            Writes the metrics to a Prometheus textfile. The file is replaced in
+            one step, so the textfile collector never reads it half written.
+            Returns:
+                path: the path written.
+        """
+        _write_atomically(path, self.prometheus_text(labels))
+        return path
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomically(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = "{0}.{1}.tmp".format(path, os.getpid())
+    with open(temp_path, "w", encoding="utf-8") as ofile:
+        ofile.write(text)
+    os.replace(temp_path, path)
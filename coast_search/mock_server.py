@@ -0,0 +1,366 @@
+"""
+    Title: mock_server.py
+    Author: Ashley Williams
+    Description: A local stand-in for the Google Custom Search API's
+    customsearch/v1 list method, for testing and load testing searches
+    without spending quota or needing a network. The results of a query are
+    made up, but are always the same for the same query, search engine and
+    page. Latency, a share of failed calls, a daily quota per api key (over
+    which calls get 429 responses) and the limit on how far the results can
+    be paged through can all be set. Point coast_search at it with
+    clients.set_root_url, the COAST_SEARCH_ROOT_URL environment variable, or
+    "customsearch_root_url" in the config file.
+
+    Usage: coast-search-mock-server --port 8080 --latency 0.05 --error-rate 0.01 --quota 100
+"""
+import argparse
+import hashlib
+import json
+import random
+import socketserver
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from coast_search import clients
+
+DEFAULT_TOTAL_RESULTS = None
+# Google returns at most 100 results for a query, 10 at a time
+DEFAULT_MAX_RESULTS = 100
+RESULTS_PER_PAGE = 10
+
+_DOMAINS = ["medium.com", "stackoverflow.com", "github.com", "en.wikipedia.org", "dev.to", "reddit.com",
+            "news.ycombinator.com", "martinfowler.com", "softwareengineering.stackexchange.com", "blog.example.org"]
+
+
+def _digest(*parts):
+    return hashlib.sha1("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def total_results(query, search_engine_id):
+    """
+        Returns:
+            total: the made up number of results for a query, which is the same every time.
+    """
+    return 1000 + int(_digest("total", query, search_engine_id)[:8], 16) % 1000000
+
+
+def make_item(query, search_engine_id, position):
+    """
+        Returns:
+            item: the made up result at a position (from 1) of a query's results.
+    """
+    digest = _digest(query, search_engine_id, position)
+    domain = _DOMAINS[int(digest[:8], 16) % len(_DOMAINS)]
+    words = [word for word in query.replace('"', " ").replace("(", " ").replace(")", " ").split()
+             if word not in ("OR", "AND") and not word.startswith("-")]
+    slug = "-".join(words[:4]) or "result"
+    link = "https://{0}/{1}/{2}-{3}".format(domain, digest[8:16], slug, position)
+    title = "{0} - result {1}".format(" ".join(words[:6]) or query, position)
+    snippet = "A made up result for {0}, number {1}.".format(query, position)
+
+    return {
+        "kind": "customsearch#result",
+        "title": title,
+        "htmlTitle": title,
+        "link": link,
+        "displayLink": domain,
+        "snippet": snippet,
+        "htmlSnippet": snippet,
+        "formattedUrl": link,
+        "htmlFormattedUrl": link
+    }
+
+
+def make_response(query, search_engine_id, start=1, num=RESULTS_PER_PAGE, total=None,
+                  max_results=DEFAULT_MAX_RESULTS):
+    """
+        Builds the response to a list call, shaped like Google's.
+        Args:
+            query: The q parameter.
+            search_engine_id: The cx parameter.
+            start: The index of the first result on the page, from 1.
+            num: The number of results on a page.
+            total: The total number of results of the query. Defaults to a made
+                   up number that depends on the query (see total_results).
+            max_results: The furthest through the results that can be paged.
+        Returns:
+            response: the response as a dict.
+    """
+    if total is None:
+        total = total_results(query, search_engine_id)
+
+    last = min(start + num - 1, total, max_results)
+    items = [make_item(query, search_engine_id, position) for position in range(start, last + 1)]
+
+    def request(start_index):
+        return {
+            "title": "Google Custom Search - " + query,
+            "totalResults": str(total),
+            "searchTerms": query,
+            "count": num,
+            "startIndex": start_index,
+            "inputEncoding": "utf8",
+            "outputEncoding": "utf8",
+            "safe": "off",
+            "cx": search_engine_id
+        }
+
+    queries = {"request": [request(start)]}
+    if start > 1:
+        queries["previousPage"] = [request(max(1, start - num))]
+    if last < min(total, max_results):
+        queries["nextPage"] = [request(start + num)]
+
+    search_time = 0.1 + int(_digest("time", query, start)[:4], 16) / 65536.0 / 2
+
+    response = {
+        "kind": "customsearch#search",
+        "url": {
+            "type": "application/json",
+            "template": (clients.DEFAULT_ROOT_URL + clients.LIST_PATH +
+                         "?q={searchTerms}&num={count?}&start={startIndex?}&safe={safe?}&cx={cx?}&alt=json")
+        },
+        "queries": queries,
+        "context": {"title": "Mock search engine " + search_engine_id},
+        "searchInformation": {
+            "searchTime": search_time,
+            "formattedSearchTime": "{0:.2f}".format(search_time),
+            "totalResults": str(total),
+            "formattedTotalResults": "{0:,}".format(total)
+        }
+    }
+    if items:
+        response["items"] = items
+    return response
+
+
+def error_response(code, status, reason, message):
+    """
+        Returns:
+            response: an error body, shaped like Google's.
+    """
+    return {
+        "error": {
+            "code": code,
+            "message": message,
+            "errors": [{"message": message, "domain": "global", "reason": reason}],
+            "status": status
+        }
+    }
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keeps the connection open between calls, as Google does
+    protocol_version = "HTTP/1.1"
+    # otherwise the headers and body are sent as separate small packets, and each call waits on a delayed ack
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status, body = self.server.mock.respond(self.path)
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockSearchServer(object):
+    """
+        A local server answering customsearch/v1 list calls with made up results.
+
+        Args:
+            host: The address to listen on.
+            port: The port to listen on. 0 picks a free port (see url).
+            latency: The number of seconds each call takes at least.
+            jitter: Up to this many more seconds are added to each call, at random.
+            error_rate: The share of calls that fail with a 500 response. Whether
+                        a call fails depends on the seed, the page and how many
+                        times the page has been asked for, so a run can be repeated.
+            quota: The number of calls each api key may make. Calls past it get
+                   a 429 response until reset_quota is called. None means no limit.
+            max_results: The furthest through a query's results that can be paged.
+                         Asking for a page past it gets a 400 response.
+            total: The total number of results of every query. Defaults to a made
+                   up number for each query.
+            seed: The seed for the failed calls.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, quota=None,
+                 max_results=DEFAULT_MAX_RESULTS, total=DEFAULT_TOTAL_RESULTS, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota = quota
+        self.max_results = max_results
+        self.total = total
+        self.seed = seed
+
+        self.stats = {"calls": 0, "served": 0, "errors": 0, "quota_exceeded": 0, "bad_requests": 0}
+        self._calls_per_key = {}
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.mock = self
+
+    @property
+    def url(self):
+        """
+            The root url of the server, to pass to clients.set_root_url.
+        """
+        host, port = self._server.server_address[:2]
+        return "http://{0}:{1}/".format(host, port)
+
+    def calls_for_key(self, api_key):
+        """
+            Returns:
+                calls: the number of calls made with the api key since the quota was reset.
+        """
+        with self._lock:
+            return self._calls_per_key.get(api_key, 0)
+
+    def reset_quota(self):
+        """
+            Starts a new day: every api key may make quota calls again.
+        """
+        with self._lock:
+            self._calls_per_key = {}
+
+    def _fails(self, query, search_engine_id, start):
+        with self._lock:
+            attempt = self._attempts.get((query, search_engine_id, start), 0)
+            self._attempts[(query, search_engine_id, start)] = attempt + 1
+        return int(_digest(self.seed, query, search_engine_id, start, attempt)[:8], 16) / float(16 ** 8) < \
+            self.error_rate
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def respond(self, path):
+        """
+            Answers a request.
+            Args:
+                path: The path and query string of the request.
+            Returns:
+                (status, body): the HTTP status and the JSON body.
+        """
+        self._count("calls")
+        url = urlparse(path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if url.path.rstrip("/") != "/" + clients.LIST_PATH:
+            self._count("bad_requests")
+            return 404, error_response(404, "NOT_FOUND", "notFound", "Not found: " + url.path)
+
+        query = params.get("q")
+        search_engine_id = params.get("cx")
+        api_key = params.get("key")
+        try:
+            start = int(params.get("start", 1))
+            num = int(params.get("num", RESULTS_PER_PAGE))
+        except ValueError:
+            start, num = 0, 0
+
+        if not query or not search_engine_id or not api_key or start < 1 or not 1 <= num <= RESULTS_PER_PAGE \
+                or start + num - 1 > self.max_results:
+            self._count("bad_requests")
+            return 400, error_response(400, "INVALID_ARGUMENT", "badRequest",
+                                       "Request contains an invalid argument.")
+
+        with self._lock:
+            calls = self._calls_per_key.get(api_key, 0) + 1
+            self._calls_per_key[api_key] = calls
+        if self.quota is not None and calls > self.quota:
+            self._count("quota_exceeded")
+            return 429, error_response(429, "RESOURCE_EXHAUSTED", "rateLimitExceeded",
+                                       "Quota exceeded for quota metric 'Queries' and limit 'Queries per day'.")
+
+        if self.error_rate and self._fails(query, search_engine_id, start):
+            self._count("errors")
+            return 500, error_response(500, "INTERNAL", "backendError", "Backend Error")
+
+        self._count("served")
+        return 200, make_response(query, search_engine_id, start, num, self.total, self.max_results)
+
+    def start(self):
+        """
+            Starts serving on a background thread.
+            Returns:
+                server: the server itself.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+            Stops serving and closes the socket.
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+        return False
+
+
+def main(argv=None):
+    """
+        The coast-search-mock-server command. Serves until interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Serve made up Custom Search results locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds each call takes at least")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds per call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls that fail with a 500")
+    parser.add_argument("--quota", type=int, default=None, help="calls per api key before 429 responses")
+    parser.add_argument("--max-results", type=int, default=DEFAULT_MAX_RESULTS,
+                        help="how far through the results can be paged")
+    parser.add_argument("--total", type=int, default=DEFAULT_TOTAL_RESULTS, help="total results of every query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = MockSearchServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.quota,
+                              args.max_results, args.total, args.seed)
+    print("Serving customsearch/v1 on {0} (set COAST_SEARCH_ROOT_URL={0})".format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(json.dumps(server.stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
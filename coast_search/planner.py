@@ -0,0 +1,165 @@
+"""
+    Title: planner.py
+    Author: Ashley Williams
+    Description: Checks a study's daily searches against the daily quota of
+    each api key. Every query costs number_of_runs * ceil(number_of_results / 10)
+    calls on its key. A plan that goes over the quota can either be refused, or
+    spread over several days so that each key stays within its quota, with each
+    segment then searched once every len(schedule) days.
+"""
+import logging
+import math
+
+# the free version of the Custom Search API is limited to 100 searches per day
+FREE_DAILY_QUOTA = 100
+
+REFUSE = "refuse"
+SPREAD = "spread"
+
+
+def calls_per_query(number_of_runs, number_of_results):
+    """
+        Returns the number of API calls needed to run one query for a day.
+        Args:
+            number_of_runs: number of desired runs (from config file)
+            number_of_results: number of desired results (from config file)
+    """
+    return number_of_runs * int(math.ceil(number_of_results / 10.0))
+
+
+def key_budget(query_dict_list, number_of_runs, number_of_results):
+    """
+        Works out how many calls each api key needs for a day's queries.
+        Args:
+            query_dict_list: the output from query_generator.add_api_config_to_queries
+            number_of_runs: number of desired runs (from config file)
+            number_of_results: number of desired results (from config file)
+        Returns:
+            budget: a dict of api_key: {"se_names", "segments", "queries", "calls"}. A segment
+                    split into several query variants is listed once, but every
+                    variant is counted in "queries" and "calls".
+    """
+    calls = calls_per_query(number_of_runs, number_of_results)
+    budget = {}
+
+    for query_object in query_dict_list:
+        key = budget.setdefault(query_object["api_key"],
+                                {"se_names": [], "segments": [], "queries": 0, "calls": 0})
+        if query_object.get("se_name") not in key["se_names"]:
+            key["se_names"].append(query_object.get("se_name"))
+        if query_object["segment_id"] not in key["segments"]:
+            key["segments"].append(query_object["segment_id"])
+        key["queries"] += 1
+        key["calls"] += calls
+
+    return budget
+
+
+def plan_schedule(query_dict_list, number_of_runs, number_of_results, daily_quota=None, policy=REFUSE):
+    """
+        Plans which segments are searched on which day so that no api key goes
+        over its daily quota.
+        Args:
+            query_dict_list: the output from query_generator.add_api_config_to_queries
+            number_of_runs: number of desired runs (from config file)
+            number_of_results: number of desired results (from config file)
+            daily_quota: the number of calls each api key may make per day. None
+                         means there is no limit.
+            policy: "refuse" raises an exception if a key would go over its quota.
+                    "spread" splits the segments over as many days as needed.
+        Returns:
+            plan: a dict with the "budget" of each key, the "daily_quota", and the
+                  "schedule": a list of days, each a list of segment ids to search.
+    """
+    budget = key_budget(query_dict_list, number_of_runs, number_of_results)
+    segment_ids = []
+    for query_object in query_dict_list:
+        if query_object["segment_id"] not in segment_ids:
+            segment_ids.append(query_object["segment_id"])
+
+    over_quota = [key for key, value in budget.items() if daily_quota is not None and value["calls"] > daily_quota]
+
+    if daily_quota is None:
+        for key, value in budget.items():
+            if value["calls"] > FREE_DAILY_QUOTA:
+                logging.warning("{0} needs {1} calls a day, more than the free quota of {2}.".format(
+                    value["se_names"], value["calls"], FREE_DAILY_QUOTA))
+
+    if not over_quota:
+        schedule = [segment_ids]
+    elif policy == REFUSE:
+        raise Exception("The daily quota of {0} calls is exceeded by: {1}".format(
+            daily_quota, ", ".join("{0} ({1} calls)".format(budget[key]["se_names"], budget[key]["calls"])
+                                   for key in over_quota)))
+    elif policy == SPREAD:
+        schedule = _spread(query_dict_list, calls_per_query(number_of_runs, number_of_results), daily_quota)
+    else:
+        raise Exception("Unknown quota policy: " + str(policy))
+
+    return {
+        "daily_quota": daily_quota,
+        "budget": budget,
+        "schedule": schedule
+    }
+
+
+def _spread(query_dict_list, calls, daily_quota):
+    """
+        First-fit packing of segments into days. Queries sharing a segment id
+        are kept together on the same day.
+    """
+    segment_costs = {}
+    for query_object in query_dict_list:
+        costs = segment_costs.setdefault(query_object["segment_id"], {})
+        costs[query_object["api_key"]] = costs.get(query_object["api_key"], 0) + calls
+
+    days = []
+    for segment_id, costs in segment_costs.items():
+        if any(cost > daily_quota for cost in costs.values()):
+            raise Exception("Segment {0} needs more than the daily quota of {1} calls on its own.".format(
+                segment_id, daily_quota))
+
+        for day in days:
+            if all(day["used"].get(key, 0) + cost <= daily_quota for key, cost in costs.items()):
+                break
+        else:
+            day = {"segments": [], "used": {}}
+            days.append(day)
+
+        day["segments"].append(segment_id)
+        for key, cost in costs.items():
+            day["used"][key] = day["used"].get(key, 0) + cost
+
+    return [day["segments"] for day in days]
+
+
+def plan_for_config(config, query_dict_list):
+    """
+        Plans the schedule using the quota settings in the config file.
+        "daily_quota" is the number of calls each api key may make per day, and
+        "quota_policy" is either "refuse" (the default) or "spread".
+        Args:
+            config: the config file contents
+            query_dict_list: the output from query_generator.add_api_config_to_queries
+        Returns:
+            plan: the output from plan_schedule
+    """
+    return plan_schedule(
+        query_dict_list,
+        config['number_of_runs'],
+        config['number_of_results'],
+        config.get('daily_quota'),
+        config.get('quota_policy', REFUSE)
+    )
+
+
+def segments_for_day(plan, day):
+    """
+        Returns the segment ids to search on the given day of the search period.
+        Args:
+            plan: the output from plan_schedule
+            day: Day number in search process (number of days since start date,
+                 starting from 1)
+    """
+    schedule = plan["schedule"]
+    return schedule[(day - 1) % len(schedule)]
@@ -3,10 +3,10 @@
     from the config, given n number of dimensions and any constraints
 """
 
-from random_words import RandomWords
-
+import hashlib
 import itertools
 import functools
+import random as random_module
 
 
 def get_random_query(words_to_exclude):
@@ -17,40 +17,97 @@ def get_random_query(words_to_exclude):
         1. The random query returned wont contain any word that exists in
         any topic string or indicator list.
         2. The random query string will always be three words long.
+        3. The word list is only loaded once per process. For repeatable
+        queries, use a RandomQueryGenerator with a seed.
     Args:
         words_to_exclude: the list of words from each of the dimensions to use as stoplist
     Returns:
         qs: The generated random query.
     """
+    return RandomQueryGenerator(words_to_exclude).random_query()
 
-    stop_list = words_to_exclude
-
-    rw = RandomWords()
 
-    flag = False
+@functools.lru_cache(maxsize=None)
+def load_vocabulary():
+    """
+    Loads the random_words noun list, once per process.
+    Returns:
+        vocabulary: a sorted tuple of every noun.
+    """
+    from random_words import RandomWords
 
-    while (flag == False):
-        words = rw.random_words(count=3)
+    return tuple(sorted(itertools.chain.from_iterable(RandomWords().nouns.values())))
 
-        flag2 = True
-        for word in words:
-            if word in stop_list:
-                flag2 = False
 
-        if flag2 == True:
-            flag = True
+def _day_seed(seed, day):
+    # derived with a hash rather than hash(), so it is the same in every process
+    digest = hashlib.sha256("{0}:{1}".format(seed, day).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
 
-        # print(words)
 
-    qs = '"'
-    for word in words:
-        qs += word + ' '
+class RandomQueryGenerator(object):
+    """
+        Generates the random queries for segment 0. The vocabulary is filtered
+        against the dimension words once, so every query is a single sample,
+        with no retries.
 
-    # Replace final space with quote
-    qs = qs[:-1]
-    qs += '"'
+        Args:
+            words_to_exclude: the list of words from each of the dimensions to use as
+                              stoplist. Words within multi-word phrases are excluded too.
+            seed: Makes the queries repeatable. The same seed gives the same
+                  query for each day (see query_for_day), e.g. the study's name.
+            words_per_query: The number of words in each query.
+            vocabulary: The words to choose from. Defaults to the random_words nouns.
+    """
 
-    return qs
+    def __init__(self, words_to_exclude, seed=None, words_per_query=3, vocabulary=None):
+        stop_list = set()
+        for phrase in words_to_exclude:
+            stop_list.add(phrase)
+            stop_list.update(phrase.split())
+
+        if vocabulary is None:
+            vocabulary = load_vocabulary()
+
+        self.seed = seed
+        self.words_per_query = words_per_query
+        self.vocabulary = tuple(word for word in vocabulary if word not in stop_list)
+        self._random = random_module.Random(seed)
+
+        if len(self.vocabulary) < words_per_query:
+            raise Exception("Only {0} words are left in the vocabulary after excluding the dimension words."
+                            .format(len(self.vocabulary)))
+
+    def _query(self, rng):
+        return '"' + " ".join(rng.sample(self.vocabulary, self.words_per_query)) + '"'
+
+    def random_query(self):
+        """
+            Returns:
+                qs: the next random query, e.g. '"annexs mug regions"'.
+        """
+        return self._query(self._random)
+
+    def query_for_day(self, day):
+        """
+            Returns the random query for a day of the study. It depends only on the
+            seed and the day, so re-running a day gives the same query.
+            Args:
+                day: Day number in search process (number of days since start date)
+            Returns:
+                qs: the random query.
+        """
+        return self._query(random_module.Random(_day_seed(self.seed, day)))
+
+    def queries_for_days(self, days):
+        """
+            Generates the random queries for many days in one call, e.g. a year of them.
+            Args:
+                days: the day numbers, e.g. range(1, 366).
+            Returns:
+                queries: a dict of day: random query.
+        """
+        return dict((day, self.query_for_day(day)) for day in days)
 
 
 def pos_query_segment(phrase_list):
@@ -112,43 +169,306 @@ def generate_result_list(dimensions_data, dimensions, seed, random):
         result_string: a string of all phrases AND'd together ready for a
                        search engine.
     """
-    combinations = functools.reduce(lambda x, y: list(itertools.combinations(dimensions, y)) + x, range(len(dimensions) + 1), [])
-    result_list = []
+    return list(iter_segments(dimensions_data, dimensions, seed, random))
+
+
+def _masks_with_bits(width, bits):
+    """
+        Yields every mask of the given width with the given number of bits set,
+        in increasing order (Gosper's hack).
+    """
+    if bits == 0:
+        yield 0
+        return
+
+    mask = (1 << bits) - 1
+    limit = 1 << width
+    while mask < limit:
+        yield mask
+        lowest = mask & -mask
+        ripple = mask + lowest
+        mask = (((ripple ^ mask) >> 2) // lowest) | ripple
+
+
+def iter_segments(dimensions_data, dimensions, seed, random):
+    """
+    The lazy counterpart of generate_result_list, yielding the same segments, with the same ids,
+    in the same order. Each segment is a bitmask over the dimensions, and its query is joined
+    from the dimensions' "pos" and "neg" fragments, so only one segment is held at a time and
+    planning over many dimensions doesn't need every query string in memory.
+
+    Segments with the most dimensions come first, those with the same number of dimensions
+    follow the order of dimensions, and segments 0 and 1 come last. Negations are in the
+    order of dimensions.
+
+    Args:
+        dimensions_data: the dimensions data, with the "pos" and "neg" query fragments of each
+                         dimension (see generate_query_strings_n_dimensions)
+        dimensions: a list of names of the given dimensions
+        seed: the seed for seg 1
+        random: the random phrase for seg 0
+    Returns:
+        a generator of segment dicts (segment_id, logic, query)
+    """
+    names = list(dimensions)
+    width = len(names)
+    full = (1 << width) - 1
+    positives = [dimensions_data[name]["pos"] for name in names]
+    negatives = [dimensions_data[name]["neg"] for name in names]
+
     segment_count = 2  # starts at 2, as we always want 0 and 1 to be specific
 
-    for tup in combinations:
-        diff = list(set(dimensions).difference(set(tup)))
-        positives = [dimensions_data[x]["pos"] for x in tup]
-        negatives = [dimensions_data[x]["neg"] for x in diff]
+    if not names:
+        # as generate_result_list always did: the empty combination is the only segment
+        yield make_segment(segment_count, "", "")
+        return
+
+    # the first dimension is the highest bit, so decreasing masks follow the order of dimensions.
+    # the fragments for every value of the high and low halves of a mask are joined once up front
+    low_width = width // 2
+    low_mask = (1 << low_width) - 1
+    high = _fragment_table(names[:width - low_width], positives[:width - low_width], negatives[:width - low_width])
+    low = _fragment_table(names[width - low_width:], positives[width - low_width:], negatives[width - low_width:])
+
+    for size in range(width, 0, -1):
+        # the masks of this size in decreasing order are the complements of the masks of
+        # the remaining size in increasing order
+        for excluded in _masks_with_bits(width, width - size):
+            mask = full ^ excluded
+            high_in, low_in = high[mask >> low_width], low[mask & low_mask]
+            query_string = _join(" AND ", high_in[0], low_in[0])
+            logic_string = _join(" + ", high_in[1], low_in[1])
+
+            if excluded:
+                high_out, low_out = high[excluded >> low_width], low[excluded & low_mask]
+                query_string += " " + high_out[2] + low_out[2]
+                logic_string += " + !(" + _join(" + ", high_out[1], low_out[1]) + ")"
+
+            yield make_segment(segment_count, logic_string, query_string)
+            segment_count += 1
 
-        if diff:
-            if tup:
-                query_string = " AND ".join(positives) + " " + "".join(negatives)
-                logic_string = " + ".join(tup) + " + " + "!(" + " + ".join(diff) + ")"
+    all_negatives = "".join(negatives)
+    all_names = " + ".join(names)
+    yield make_segment(0, "random + !(" + all_names + ")", '"' + random + '" ' + all_negatives)
+    yield make_segment(1, "seed + !(" + all_names + ")", '"' + seed + '" ' + all_negatives)
 
-                add_to_result_list(result_list, segment_count, logic_string, query_string)
 
-                segment_count += 1
-            else:
-                add_to_result_list(result_list, 0,
-                                   "random + !(" + " + ".join(diff) + ")",
-                                   '"' + random + '" ' + "".join(negatives))
-                add_to_result_list(result_list, 1,
-                                   "seed + !(" + " + ".join(diff) + ")",
-                                   '"' + seed + '" ' + "".join(negatives))
-        else:
-            add_to_result_list(result_list, segment_count, " + ".join(tup), " AND ".join(positives))
+def _fragment_table(names, positives, negatives):
+    # mask -> (positives AND'd, names joined, negatives) of the dimensions in the mask
+    width = len(names)
+    table = []
+    for mask in range(1 << width):
+        included = [i for i in range(width) if mask & (1 << (width - 1 - i))]
+        table.append((
+            " AND ".join([positives[i] for i in included]),
+            " + ".join([names[i] for i in included]),
+            "".join([negatives[i] for i in included])
+        ))
+    return table
+
+
+def _join(separator, first, second):
+    if first and second:
+        return first + separator + second
+    return first or second
+
+
+def iter_segment_dimensions(dimensions):
+    """
+    Yields the dimensions each segment includes and excludes, in the same order as iter_segments.
+    Args:
+        dimensions: a list of names of the given dimensions
+    Returns:
+        a generator of (segment_id, included, excluded), where included and excluded are lists of
+        dimension names. Segments 0 and 1 include none of the dimensions.
+    """
+    names = list(dimensions)
+    width = len(names)
+    full = (1 << width) - 1
+    bits = [1 << (width - 1 - i) for i in range(width)]
+
+    if not names:
+        yield 2, [], []
+        return
+
+    segment_count = 2
+    for size in range(width, 0, -1):
+        for excluded in _masks_with_bits(width, width - size):
+            mask = full ^ excluded
+            yield (segment_count,
+                   [names[i] for i in range(width) if mask & bits[i]],
+                   [names[i] for i in range(width) if excluded & bits[i]])
             segment_count += 1
 
-    return result_list
+    yield 0, [], names
+    yield 1, [], names
 
 
-def add_to_result_list(result_list, seg_id, logic, query):
-    result_list.append({
+def count_words(phrases):
+    """
+    Returns the number of words in a list of phrases, as counted against key_max.
+    """
+    return sum(len(phrase.split(" ")) for phrase in phrases)
+
+
+def chunk_phrases(phrases, max_words):
+    """
+    Splits a list of phrases into consecutive chunks of at most max_words words each.
+    Args:
+        phrases: a list of phrases (e.g. reasoning/experience indicators)
+        max_words: the most words a chunk may have
+    Returns:
+        chunks: a list of lists of phrases
+    """
+    chunks = []
+    chunk = []
+    words = 0
+
+    for phrase in phrases:
+        phrase_words = len(phrase.split(" "))
+        if phrase_words > max_words:
+            raise Exception("The phrase \"{0}\" has more than the {1} words left for it in a query."
+                            .format(phrase, max_words))
+        if chunk and words + phrase_words > max_words:
+            chunks.append(chunk)
+            chunk = []
+            words = 0
+        chunk.append(phrase)
+        words += phrase_words
+
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _allocate(needs, budget):
+    # shares the word budget between the parts of a query: a part that needs less than an equal
+    # share gets what it needs, and what it leaves is shared between the rest
+    allocation = [0] * len(needs)
+    remaining = list(range(len(needs)))
+
+    while remaining:
+        share = budget // len(remaining)
+        fitting = [i for i in remaining if needs[i] <= share]
+        if not fitting:
+            for i in remaining:
+                allocation[i] = share
+            break
+        for i in fitting:
+            allocation[i] = needs[i]
+            budget -= needs[i]
+        remaining = [i for i in remaining if needs[i] > share]
+
+    return allocation
+
+
+def iter_segment_variants(dimensions_dict, seed, random, key_max, random_word_count=None):
+    """
+    Like iter_segments, but a segment whose query would have more than key_max words is split
+    into several query variants that each fit. Segments that fit are yielded unchanged.
+
+    Each included dimension is split into chunks, and there is a variant for every combination
+    of chunks, so the segment's results are the union of the variants' results. The excluded
+    dimensions' words can also be split into chunks, each excluded by its own variant; a result
+    then only belongs to the segment if every chunk's variant found it (see
+    search.merge_segment_variants).
+
+    Each variant has the segment's id and logic, and a "variant" dict of its "index" and the
+    "count" of variants of the segment, the "group" (combination of included chunks) it is in,
+    and its "negative_chunk" of the segment's "negative_chunks".
+
+    Args:
+        dimensions_dict: dictionary containing the dimensions data. key=name, value=list of words
+        seed: the seed for seg 1
+        random: the random phrase for seg 0
+        key_max: the maximum number of words (32 in Google's case)
+        random_word_count: the number of words in the random phrase, if random is a placeholder
+    Returns:
+        a generator of segment dicts (segment_id, logic, query, and variant if it was split)
+    """
+    if random_word_count is None:
+        random_word_count = len(random.split(" "))
+
+    dimensions_data, words_to_exclude = build_dimensions_data(dimensions_dict)
+    names = list(dimensions_dict)
+    segment_dimensions = iter_segment_dimensions(names)
+
+    for segment, (segment_id, included, excluded) in zip(iter_segments(dimensions_data, names, seed, random),
+                                                         segment_dimensions):
+        if segment_id == 0:
+            fixed_words, phrase = random_word_count, random
+        elif segment_id == 1:
+            fixed_words, phrase = len(seed.split(" ")), seed
+        else:
+            fixed_words, phrase = 0, None
+
+        positives = [dimensions_dict[name] for name in included]
+        negatives = list(itertools.chain.from_iterable(dimensions_dict[name] for name in excluded))
+
+        needs = [count_words(words) for words in positives]
+        if negatives:
+            needs.append(count_words(negatives))
+
+        if fixed_words + sum(needs) <= key_max:
+            yield segment
+            continue
+
+        allocation = _allocate(needs, key_max - fixed_words)
+        if min(allocation) < 1:
+            raise Exception("Segment {0} ({1}) can't be split to fit in {2} words.".format(
+                segment_id, segment["logic"], key_max))
+
+        positive_chunks = [chunk_phrases(words, allocation[i]) for i, words in enumerate(positives)]
+        negative_chunks = chunk_phrases(negatives, allocation[-1]) if negatives else [[]]
+
+        groups = list(itertools.product(*positive_chunks))
+        count = len(groups) * len(negative_chunks)
+
+        for group, chunks in enumerate(groups):
+            if phrase is None:
+                positive_query = " AND ".join(pos_query_segment(chunk) for chunk in chunks)
+            else:
+                positive_query = '"' + phrase + '"'
+
+            for negative_chunk, negative_words in enumerate(negative_chunks):
+                query_string = positive_query
+                if excluded:
+                    query_string += " " + neg_query_segment(negative_words)
+
+                yield {
+                    "segment_id": segment_id,
+                    "logic": segment["logic"],
+                    "query": query_string,
+                    "variant": {
+                        "index": group * len(negative_chunks) + negative_chunk,
+                        "count": count,
+                        "group": group,
+                        "negative_chunk": negative_chunk,
+                        "negative_chunks": len(negative_chunks)
+                    }
+                }
+
+
+def count_segments(number_of_dimensions):
+    """
+    Returns the number of segments iter_segments yields for the given number of dimensions:
+    one for every non-empty combination of dimensions, plus segments 0 and 1.
+    """
+    if number_of_dimensions == 0:
+        return 1
+    return (1 << number_of_dimensions) + 1
+
+
+def make_segment(seg_id, logic, query):
+    return {
         "segment_id": seg_id,
         "logic": logic,
         "query": query
-    })
+    }
+
+
+def add_to_result_list(result_list, seg_id, logic, query):
+    result_list.append(make_segment(seg_id, logic, query))
 
     return result_list
 
@@ -159,7 +479,8 @@ def add_api_config_to_queries(generated_query_strings, search_engines):
         api config.
 
         If only 1 API key is provided, it is assumed this is valid for many searches and is used for all queries
-        If more than 1 is provided, then the number of keys provided needs to match the number of queries
+        If more than 1 is provided, then the number of keys provided needs to match the number of queries,
+        or the number of segments, in which case every variant of a segment uses the segment's key
 
         Args:
             generated_query_strings: The output from the generate_query_strings
@@ -185,13 +506,24 @@ def add_api_config_to_queries(generated_query_strings, search_engines):
             query_object["se_name"] = se["name"]
             query_object["api_key"] = se["api_key"]
             query_object["search_engine_id"] = se["search_engine_id"]
+
+    elif len(search_engines) == len(set(query_object["segment_id"] for query_object in generated_query_strings)):
+        segment_engines = {}
+        for query_object in generated_query_strings:
+            if query_object["segment_id"] not in segment_engines:
+                segment_engines[query_object["segment_id"]] = search_engines[len(segment_engines)]
+            se = segment_engines[query_object["segment_id"]]
+            query_object["se_name"] = se["name"]
+            query_object["api_key"] = se["api_key"]
+            query_object["search_engine_id"] = se["search_engine_id"]
     else:
         raise Exception("Invalid number of API keys.")
 
     return generated_query_strings
 
 
-def generate_query_strings_n_dimensions(dimensions_dict, seed="software", key_max=32):
+def generate_query_strings_n_dimensions(dimensions_dict, seed="software", key_max=32, random_seed=None, day=None,
+                                        split=False):
     """
    Given dimensions and associated words, the seg1 seed and the max length of query,
    sets up and generates the query strings dynamically, depending on the number of dimensions.
@@ -199,23 +531,26 @@ def generate_query_strings_n_dimensions(dimensions_dict, seed="software", key_ma
             dimensions_dict: dictionary containing the dimensions data. key=name, value=list of words
             seed: seg1 seed
             key_max: the maximum number of words (32 in Google's case)
+            random_seed: if set, the seg0 random query is the one RandomQueryGenerator
+                         gives for this seed and the day, rather than a new one each time
+            day: the day number, used with random_seed
+            split: if True, segments with too many words are split into query variants that
+                   fit (see iter_segment_variants), instead of raising an exception
         Returns:
             result_data: an object containing data about each of the segments (id, logic, query)
             Returns None if check_length returns False
     """
 
-    dimensions_data = {}
+    dimensions_data, words_to_exclude = build_dimensions_data(dimensions_dict)
     dimensions = dimensions_dict.keys()
 
-    words_to_exclude = []
-
-    # setup the dimensions data object. Contains:
-    # the word list, positive segment and negative segment associated with the dimension
-    for name, lis in dimensions_dict.items():
-        dimensions_data[name] = {"wordsList": lis, "pos": pos_query_segment(lis), "neg": neg_query_segment(lis)}
-        words_to_exclude += lis
+    if random_seed is None:
+        random = get_random_query(words_to_exclude)
+    else:
+        random = RandomQueryGenerator(words_to_exclude, random_seed).query_for_day(day)
 
-    random = get_random_query(words_to_exclude)
+    if split:
+        return list(iter_segment_variants(dimensions_dict, seed, random, key_max))
 
     # if the number of keywords is less than the defined max number, don't generate the queries.
     if check_length(seed, random, dimensions_dict.values(), key_max):
@@ -223,6 +558,26 @@ def generate_query_strings_n_dimensions(dimensions_dict, seed="software", key_ma
         return result_data
 
 
+def build_dimensions_data(dimensions_dict):
+    """
+    Sets up the dimensions data object. Contains the word list, positive segment
+    and negative segment associated with each dimension.
+        Args:
+            dimensions_dict: dictionary containing the dimensions data. key=name, value=list of words
+        Returns:
+            (dimensions_data, words_to_exclude): the dimensions data, and every word of every
+                                                 dimension, to exclude from the random query
+    """
+    dimensions_data = {}
+    words_to_exclude = []
+
+    for name, lis in dimensions_dict.items():
+        dimensions_data[name] = {"wordsList": lis, "pos": pos_query_segment(lis), "neg": neg_query_segment(lis)}
+        words_to_exclude += lis
+
+    return dimensions_data, words_to_exclude
+
+
 def check_length(seed, random, query_words, key_max):
     """
     Google limits searches to 32 words, so we need to make sure we won't be generating anything longer
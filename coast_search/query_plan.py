@@ -0,0 +1,148 @@
+"""
+    Title: query_plan.py
+    Author: Ashley Williams
+    Description: Caches the compiled queries of a study on disk. Every segment's
+    query only depends on the dimension files, the seed and key_max, apart from
+    segment 0's random phrase, so the segments are compiled once into a plan,
+    stored under a hash of those inputs, and each day only the random phrase
+    is substituted in. A study whose dimension files haven't changed skips
+    reading, parsing and generating its queries.
+"""
+import hashlib
+import itertools
+import json
+import os
+
+from pathlib import Path
+
+from coast_search import query_generator
+from coast_search import utils
+
+# bump when the plan format or the way queries are generated changes, so old plans are not reused
+PLAN_VERSION = 1
+
+RANDOM_MARKER = "{random}"
+# the number of words RandomQueryGenerator puts in the random phrase
+RANDOM_WORDS = 3
+
+
+def plan_key(dimension_files, seed, key_max, split=False):
+    """
+        Hashes everything a plan depends on.
+        Args:
+            dimension_files: the paths of the dimension files, in config order.
+            seed: the seg1 seed.
+            key_max: the maximum number of words in a query.
+            split: whether segments with too many words are split into query variants.
+        Returns:
+            key: a hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([PLAN_VERSION, seed, key_max, split]).encode("utf-8"))
+    for filename in dimension_files:
+        # the dimension is named after the file, so the name is part of the key as well as the content
+        digest.update(Path(filename).stem.encode("utf-8") + b"\0")
+        with open(filename, "rb") as ifile:
+            digest.update(hashlib.sha256(ifile.read()).digest())
+    return digest.hexdigest()
+
+
+def compile_plan(dimensions_dict, seed="software", key_max=32, split=False):
+    """
+        Generates every segment's query, with a marker in place of segment 0's random phrase.
+        Args:
+            dimensions_dict: dictionary containing the dimensions data. key=name, value=list of words
+            seed: the seg1 seed.
+            key_max: the maximum number of words in a query.
+            split: if True, segments with too many words are split into query variants
+                   (see query_generator.iter_segment_variants).
+        Returns:
+            plan: a dict of the seed, key_max, whether segments are split, the number of
+                  words in the dimensions, the words to exclude from the random phrase,
+                  and the segments.
+    """
+    dimensions_data, words_to_exclude = query_generator.build_dimensions_data(dimensions_dict)
+    if split:
+        segments = list(query_generator.iter_segment_variants(dimensions_dict, seed, RANDOM_MARKER, key_max,
+                                                              RANDOM_WORDS))
+    else:
+        segments = list(query_generator.iter_segments(dimensions_data, dimensions_dict.keys(), seed, RANDOM_MARKER))
+
+    return {
+        "version": PLAN_VERSION,
+        "seed": seed,
+        "key_max": key_max,
+        "split": split,
+        "dimension_words": len(" ".join(itertools.chain.from_iterable(dimensions_dict.values())).split(" ")),
+        "words_to_exclude": words_to_exclude,
+        "segments": segments
+    }
+
+
+def load_plan(cache_dir, dimension_files, seed="software", key_max=32, split=False):
+    """
+        Returns the plan for the dimension files from the cache, compiling and
+        storing it first if it isn't there.
+        Args:
+            cache_dir: the directory the plans are stored in.
+            dimension_files: the paths of the dimension files, in config order.
+            seed: the seg1 seed.
+            key_max: the maximum number of words in a query.
+            split: see compile_plan.
+        Returns:
+            plan: see compile_plan.
+    """
+    path = os.path.join(cache_dir, plan_key(dimension_files, seed, key_max, split) + ".json")
+
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as ifile:
+                return json.load(ifile)
+        except ValueError:
+            # a plan cut short by a crash is compiled again
+            pass
+
+    plan = compile_plan(utils.get_from_file_list(dimension_files), seed, key_max, split)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # written to a temporary file and renamed, so a plan is never read half written
+    temp_path = "{0}.{1}.tmp".format(path, os.getpid())
+    with open(temp_path, "w", encoding="utf-8") as ofile:
+        json.dump(plan, ofile)
+    os.replace(temp_path, path)
+
+    return plan
+
+
+def queries_for_day(plan, random_seed=None, day=None):
+    """
+        Fills in the day's random phrase.
+        Args:
+            plan: a plan from load_plan or compile_plan.
+            random_seed: if set, the random phrase is the one RandomQueryGenerator gives
+                         for this seed and the day. Otherwise a new one is picked.
+            day: the day number, used with random_seed.
+        Returns:
+            result_data: the segments (id, logic, query), as from
+                         query_generator.generate_query_strings_n_dimensions.
+    """
+    generator = query_generator.RandomQueryGenerator(plan["words_to_exclude"], random_seed)
+    if random_seed is None:
+        random = generator.random_query()
+    else:
+        random = generator.query_for_day(day)
+
+    total_words = len(plan["seed"].split(" ")) + len(random.split(" ")) + plan["dimension_words"]
+    # a split plan's segments were each made to fit when it was compiled
+    if not plan.get("split") and total_words > plan["key_max"]:
+        message = "The maximum number of keywords is:", plan["key_max"], "\nYou have:", total_words
+        raise Exception(message)
+
+    result_data = []
+    for segment in plan["segments"]:
+        segment = dict(segment)
+        if segment["segment_id"] == 0:
+            segment["query"] = segment["query"].replace(RANDOM_MARKER, random, 1)
+        result_data.append(segment)
+
+    return result_data
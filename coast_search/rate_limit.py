@@ -0,0 +1,150 @@
+"""
+    Title: rate_limit.py
+    Author: Ashley Williams
+    Description: Token bucket rate limiting for calls to the Google Custom
+    Search API. Each api key/search engine pair gets its own bucket, so calls
+    on different keys never wait for each other, while calls on the same key
+    are spread out no faster than the configured rate. Also decides which
+    failed calls are worth trying again, and how long to wait first.
+"""
+import random
+import threading
+
+from time import monotonic, sleep
+
+
+# rate limits and server errors, which may succeed if tried again
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_BACKOFF = 1
+MAX_RETRY_DELAY = 32
+
+
+class TokenBucket(object):
+    """
+        A thread-safe token bucket.
+
+        Args:
+            rate: Tokens added per second. None (or 0) disables limiting.
+            capacity: The largest number of tokens the bucket can hold, i.e.
+                      how many calls may be made back to back.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self._lock = threading.Lock()
+        self.configure(rate, capacity)
+        self._tokens = self.capacity
+        self._last = monotonic()
+
+    def configure(self, rate, capacity=1):
+        """
+            Changes the rate and capacity of the bucket.
+            Args:
+                rate: Tokens added per second. None (or 0) disables limiting.
+                capacity: The largest number of tokens the bucket can hold.
+        """
+        if capacity < 1:
+            raise Exception("The capacity of a token bucket must be at least 1.")
+
+        with self._lock:
+            self.rate = float(rate) if rate else None
+            self.capacity = float(capacity)
+
+    def _reserve(self, tokens):
+        """
+            Takes the tokens if they are available.
+            Returns:
+                wait: 0 if the tokens were taken, otherwise the number of
+                      seconds until they will be available.
+        """
+        with self._lock:
+            if self.rate is None:
+                return 0
+
+            now = monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """
+            Blocks until the given number of tokens can be taken from the bucket.
+            Args:
+                tokens: The number of tokens to take.
+        """
+        wait = self._reserve(tokens)
+        while wait > 0:
+            sleep(wait)
+            wait = self._reserve(tokens)
+
+    async def acquire_async(self, tokens=1):
+        """
+            Waits, without blocking the event loop, until the given number of
+            tokens can be taken from the bucket.
+            Args:
+                tokens: The number of tokens to take.
+        """
+        import asyncio
+
+        wait = self._reserve(tokens)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._reserve(tokens)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(api_key, search_engine_id, sleep_wait_time=1, burst=1):
+    """
+        Returns the shared token bucket for an api key/search engine pair,
+        creating it on first use. The bucket is reconfigured if the rate or
+        burst have changed since it was created.
+        Args:
+            api_key: The api key of the search engine, provided by Google.
+            search_engine_id: The id of the Custom Search Engine provided by
+                              Google.
+            sleep_wait_time: The minimum number of seconds between calls
+                             (from the config file). 0 disables limiting.
+            burst: The number of calls that may be made back to back before
+                   sleep_wait_time applies.
+        Returns:
+            limiter: A TokenBucket.
+    """
+    rate = 1.0 / sleep_wait_time if sleep_wait_time else None
+    key = (api_key, search_engine_id)
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = TokenBucket(rate, burst)
+            _limiters[key] = limiter
+        elif limiter.rate != rate or limiter.capacity != burst:
+            limiter.configure(rate, burst)
+        return limiter
+
+
+def is_retryable(status):
+    """
+        Returns:
+            retryable: True if a call that failed with the HTTP status (or with
+                       None, for a connection error) may succeed if tried again.
+    """
+    return status is None or int(status) in RETRY_STATUSES
+
+
+def retry_delay(attempt):
+    """
+        Returns the number of seconds to wait before trying a call again. The
+        delay doubles with each attempt, from RETRY_BACKOFF up to
+        MAX_RETRY_DELAY, and is randomised so calls that failed together are
+        not all tried again at the same moment.
+        Args:
+            attempt: The number of the retry, from 1.
+    """
+    return min(RETRY_BACKOFF * 2 ** (attempt - 1), MAX_RETRY_DELAY) * random.uniform(0.5, 1)
@@ -0,0 +1,223 @@
+"""
+    Title: records.py
+    Author: Ashley Williams
+    Description: Compact record types for search results. A results page
+    (the output of search.get_object_to_write) is held as a SearchPage, and
+    each URL on it as a SearchHit. The segment, query and api details are held
+    once in a SearchMeta shared by every page and hit of a segment, instead of
+    being copied into a dict for each one, and every class uses __slots__, so
+    a month of results takes several times less memory than as nested dicts.
+    Converting to and from the dicts is lossless.
+"""
+import sys
+
+
+class SearchMeta(object):
+    """
+        The details of a segment's query, shared by all of its pages and hits.
+    """
+    __slots__ = ("segment_id", "query", "api_key", "search_engine_id", "number_of_results")
+
+    def __init__(self, segment_id, query, api_key, search_engine_id, number_of_results):
+        self.segment_id = segment_id
+        self.query = query
+        self.api_key = api_key
+        self.search_engine_id = search_engine_id
+        self.number_of_results = number_of_results
+
+    def key(self):
+        return (self.segment_id, self.query, self.api_key, self.search_engine_id, self.number_of_results)
+
+    def api_info(self):
+        return {
+            "api_key": self.api_key,
+            "search_engine_id": self.search_engine_id
+        }
+
+
+class SearchRequest(object):
+    """
+        The details of the request that returned a page.
+    """
+    __slots__ = ("cx", "count", "total_results", "start_index", "search_terms")
+
+    def __init__(self, cx, count, total_results, start_index, search_terms):
+        self.cx = cx
+        self.count = count
+        self.total_results = total_results
+        self.start_index = start_index
+        self.search_terms = search_terms
+
+    @classmethod
+    def from_dict(cls, obj):
+        return cls(obj["request_cx"], obj["request_count"], obj["total_results"], obj["start_index"],
+                   _intern(obj["search_terms"]))
+
+    def to_dict(self):
+        return {
+            "request_cx": self.cx,
+            "request_count": self.count,
+            "total_results": self.total_results,
+            "start_index": self.start_index,
+            "search_terms": self.search_terms
+        }
+
+
+class SearchHit(object):
+    """
+        A single result (title and link) on a page.
+    """
+    __slots__ = ("title", "link", "page")
+
+    def __init__(self, title, link, page):
+        self.title = title
+        self.link = link
+        self.page = page
+
+    @property
+    def meta(self):
+        return self.page.meta
+
+    def to_dict(self):
+        """
+            Returns:
+                obj: the hit as one of search.extract_search_results_from_JSON's
+                     "search_results".
+        """
+        meta = self.page.meta
+        return {
+            "title": self.title,
+            "url": self.link,
+            "segment_id": meta.segment_id,
+            "api_info": meta.api_info(),
+            "query": meta.query,
+            "response": self.page.response_info()
+        }
+
+
+class SearchPage(object):
+    """
+        A page of results, as written by search.get_object_to_write.
+
+        Args:
+            meta: The SearchMeta of the page's segment.
+            total_results: The total number of results the API reported.
+            search_time: The time the search took.
+            url_template: The API's url template.
+            requests: A tuple of SearchRequests.
+            hits: A list of (title, link) pairs.
+            links: The page's "links", if they differ from the links of the hits
+                   (e.g. after canonicalisation). Otherwise None.
+            variant: The page's query "variant", if its segment was split
+                     (see query_generator.iter_segment_variants). Otherwise None.
+    """
+    __slots__ = ("meta", "total_results", "search_time", "url_template", "requests", "hits", "_links", "variant")
+
+    def __init__(self, meta, total_results, search_time, url_template, requests, hits, links=None, variant=None):
+        self.meta = meta
+        self.total_results = total_results
+        self.search_time = search_time
+        self.url_template = url_template
+        self.requests = requests
+        self.hits = tuple(SearchHit(title, link, self) for title, link in hits)
+        self._links = tuple(links) if links is not None else None
+        self.variant = variant
+
+    @property
+    def links(self):
+        if self._links is not None:
+            return list(self._links)
+        return [hit.link for hit in self.hits]
+
+    @classmethod
+    def from_dict(cls, obj, metas=None):
+        """
+            Builds a page from the output of search.get_object_to_write.
+            Args:
+                obj: The dict to convert.
+                metas: A dict used to share SearchMeta objects between pages.
+                       Pass the same dict for every page of a day, or leave as
+                       None for a page on its own.
+            Returns:
+                page: a SearchPage.
+        """
+        api_info = obj["api_info"]
+        meta = SearchMeta(obj["segment_id"], _intern(obj["query_string"]), _intern(api_info["api_key"]),
+                          _intern(api_info["search_engine_id"]), obj["number_of_results_specified"])
+        if metas is not None:
+            meta = metas.setdefault(meta.key(), meta)
+
+        response_info = obj["response_info"]
+        hits = [(res["title"], res["link"]) for res in obj["results"]]
+
+        links = obj["links"]
+        if len(links) == len(hits) and all(link == hit[1] for link, hit in zip(links, hits)):
+            links = None
+
+        return cls(
+            meta,
+            response_info["search_info_total_results"],
+            response_info["search_time"],
+            _intern(response_info["url_template"]),
+            tuple(SearchRequest.from_dict(req) for req in response_info["requests"]),
+            hits,
+            links,
+            obj.get("variant")
+        )
+
+    def response_info(self):
+        return {
+            "search_info_total_results": self.total_results,
+            "search_time": self.search_time,
+            "url_template": self.url_template,
+            "requests": [req.to_dict() for req in self.requests]
+        }
+
+    def to_dict(self):
+        """
+            Returns:
+                obj: the page as written by search.get_object_to_write.
+        """
+        meta = self.meta
+        obj = {
+            "segment_id": meta.segment_id,
+            "query_string": meta.query,
+            "api_info": meta.api_info(),
+            "number_of_results_specified": meta.number_of_results,
+            "response_info": self.response_info(),
+            "results": [{"title": hit.title, "link": hit.link} for hit in self.hits],
+            "links": self.links
+        }
+        if self.variant is not None:
+            obj["variant"] = self.variant
+        return obj
+
+
+def _intern(value):
+    # the same query, key and template strings repeat on every page
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def iter_pages(items):
+    """
+        Converts results into SearchPages, sharing the SearchMeta of each segment.
+        Args:
+            items: An iterable of results, e.g. from search.iter_result_items.
+        Returns:
+            pages: a generator of SearchPages.
+    """
+    metas = {}
+    for item in items:
+        yield SearchPage.from_dict(item, metas)
+
+
+def iter_hits(pages):
+    """
+        Returns:
+            hits: a generator of the SearchHits of every page.
+    """
+    for page in pages:
+        for hit in page.hits:
+            yield hit
@@ -0,0 +1,153 @@
+"""
+    Title: response_cache.py
+    Author: Ashley Williams
+    Description: An opt-in, on-disk cache of responses from the Google Custom
+    Search API, stored in SQLite as compressed JSON. Responses are keyed by
+    query, search engine, start index, day and run, so re-running a day's
+    search after a crash or config change does not spend any more quota.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import zlib
+
+from time import time
+
+DEFAULT_TTL = 24 * 60 * 60
+
+
+class ResponseCache(object):
+    """
+        A SQLite backed cache of API responses.
+
+        Args:
+            path: Path to the SQLite file. It is created if it does not exist.
+            ttl: The number of seconds a response stays valid for. None keeps
+                 responses until they are evicted for space.
+            max_bytes: The largest total size of the stored (compressed)
+                       responses. The oldest responses are evicted first. None
+                       means no limit.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_bytes=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, created REAL NOT NULL, size INTEGER NOT NULL, data BLOB NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+        self._connection.commit()
+
+    @staticmethod
+    def make_key(query, search_engine_id, start, day, run):
+        """
+            Builds the cache key for a single page of results.
+            Args:
+                query: The query string.
+                search_engine_id: The id of the Custom Search Engine.
+                start: The index of the first result on the page.
+                day: The day of the search period.
+                run: The run within the day, starting from 0.
+            Returns:
+                key: a hex digest identifying the page.
+        """
+        raw = json.dumps([query, search_engine_id, start, day, run])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, query, search_engine_id, start, day, run):
+        """
+            Looks up a response, counting the hit or miss.
+            Returns:
+                response: The cached response, or None if there isn't a valid one.
+        """
+        key = self.make_key(query, search_engine_id, start, day, run)
+
+        with self._lock:
+            row = self._connection.execute("SELECT created, data FROM responses WHERE key = ?", (key,)).fetchone()
+
+            if row is not None and self.ttl is not None and row[0] + self.ttl < time():
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._connection.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        return json.loads(zlib.decompress(row[1]).decode("utf-8"))
+
+    def put(self, query, search_engine_id, start, day, run, response):
+        """
+            Stores a response, then evicts the oldest responses if the cache
+            has grown past max_bytes.
+        """
+        key = self.make_key(query, search_engine_id, start, day, run)
+        data = zlib.compress(json.dumps(response).encode("utf-8"))
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, created, size, data) VALUES (?, ?, ?, ?)",
+                (key, time(), len(data), data)
+            )
+            self._evict_for_space()
+            self._connection.commit()
+
+    def _evict_for_space(self):
+        if self.max_bytes is None:
+            return
+
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY created").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def evict_expired(self):
+        """
+            Removes every response older than the ttl.
+            Returns:
+                removed: the number of responses removed.
+        """
+        if self.ttl is None:
+            return 0
+
+        with self._lock:
+            cursor = self._connection.execute("DELETE FROM responses WHERE created < ?", (time() - self.ttl,))
+            self._connection.commit()
+            return cursor.rowcount
+
+    def stats(self):
+        """
+            Returns:
+                stats: a dict of the hits, misses, number of entries and total
+                       bytes stored.
+        """
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size
+        }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -2,28 +2,176 @@
     Title: search_command.py
     Author: Ashley Williams
     Description: A collection of functions that can be used for running
-    searches. This module calls is called by init, so there is no need to
-    import this module specifically.
+    searches. The package loads this module the first time coast_search.search
+    is used, so there is no need to import this module specifically.
     Refer to the documentation for details of how to use this module
     (http://coast_search.readthedocs.io/).
 """
-import sys
 import os
 import logging
 import json
-
+import threading
+
+from coast_search import backup
+from coast_search import clients
+from coast_search import journal
+from coast_search import jsonl
+from coast_search import metrics
+from coast_search import planner
+from coast_search import query_plan
+from coast_search import rate_limit
+from coast_search import records
+from coast_search import response_cache
+from coast_search import streaming
+from coast_search import url_index
+from coast_search import urls
 from coast_search import utils
+from coast_search import writer
 from coast_search import query_generator
 
-from time import time, sleep
-from collections import Counter
+from time import sleep, time
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def page_starts(number_of_results):
+    """
+        Returns the start index of each page needed to get the number of results.
+        The API returns 10 results per page, so 25 results gives 1, 11 and 21.
+        Args:
+            number_of_results: The number of results you wish to be returned.
+        Returns:
+            starts: a range of start indexes.
+    """
+    return range(1, number_of_results + 1, 10)
+
+
+def _count_response_bytes(api_call, sizes):
+    # the service only returns the parsed response, so the body's size is taken on its way through
+    postproc = api_call.postproc
+
+    def measured(resp, content):
+        sizes.append(len(content))
+        return postproc(resp, content)
+
+    api_call.postproc = measured
+
+
+def _is_retryable_error(error):
+    resp = getattr(error, "resp", None)
+    if resp is not None:
+        return rate_limit.is_retryable(getattr(resp, "status", 0))
+    return isinstance(error, OSError)
+
+
+def _error_reason(error):
+    # the HttpError's message includes the request's url, and so the api key
+    resp = getattr(error, "resp", None)
+    if resp is not None:
+        return "HTTP {0}".format(getattr(resp, "status", "error"))
+    return str(error)
+
+
+def _call_api(query, api_key, search_engine_id, segment_id, start, limiter, run_metrics, max_retries, pool):
+    attempt = 0
+    while True:
+        sizes = []
+        started = None
+        try:
+            service = clients.get_service(api_key) if pool is None else pool.get(api_key)
+            api_call = service.cse().list(
+                q=query,
+                cx=search_engine_id,
+                start=start
+            )
+            if run_metrics is not None:
+                _count_response_bytes(api_call, sizes)
+
+            # we wait between queries so that google dont think we're a robot
+            limiter.acquire()
+            started = time()
+            result = api_call.execute()
+        except Exception as e:
+            if run_metrics is not None and started is not None:
+                run_metrics.observe_call(api_key, segment_id, time() - started, error=True)
+            if attempt >= max_retries or not _is_retryable_error(e):
+                raise Exception(str(e))
+
+            attempt += 1
+            delay = rate_limit.retry_delay(attempt)
+            if run_metrics is not None:
+                run_metrics.record_retry(api_key)
+            logging.warning("Segment {0} : Page {1} failed ({2}), trying again in {3:.1f}s.".format(
+                segment_id, start, _error_reason(e), delay))
+            sleep(delay)
+            continue
+
+        if run_metrics is not None:
+            run_metrics.observe_call(api_key, segment_id, time() - started, sum(sizes))
+        return result
+
+
+def query_page(query, number_of_results, api_key, search_engine_id, segment_id, start, limiter=None, cache=None,
+               day=None, run=0, run_metrics=None, max_retries=0, pool=None):
+    """
+        Query the API for a single page of results.
+        Args:
+            query: The query string to run.
+            number_of_results: The number of results you wish to be returned
+                               in total (stored alongside the response).
+            api_key: The api key of the search engine, provided by Google.
+            search_engine_id: The id of the Custom Search Engine provided by
+                              Google.
+            segment_id: The segment which the results belong to.
+            start: The index of the first result on the page.
+            limiter: The TokenBucket to wait on before calling the API. Defaults
+                     to the shared limiter for the api key/search engine.
+            cache: A ResponseCache to consult before calling the API, and to
+                   store the response in afterwards. None disables caching.
+            day: The day of the search period (part of the cache key).
+            run: The run within the day, starting from 0 (part of the cache key).
+            run_metrics: A metrics.Metrics to record the call in, or None.
+            max_retries: The number of times to try again after a rate limit,
+                         server or connection error, waiting longer each time
+                         (see rate_limit.retry_delay).
+            pool: The clients.ServicePool to get the service from. Defaults to
+                  clients.default_pool.
+        Returns:
+            result: The page from Google as a JSON object, along with the query
+                    information.
+    """
+    if limiter is None:
+        limiter = rate_limit.get_limiter(api_key, search_engine_id)
+
+    result = None
+    if cache is not None:
+        result = cache.get(query, search_engine_id, start, day, run)
+        if result is not None and run_metrics is not None:
+            run_metrics.record_cache_hit(api_key)
+
+    if result is None:
+        result = _call_api(query, api_key, search_engine_id, segment_id, start, limiter, run_metrics, max_retries, pool)
 
-from googleapiclient.discovery import build
+        if cache is not None:
+            cache.put(query, search_engine_id, start, day, run, result)
 
+    return {
+        "query": query,
+        "number_of_results": number_of_results,
+        "api_key": api_key,
+        "search_engine_id": search_engine_id,
+        "segment_id": segment_id,
+        "response": result
+    }
 
-def queryAPI(query, number_of_results, api_key, search_engine_id, segment_id):
+
+def queryAPI(query, number_of_results, api_key, search_engine_id, segment_id, limiter=None,
+             max_workers=DEFAULT_MAX_WORKERS, cache=None, day=None, run=0, run_metrics=None, max_retries=0, pool=None):
     """
         Query the API, return the results as a list of JSON objects.
+        The pages are fetched concurrently, no faster than the limiter allows.
         Refer to the documentation for usage guidelines and descriptions of
         what each parameter means (http://coast_search.readthedocs.io/).
         Args:
@@ -36,46 +184,36 @@ def queryAPI(query, number_of_results, api_key, search_engine_id, segment_id):
             search_engine_id: The id of the Custom Search Engine provided by
                               Google.
             segment_id: The segment which the results belong to.
+            limiter: The TokenBucket to wait on before each call. Defaults to
+                     the shared limiter for the api key/search engine.
+            max_workers: The maximum number of pages fetched at once.
+            cache: A ResponseCache to consult before calling the API. None
+                   disables caching.
+            day: The day of the search period (part of the cache key).
+            run: The run within the day, starting from 0 (part of the cache key).
+            run_metrics: A metrics.Metrics to record the calls in, or None.
+            max_retries: The number of times to try a failed call again (see query_page).
+            pool: The clients.ServicePool to get the service from (see query_page).
         Returns:
             results_list: The results from Google as a list of JSON objects
         Err:
             In the event of an error, the error is printed to the stdout.
     """
-    service = build("customsearch", "v1", developerKey=api_key)
+    if limiter is None:
+        limiter = rate_limit.get_limiter(api_key, search_engine_id)
 
-    result_list = []
+    def fetch(start):
+        return query_page(query, number_of_results, api_key, search_engine_id, segment_id, start, limiter, cache, day,
+                          run, run_metrics, max_retries, pool)
 
     # make multiple api calls in multiples of 10 to get number of results
-    for i in range(0, number_of_results, 10):
-        i += 1
-        # print("i: " + str(i))
-
-        try:
-            api_call = service.cse().list(
-                q=query,
-                cx=search_engine_id,
-                start=i
-            )
-
-            #TODO: make the sleep time configurable (we wait between queries so that google dont think we're a robot)
-            sleep(1)
-            result = api_call.execute()
-
-            result_list.append({
-                "query": query,
-                "number_of_results": number_of_results,
-                "api_key": api_key,
-                "search_engine_id": search_engine_id,
-                "segment_id": segment_id,
-                "response": result
-            })
-        except Exception as e:
-            raise Exception(str(e))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        result_list = list(executor.map(fetch, page_starts(number_of_results)))
 
     return result_list
 
 
-def write_to_file(name, result, directory, extension):
+def write_to_file(name, result, directory, extension, run_metrics=None):
         """
             Writes to results to a file
             Args:
@@ -85,10 +223,11 @@ def write_to_file(name, result, directory, extension):
                                    as files.
                 extension: the desired file extension, e.g: json or txt
                 result: The output from running the query.
+                run_metrics: A metrics.Metrics to record the time taken in, or None.
         """
+        started = time()
         dir_path = directory + "/"
-        if not os.path.exists(dir_path):
-            os.makedirs(dir_path)
+        os.makedirs(dir_path, exist_ok=True)
 
         timestamp = time()
         ofile = open(dir_path + name + "_" + str(timestamp) + extension, "w", encoding="utf-8")
@@ -99,18 +238,23 @@ def write_to_file(name, result, directory, extension):
             ofile.write(str(result))
         ofile.close()
 
+        if run_metrics is not None:
+            run_metrics.observe_write("results", time() - started)
+
 
-def get_object_to_write(result):
+def get_object_to_write(result, canonicaliser=None):
     """
         Returns the constructed object containing the search results data, for later analysis.
         Args:
             result: The output from running the query
+            canonicaliser: a function applied to each link before it is added to "links",
+                           e.g. urls.Canonicaliser(). The links in "results" are left as they are.
         Returns:
             object_to_write: the constructed object containing desired search result data
 
     """
     result_items = []
-    urls = []
+    links = []
 
     if "items" in result["response"].keys():
         se_items = result["response"]["items"]
@@ -124,7 +268,7 @@ def get_object_to_write(result):
                 "link": link
             })
 
-            urls.append(link)
+            links.append(link if canonicaliser is None else canonicaliser(link))
 
     request_data = []
 
@@ -154,16 +298,23 @@ def get_object_to_write(result):
             "requests": request_data
         },
         "results": result_items,
-        "links": urls
+        "links": links
     }
 
+    if "variant" in result:
+        object_to_write["variant"] = result["variant"]
+
     return object_to_write
 
 
 def run_query(query_string, number_of_runs, number_of_results, api_key, search_engine_id, segment_id, day,
-              backup_dir):
+              backup_dir, sleep_wait_time=1, burst=1, max_workers=DEFAULT_MAX_WORKERS, cache=None, run_journal=None,
+              record_writer=None, backup_writer=None, canonicaliser=None, index=None, variant=None, run_metrics=None,
+              max_retries=0, pool=None):
     """
-        Runs the query against the Google Custom Search API. Writes the results to file and appends them to the extracted results list.
+        Runs the query against the Google Custom Search API. Backs up the raw results and appends them to the extracted results list.
+        Every page of every run is fetched concurrently, limited to one call
+        per sleep_wait_time seconds on this api key/search engine.
         Refer to the documentation for usage guidelines and descriptions of
         what each parameter means (http://coast_search.readthedocs.io/).
         Args:
@@ -183,32 +334,97 @@ def run_query(query_string, number_of_runs, number_of_results, api_key, search_e
             day: The day of the search period that the result has originated
                  from.
             backup_dir: A directory that can be used for storing results
-                        as files.
-        Returns: extracted_results: list of results
+                        as files. The raw results are appended to the day's
+                        backup file there (see backup.backup_path).
+            sleep_wait_time: The minimum number of seconds between calls on
+                             this api key (from the config file).
+            burst: The number of calls that may be made back to back.
+            max_workers: The maximum number of pages fetched at once.
+            cache: A ResponseCache to consult before calling the API. None
+                   disables caching.
+            run_journal: A RunJournal. Units already in it are not fetched again,
+                     and every newly fetched unit is recorded in it.
+            record_writer: A JsonLinesWriter. If given, each extracted result is
+                           written to it as soon as it is produced, instead of
+                           being returned.
+            backup_writer: The writer (e.g. from backup.open_backup) to back up
+                           the raw results to. By default the day's backup file
+                           in backup_dir is opened and closed again.
+            canonicaliser: A function applied to each link of the extracted
+                           results (see get_object_to_write), or None.
+            index: A url_index.UrlIndex to record the links of each
+                   extracted result in, or None.
+            variant: The "variant" of the query, if its segment was split into
+                     several queries (see query_generator.iter_segment_variants).
+                     It is kept with each result, so they can be merged again.
+            run_metrics: A metrics.Metrics to record the calls and the time
+                         taken in, or None.
+            max_retries: The number of times to try a failed call again (see query_page).
+            pool: The clients.ServicePool to get the services from (see query_page).
+        Returns: extracted_results: list of results (empty if record_writer is given)
 
     """
-    results = []
-    for i in range(0, number_of_runs):
-        #todo change to logger
-        print(query_string)
-        sys.stdout.write("Segment {0} : Running {1} out of {2} runs.\n".format(segment_id, i + 1, number_of_runs))
-        results += queryAPI(query_string, number_of_results, api_key, search_engine_id, segment_id)
+    started = time()
+    limiter = rate_limit.get_limiter(api_key, search_engine_id, sleep_wait_time, burst)
+    units = [(run, start) for run in range(0, number_of_runs) for start in page_starts(number_of_results)]
+
+    logging.info("Segment {0} : Running {1} runs of {2}".format(segment_id, number_of_runs, query_string))
+
+    variant_index = None if variant is None else variant["index"]
+
+    own_backup_writer = backup_writer is None
+    if own_backup_writer:
+        backup_writer = writer.BackgroundWriter(backup.open_backup(backup_dir, day),
+                                                metrics=run_metrics, name="backup")
+
+    def fetch(unit):
+        run, start = unit
+        if run_journal is not None:
+            res = run_journal.get(segment_id, run, start, variant_index)
+            if res is not None:
+                # it was backed up when it was journaled
+                return res
+
+        res = query_page(query_string, number_of_results, api_key, search_engine_id, segment_id, start, limiter,
+                         cache, day, run, run_metrics, max_retries, pool)
+        if variant is not None:
+            res["variant"] = variant
+
+        # as a backup incase something goes wrong, written before it is journaled so a resumed search never skips it
+        backup_writer.write(res)
+        logging.info("Segment {0} : Run {1} : Page {2} : Written to file.".format(segment_id, run + 1, start))
+        if run_journal is not None:
+            run_journal.record(segment_id, run, start, res, variant_index)
+        return res
 
     extracted_results = []
-    directory = backup_dir + "/" + "results_day_" + str(day)
-    for res in results:
-        filename = "day_" + str(day)
-        write_to_file(filename, res, directory, ".txt")
-        # write_results_to_file(day, res, backup_dir)  # as a backup incase something goes wrong
-        logging.info("Segment {0} : Run {1} : Written to file.\n".format(segment_id, i + 1))
-
-        extracted_results.append(get_object_to_write(res))
-        logging.info("Segment {0} : Run {1} : Written to db.\n".format(segment_id, i + 1))
+    try:
+        # named after the calling thread, so their log records go to its study's log (see run_daily_search)
+        with ThreadPoolExecutor(max_workers=max_workers,
+                                thread_name_prefix=threading.current_thread().name) as executor:
+            results = list(executor.map(fetch, units))
+
+        for (run, start), res in zip(units, results):
+            object_to_write = get_object_to_write(res, canonicaliser)
+            if index is not None:
+                index.add_result(object_to_write, day)
+
+            if record_writer is not None:
+                record_writer.write(object_to_write)
+            else:
+                extracted_results.append(object_to_write)
+            logging.info("Segment {0} : Run {1} : Page {2} : Written to db.".format(segment_id, run + 1, start))
+    finally:
+        if own_backup_writer:
+            backup_writer.close()
+
+    if run_metrics is not None:
+        run_metrics.observe_segment(segment_id, time() - started)
 
     return extracted_results
 
 
-def run_daily_search(config_file, write_to_file_flag):
+def run_daily_search(config_file, write_to_file_flag, engine="threads", resume=False):
     """
         Run a full daily search. This function can be set up as a cronjob
         (or scheduled task on Windows) to search over consecutive days.
@@ -216,21 +432,77 @@ def run_daily_search(config_file, write_to_file_flag):
         how the config file should be structured (http://coast_search.readthedocs.io/).
         Args:
             config_file: Path to a JSON file containing all relevant information for
-                         conducting the searches.
+                         conducting the searches, or the already loaded config.
             write_to_file_flag: boolean flag for writing to file
-        Returns: results from the search
+            engine: "threads" searches one segment at a time, fetching its pages
+                    on a thread pool. "async" searches every segment at once with
+                    asyncio (requires aiohttp).
+            resume: If True, carries on from the journal left by an earlier,
+                    unfinished search on the same day, only fetching the pages
+                    that are missing from it.
+        Returns: results from the search. If the config sets "output_format" to
+                 "jsonl" and write_to_file_flag is True, each result is instead
+                 streamed to a JSON lines file as it is produced (compressed if
+                 "output_compression" is "gzip" or "zstd") and fsynced every
+                 "output_fsync_every" results, and the path of that file is
+                 returned as {"results_file": path}.
+                 If write_to_file_flag is True, a summary of the run's metrics
+                 (see the metrics module) is written next to the results, and
+                 if the config sets "metrics_textfile", they are also written
+                 there for Prometheus, whether or not the search succeeded.
     """
-    config = utils.get_json_from_file(config_file)
+    if isinstance(config_file, dict):
+        config = config_file
+    else:
+        config = utils.get_json_from_file(config_file)
+
+    log_handler = _open_study_log(config["logging_file"])
+    try:
+        return _search_day(config, write_to_file_flag, engine, resume)
+    except Exception:
+        # logged while the study's handler is still attached, so its log says why it failed
+        logging.exception("Daily search failed.")
+        raise
+    finally:
+        _close_study_log(log_handler)
+
+
+def _open_study_log(logging_file):
+    # logging.basicConfig only works once per process, so a batch of studies would all log to the first
+    # study's file. Each study gets its own handler instead, taking the records of the thread running the
+    # study and of the threads it starts (named after it, see run_query).
+    thread_name = threading.current_thread().name
+    handler = logging.FileHandler(logging_file)
+    handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    handler.addFilter(lambda record: record.threadName == thread_name or
+                      record.threadName.startswith(thread_name + "_"))
+    logging.getLogger().addHandler(handler)
+    return handler
+
+
+def _close_study_log(handler):
+    logging.getLogger().removeHandler(handler)
+    handler.close()
 
-    logging.basicConfig(filename=config["logging_file"])
+
+def _search_day(config, write_to_file_flag, engine, resume):
 
     day = utils.number_of_days_past_start_date(config)
 
-    # Get the queries and indicators
-    dimensions_dict = utils.get_from_file_list(config['dimensions'])
+    if config.get('query_plan_cache_dir'):
+        # the queries only change with the dimension files, so they are compiled once and
+        # only the random phrase is filled in each day
+        compiled_plan = query_plan.load_plan(config['query_plan_cache_dir'], config['dimensions'], "software", 32,
+                                             config.get('split_long_queries', False))
+        generated_query_strings = query_plan.queries_for_day(compiled_plan, config.get('random_seed'), day)
+    else:
+        # Get the queries and indicators
+        dimensions_dict = utils.get_from_file_list(config['dimensions'])
 
-    # Now generate query string for each segment
-    generated_query_strings = query_generator.generate_query_strings_n_dimensions(dimensions_dict, "software", 32) #software and 32 from config
+        # Now generate query string for each segment
+        generated_query_strings = query_generator.generate_query_strings_n_dimensions(
+            dimensions_dict, "software", 32, config.get('random_seed'), day,
+            config.get('split_long_queries', False)) #software and 32 from config
 
     # Get API config and place it into list of dictionaries
     api_config = utils.get_json_from_file(config['api_details_file'])
@@ -238,87 +510,399 @@ def run_daily_search(config_file, write_to_file_flag):
 
     query_dict_list = query_generator.add_api_config_to_queries(generated_query_strings, search_engines)
 
-    results = run_all_queries(
+    # Only search the segments scheduled for today, so no key goes over its daily quota
+    quota_plan = planner.plan_for_config(config, query_dict_list)
+    todays_segments = planner.segments_for_day(quota_plan, day)
+    query_dict_list = [query_object for query_object in query_dict_list
+                       if query_object['segment_id'] in todays_segments]
+
+    cache = None
+    if config.get('response_cache_file'):
+        cache = response_cache.ResponseCache(
+            config['response_cache_file'],
+            config.get('response_cache_ttl', response_cache.DEFAULT_TTL),
+            config.get('response_cache_max_bytes')
+        )
+
+    journal_dir = config.get('journal_dir', config['search_backup_dir'])
+    run_journal = journal.RunJournal(journal.journal_path(journal_dir, day), resume)
+    if resume:
+        logging.info("Resuming day {0} with {1} completed pages.".format(day, len(run_journal)))
+
+    run_metrics = metrics.Metrics()
+
+    pool = None
+    if config.get('customsearch_root_url'):
+        # e.g. a mock_server, to try out a study without spending quota. Only this study's calls are sent there.
+        pool = clients.ServicePool(root_url=config['customsearch_root_url'])
+
+    record_writer = None
+    if write_to_file_flag and config.get('output_format', 'json') == 'jsonl':
+        name = "_results_day_" + str(day) + "_" + str(time())
+        extension = ".jsonl" + jsonl.EXTENSIONS[config.get('output_compression')]
+        # fsynced in batches, like the backup, so a killed search keeps the results written so far
+        record_writer = writer.BackgroundWriter(
+            jsonl.JsonLinesWriter(os.path.join(config['results_output_dir'], name + extension),
+                                  config.get('output_fsync_every', backup.DEFAULT_FSYNC_EVERY)),
+            config.get('writer_queue_size', writer.DEFAULT_QUEUE_SIZE),
+            run_metrics,
+            "results"
+        )
+
+    # disk writes are done on background threads, so they overlap with the API calls
+    backup_writer = writer.BackgroundWriter(backup.open_backup(
+        config['search_backup_dir'],
+        day,
+        config.get('backup_compression', jsonl.GZIP),
+        config.get('backup_fsync_every', backup.DEFAULT_FSYNC_EVERY)
+    ), config.get('writer_queue_size', writer.DEFAULT_QUEUE_SIZE), run_metrics, "backup")
+
+    # records every url found, so later days can tell which urls are new
+    index = url_index.index_from_config(config)
+
+    query_args = (
         query_dict_list,
         config['number_of_runs'],
         config['number_of_results'],
         day,
         config['search_backup_dir'],
+        config.get('sleep_wait_time', 1),
+        config.get('rate_limit_burst', 1),
+        config.get('max_workers', DEFAULT_MAX_WORKERS),
+        cache,
+        run_journal,
+        record_writer,
+        backup_writer,
+        urls.canonicaliser_from_config(config.get('canonicalise_urls')),
+        index,
+        run_metrics,
+        config.get('max_retries', 0),
+        pool
     )
 
-    if write_to_file_flag:
-        name = "_results_day_" + str(day)
-        write_to_file(name, results, config['results_output_dir'], ".json")
+    try:
+        if engine == "async":
+            import asyncio
+            from coast_search import async_search
+            results = asyncio.run(async_search.run_all_queries_async(*query_args))
+        elif engine == "threads":
+            results = run_all_queries(*query_args)
+        else:
+            raise Exception("Unknown engine: " + str(engine) + ". Expected \"threads\" or \"async\".")
+
+        if write_to_file_flag and record_writer is None:
+            name = "_results_day_" + str(day)
+            write_to_file(name, results, config['results_output_dir'], ".json", run_metrics)
+    finally:
+        closers = [run_journal.close]
+        if pool is not None:
+            closers.append(pool.clear)
+        if index is not None:
+            closers.append(lambda: _close_index(index, day))
+        if cache is not None:
+            closers.append(lambda: _close_cache(cache))
+        # closing the writers waits for their queues to drain, and re-raises any write error
+        closers.append(backup_writer.close)
+        if record_writer is not None:
+            closers.append(record_writer.close)
+        closers.append(lambda: _export_metrics(run_metrics, config, day, write_to_file_flag))
+        _close_all(closers)
+
+    if record_writer is not None:
+        return {"results_file": record_writer.path}
 
     return results
 
 
+def _close_all(closers):
+    # every resource is closed, and the metrics exported, even if closing an earlier one fails. The first
+    # error is raised once they all have been; any later ones are logged.
+    error = None
+    for close in closers:
+        try:
+            close()
+        except Exception as e:
+            if error is None:
+                error = e
+            else:
+                logging.exception("Could not close a resource of the search.")
+    if error is not None:
+        raise error
+
+
+def _close_index(index, day):
+    logging.info("URL index: {0} new urls today, {1} in total.".format(index.count_new(day), len(index)))
+    index.close()
+
+
+def _close_cache(cache):
+    logging.info("Response cache: {0}".format(cache.stats()))
+    cache.close()
+
+
+def _export_metrics(run_metrics, config, day, write_to_file_flag):
+    run_metrics.finish()
+    summary = run_metrics.summary()
+    logging.info("Day {0} took {1}s: {2}".format(day, summary["seconds"], json.dumps(summary["keys"])))
+
+    # a failure here is logged rather than raised, so it can't hide why the search itself failed
+    try:
+        if write_to_file_flag:
+            name = "_metrics_day_" + str(day) + "_" + str(time()) + ".json"
+            run_metrics.write_summary(os.path.join(config['results_output_dir'], name))
+        if config.get('metrics_textfile'):
+            run_metrics.write_prometheus(config['metrics_textfile'], config.get('metrics_labels'))
+    except Exception:
+        logging.exception("Could not write the metrics of day {0}.".format(day))
+
+
+def iter_result_items(json_data):
+    """
+    Yields each result (the output of get_object_to_write) from the output of the searches.
+    Args:
+        json_data: either the json output result from the searches ({"results": [[...], ...]}),
+                   or an iterable of results, such as jsonl.iter_json_lines on a JSON lines
+                   results file
+    Returns:
+        a generator of results
+    """
+    if isinstance(json_data, dict):
+        for seg in json_data["results"]:
+            for item in seg:
+                yield item
+    else:
+        for item in json_data:
+            yield item
+
+
+def iter_merged_items(json_data):
+    """
+    Like iter_result_items, but with the pages of each split segment's query variants merged
+    (see merge_segment_variants). Each variant only excluded some of the segment's excluded
+    words, so a page is only kept with the links that every variant in its group found, and
+    only once for the group, from its first variant's pages. The results of segments that
+    weren't split are yielded as they are read; the variants' pages are held back until every
+    result has been read.
+    Args:
+        json_data: json data result from queries, or an iterable of results (see iter_result_items)
+    Returns:
+        a generator of results
+    """
+    variant_items = []
+    for item in iter_result_items(json_data):
+        if item.get("variant") is None:
+            yield item
+        else:
+            variant_items.append(item)
+
+    for item in _iter_confirmed(variant_items):
+        yield item
+
+
+def _iter_confirmed(variant_items):
+    # (segment id, group) -> (the group's number of negative chunks, link -> the chunks that found it)
+    groups = {}
+    for item in variant_items:
+        variant = item["variant"]
+        negative_chunks, found = groups.setdefault((item["segment_id"], variant["group"]),
+                                                   (variant["negative_chunks"], {}))
+        for link in item["links"]:
+            found.setdefault(link, set()).add(variant["negative_chunk"])
+
+    confirmed = {}
+    for key, (negative_chunks, found) in groups.items():
+        confirmed[key] = set(link for link, chunks in found.items() if len(chunks) == negative_chunks)
+
+    for item in variant_items:
+        variant = item["variant"]
+        if variant["negative_chunk"] != 0:
+            continue
+
+        links = confirmed[(item["segment_id"], variant["group"])]
+        # the links are in the same order as the results they were taken from
+        kept = [i for i, link in enumerate(item["links"]) if link in links]
+        merged = dict(item)
+        merged["links"] = [item["links"][i] for i in kept]
+        if "results" in item:
+            merged["results"] = [item["results"][i] for i in kept]
+        yield merged
+
+
+class VariantIndex(object):
+    """
+    Wraps a url_index.UrlIndex, holding back the links of split segments' query variants until
+    every variant has been searched, so only the links confirmed by merging them (see
+    iter_merged_items) are recorded under the segment. Other results are recorded straight away.
+    Args:
+        index: the url_index.UrlIndex to record the links in
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._items = []
+        self._lock = threading.Lock()
+
+    def add_result(self, result, day):
+        if result.get("variant") is None:
+            return self.index.add_result(result, day)
+
+        with self._lock:
+            self._items.append({"segment_id": result["segment_id"], "variant": result["variant"],
+                                "links": result["links"]})
+        return []
+
+    def add_confirmed(self, day):
+        """
+        Records the confirmed links of the variants' results held back so far.
+        Args:
+            day: Day number in search process (number of days since start date)
+        """
+        with self._lock:
+            items, self._items = self._items, []
+        for item in _iter_confirmed(items):
+            self.index.add_result(item, day)
+
+
 def extract_search_results_from_JSON(json_data):
     """
     Given the json output of the search queries, extracts the results(i.e. the URLS, titles from the search results)
     Args:
-        json_data: the json output result from the searches
+        json_data: the json output result from the searches, or an iterable of results (see iter_result_items)
     Returns:
          json obj of the relevant extracted data
     """
 
-    results = json_data["results"]
-    search_results = []
+    search_results = list(_iter_extracted(iter_merged_items(json_data)))
+
+    search_results = {"search_results": search_results}
+
+    return search_results
+
+
+def extract_search_hits(json_data):
+    """
+    The compact counterpart of extract_search_results_from_JSON. Each result is a
+    records.SearchHit, which shares its page and segment details with the other hits,
+    instead of a dict holding its own copy of them. Use hit.to_dict() to get the dict.
+    Args:
+        json_data: the json output result from the searches, or an iterable of results (see iter_result_items)
+    Returns:
+         a list of records.SearchHit
+    """
+    return list(records.iter_hits(records.iter_pages(iter_merged_items(json_data))))
+
+
+def iter_search_hits(path):
+    """
+    The streaming counterpart of extract_search_hits.
+    Args:
+        path: path to a results file written by run_daily_search (.json or .jsonl,
+              optionally .gz or .zst compressed)
+    Returns:
+        a generator of records.SearchHit
+    """
+    return records.iter_hits(records.iter_pages(iter_merged_items(streaming.iter_results_file(path))))
+
 
-    for seg in results:
-        for item in seg:
-            seg_data = {
-                 "segment_id": item["segment_id"],
-                 "api_info": item["api_info"],
-                 "query": item["query_string"],
-                 "response": item["response_info"],
+def _iter_extracted(items):
+    for item in items:
+        seg_data = {
+             "segment_id": item["segment_id"],
+             "api_info": item["api_info"],
+             "query": item["query_string"],
+             "response": item["response_info"],
+        }
+
+        for res in item["results"]:
+            obj = {
+                "title": res["title"],
+                "url": res["link"]
             }
 
-            for res in item["results"]:
-                obj = {
-                    "title": res["title"],
-                    "url": res["link"]
-                }
+            combined_obj = {**obj, **seg_data}
+            yield combined_obj
 
-                combined_obj = {**obj, **seg_data}
-                search_results.append(combined_obj)
 
-    search_results = {"search_results": search_results}
+def iter_search_results(path):
+    """
+    The streaming counterpart of extract_search_results_from_JSON. Reads a results file
+    one result at a time, yielding the same records that would be in "search_results".
+    Args:
+        path: path to a results file written by run_daily_search (.json or .jsonl,
+              optionally .gz or .zst compressed)
+    Returns:
+        a generator of the extracted search results
+    """
+    return _iter_extracted(iter_merged_items(streaming.iter_results_file(path)))
 
-    return search_results
 
+def deduplicate_urls_stream(path, canonicaliser=None, hash_keys=False, url_table=True):
+    """
+    The streaming counterpart of deduplicate_urls. Reads a results file one result at a
+    time, so only the URLs, and not the whole file, are held in memory.
+    Args:
+        path: path to a results file written by run_daily_search (.json or .jsonl,
+              optionally .gz or .zst compressed)
+        canonicaliser, hash_keys, url_table: as for deduplicate_urls
+    Returns: the same as deduplicate_urls
+    """
+    return deduplicate_urls(streaming.iter_results_file(path), canonicaliser, hash_keys, url_table)
 
-def deduplicate_urls(json_data):
+
+def deduplicate_urls(json_data, canonicaliser=None, hash_keys=False, url_table=True):
     """
     function to create and return a list of deduplicated URLS
+    Runs in a single pass, in time linear in the total number of links.
     Args:
-        json_data: json data result from queries
+        json_data: json data result from queries, or an iterable of results (see iter_result_items)
+        canonicaliser: a function applied to each url before comparing them, e.g. urls.Canonicaliser(),
+                       so that variants of the same url are counted once. The canonical urls are returned.
+        hash_keys: compare 64-bit hashes of the urls (see urls.url_hash) instead of the urls themselves,
+                   which takes much less memory for large numbers of urls. The same urls are returned.
+        url_table: when hash_keys is True, keep a table from each hash back to its url, so urls can be
+                   returned. If False, the hashes are returned instead.
     Returns: a list of deduplicated urls. If there is duplication across segments, also returns a warning
+             listing each url found in more than one segment, along with those segments
     """
-    deduplicated_urls = []
-    temp_obj_list = []
-
-    merged_to_segments = {}
-    merged_dedup = {}
-    for seg in json_data["results"]:
-        for item in seg:
-            merged_to_segments.setdefault(item["segment_id"], []).extend(item["links"])
-    for k, v in merged_to_segments.items():
-        merged_dedup[k] = set(v)
-
-    # all_urls = list(set().union(*merged_dedup.values()))
-    all_urls = [item for sublist in merged_dedup.values() for item in sublist]
-
-    if len(all_urls) != len(set(all_urls)):
-        counts = Counter(all_urls)
-        duplicates = [value for value, count in counts.items() if count > 1]
-        segments_with_dup = []
-        warnings = []
-        for url in duplicates:
-            segments_with_dup.extend([key for (key, value) in merged_dedup.items() if url in value])
-            warnings.append({"url": url, "segments": segments_with_dup})
+    # url -> the segment it was first found in
+    first_segments = {}
+    # url -> every segment it was found in, only for urls found in more than one segment
+    shared_segments = {}
+    # hash -> the url it was made from
+    originals = {}
+
+    for item in iter_merged_items(json_data):
+        segment_id = item["segment_id"]
+        for url in item["links"]:
+            if canonicaliser is not None:
+                url = canonicaliser(url)
+            key = url
+            if hash_keys:
+                key = urls.url_hash(url)
+                if url_table:
+                    originals.setdefault(key, url)
+
+            first_segment = first_segments.setdefault(key, segment_id)
+            if first_segment != segment_id:
+                segments = shared_segments.get(key)
+                if segments is None:
+                    shared_segments[key] = [first_segment, segment_id]
+                elif segment_id not in segments:
+                    segments.append(segment_id)
+
+    if originals:
+        def output(key):
+            return originals[key]
+    else:
+        def output(key):
+            return key
+
+    deduplicated_urls = [output(key) for key in first_segments]
+
+    if shared_segments:
+        warnings = [{"url": output(key), "segments": segments} for key, segments in shared_segments.items()]
         return {
-            "deduplicated_urls": list(set(all_urls)),
+            "deduplicated_urls": deduplicated_urls,
             "warnings": {
                 "message": "same url found across more than 1 segment",
                 "occurrences": warnings
@@ -326,11 +910,34 @@ def deduplicate_urls(json_data):
         }
     else:
         return {
-            "deduplicated_urls": list(set(all_urls))
+            "deduplicated_urls": deduplicated_urls
         }
 
 
-def run_all_queries(query_dict_list, number_of_runs, number_of_results, day, search_backup_dir):
+def merge_segment_variants(json_data):
+    """
+    Merges the links found by the query variants of each split segment (see
+    query_generator.iter_segment_variants) back into the segment's links.
+    Within a group of variants, a link is only kept if every one of the group's variants
+    found it, since each of them only excluded some of the segment's excluded words.
+    The groups' links are then combined, as are the links of segments that weren't split.
+    Args:
+        json_data: json data result from queries, or an iterable of results (see iter_result_items)
+    Returns: a dict from each segment id to its links, in the order they were first found
+    """
+    # segment id -> the segment's links, as the keys of a dict to keep them in order
+    segment_links = {}
+    for item in iter_merged_items(json_data):
+        links = segment_links.setdefault(item["segment_id"], {})
+        for link in item["links"]:
+            links[link] = None
+
+    return {segment_id: list(links) for segment_id, links in segment_links.items()}
+
+
+def run_all_queries(query_dict_list, number_of_runs, number_of_results, day, search_backup_dir, sleep_wait_time=1,
+                    burst=1, max_workers=DEFAULT_MAX_WORKERS, cache=None, run_journal=None, record_writer=None,
+                    backup_writer=None, canonicaliser=None, index=None, run_metrics=None, max_retries=0, pool=None):
     """
     Given a list of queries and configuration parameters, calls the method run_query for each query object in the given list.
     Args:
@@ -339,23 +946,70 @@ def run_all_queries(query_dict_list, number_of_runs, number_of_results, day, sea
         number_of_results: number of desired results (from config file)
         day: Day number in search process (number of days since start date)
         search_backup_dir: location to store file output of searches
+        sleep_wait_time: minimum number of seconds between calls on each api key (from config file)
+        burst: number of calls that may be made back to back on each api key (from config file)
+        max_workers: maximum number of pages fetched at once for each query (from config file)
+        cache: a ResponseCache to consult before calling the API, or None
+        run_journal: a RunJournal of completed pages to skip and record into, or None
+        record_writer: a JsonLinesWriter to stream each extracted result to. The
+                       results are then written there instead of being returned.
+        backup_writer: the writer (e.g. from backup.open_backup) to back up the raw
+                       results to. By default the day's backup file is opened, and
+                       closed again at the end.
+        canonicaliser: a function applied to each link of the extracted results, or None
+        index: a url_index.UrlIndex to record the links of the extracted results in, or None. The links of
+               split segments' query variants are only recorded once every query has been run, and only
+               those confirmed by merging the variants (see iter_merged_items).
+        run_metrics: a metrics.Metrics to record the calls and writes in, or None
+        max_retries: number of times to try a failed call again (from config file)
+        pool: the clients.ServicePool to get the services from, or None for clients.default_pool
     Returns:
         object containing results of all of the queries
     """
 
     results = []
 
-    for query_object in query_dict_list:
-        results.append(run_query(
-            query_object['query'],
-            number_of_runs,
-            number_of_results,
-            query_object['api_key'],
-            query_object['search_engine_id'],
-            query_object['segment_id'],
-            day,
-            search_backup_dir
-        ))
+    own_backup_writer = backup_writer is None
+    if own_backup_writer:
+        backup_writer = writer.BackgroundWriter(backup.open_backup(search_backup_dir, day),
+                                                metrics=run_metrics, name="backup")
+
+    if index is not None:
+        index = VariantIndex(index)
+
+    try:
+        for query_object in query_dict_list:
+            segment_results = run_query(
+                query_object['query'],
+                number_of_runs,
+                number_of_results,
+                query_object['api_key'],
+                query_object['search_engine_id'],
+                query_object['segment_id'],
+                day,
+                search_backup_dir,
+                sleep_wait_time,
+                burst,
+                max_workers,
+                cache,
+                run_journal,
+                record_writer,
+                backup_writer,
+                canonicaliser,
+                index,
+                query_object.get('variant'),
+                run_metrics,
+                max_retries,
+                pool
+            )
+            if record_writer is None:
+                results.append(segment_results)
+
+        if index is not None:
+            index.add_confirmed(day)
+    finally:
+        if own_backup_writer:
+            backup_writer.close()
 
     return {
         "results": results
@@ -0,0 +1,136 @@
+"""
+    Title: streaming.py
+    Author: Ashley Williams
+    Description: Reads the results of the searches from a results JSON file
+    ({"results": [[...], ...]}) one result at a time, instead of loading the
+    whole file with json.load. Only the result currently being read is held in
+    memory, so files of any size can be processed. JSON lines results files
+    (see the jsonl module) are read with jsonl.iter_json_lines.
+"""
+import json
+
+from coast_search import jsonl
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+class _IncrementalReader(object):
+    """
+        Decodes JSON values from a text file a chunk at a time.
+    """
+
+    def __init__(self, ifile, chunk_size=DEFAULT_CHUNK_SIZE):
+        self._file = ifile
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self):
+        if self._eof:
+            return False
+
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+
+        # drop everything already consumed, so the buffer doesn't grow with the file
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """
+            Returns the next non-whitespace character without consuming it, or
+            "" at the end of the file.
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_more():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError("Expected {0!r} but found {1!r}".format(char, found))
+        self._pos += 1
+
+    def value(self):
+        """
+            Decodes and consumes the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if self._read_more():
+                    continue
+                raise
+
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and self._read_more():
+                continue
+
+            self._pos = end
+            return value
+
+
+def _iter_items(reader):
+    reader.expect("{")
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+
+        if key != "results":
+            reader.value()
+        else:
+            reader.expect("[")
+            while reader.peek() != "]":
+                reader.expect("[")
+                while reader.peek() != "]":
+                    yield reader.value()
+                    if reader.peek() == ",":
+                        reader.expect(",")
+                reader.expect("]")
+                if reader.peek() == ",":
+                    reader.expect(",")
+            reader.expect("]")
+
+        if reader.peek() == ",":
+            reader.expect(",")
+    reader.expect("}")
+
+
+def iter_results_file(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Lazily reads each result (the output of search.get_object_to_write) from
+        a results file.
+        Args:
+            path: Path to a results JSON file written by run_daily_search, or to
+                  a JSON lines results file (.jsonl). Either may be compressed
+                  (.gz or .zst).
+            chunk_size: The number of characters read from the file at a time.
+        Returns:
+            results: a generator of the results, in the order they are in the file.
+    """
+    name = path
+    compression = jsonl.compression_for_path(path)
+    if compression is not None:
+        name = path[:-len(jsonl.EXTENSIONS[compression])]
+
+    if name.endswith(".jsonl"):
+        for item in jsonl.iter_json_lines(path):
+            yield item
+        return
+
+    with jsonl.open_text(path, "r") as ifile:
+        for item in _iter_items(_IncrementalReader(ifile, chunk_size)):
+            yield item
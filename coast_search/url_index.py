@@ -0,0 +1,264 @@
+"""
+    Title: url_index.py
+    Author: Ashley Williams
+    Description: A persistent index of every URL found across the days of a
+    search, stored in SQLite. Each URL is recorded with the first and last day
+    it was seen and the segments it was found in, and is keyed on its 64-bit
+    hash (see urls.url_hash), so whether a URL is new today or has been seen
+    before is a single primary key lookup, without reloading earlier results.
+    For very large indexes, a Bloom filter (see the bloom module) can be put in
+    front of it, so most new URLs are answered without touching the database.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+from coast_search import bloom
+from coast_search import urls
+
+DEFAULT_FILENAME = "url_index.sqlite"
+
+NEW = "new"
+SEEN = "seen"
+
+_HASH_OFFSET = 2 ** 64
+_MAX_SIGNED = 2 ** 63
+
+
+def _key(url):
+    # SQLite integers are signed, so hashes from the top half of the range wrap around
+    value = urls.url_hash(url)
+    if value >= _MAX_SIGNED:
+        value -= _HASH_OFFSET
+    return value
+
+
+class UrlIndex(object):
+    """
+        A SQLite backed index of the URLs found on each day.
+
+        Changes are committed by flush and close, rather than after every URL.
+
+        Args:
+            path: Path to the SQLite file. It and its directory are created if
+                  they do not exist.
+            bloom_error_rate: If set, a Bloom filter with this false positive
+                              rate is kept next to the index (path + ".bloom").
+                              URLs the filter has not seen skip the database
+                              lookup; the rest are confirmed against it.
+            bloom_capacity: The number of URLs the Bloom filter is sized for.
+    """
+
+    def __init__(self, path, bloom_error_rate=None, bloom_capacity=bloom.DEFAULT_CAPACITY):
+        self.path = path
+        self.false_positives = 0
+        self._lock = threading.Lock()
+        self._bloom = None
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            "hash INTEGER PRIMARY KEY, url TEXT NOT NULL, first_day INTEGER NOT NULL, last_day INTEGER NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS url_segments ("
+            "hash INTEGER NOT NULL, segment_id INTEGER NOT NULL, PRIMARY KEY (hash, segment_id)) WITHOUT ROWID"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS urls_first_day ON urls (first_day)")
+        self._connection.commit()
+        self._rows = self._connection.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+        if bloom_error_rate is not None:
+            self._bloom = bloom.BloomFilter(path + ".bloom", bloom_capacity, bloom_error_rate)
+            if self._bloom.count != self._rows:
+                self._rebuild_bloom()
+            if self._rows > bloom_capacity:
+                logging.warning("URL index {0} holds {1} urls, more than its Bloom filter's capacity of {2}."
+                                .format(path, self._rows, bloom_capacity))
+
+    def _rebuild_bloom(self):
+        # the filter is new, or was not flushed with the index, so refill it from the hashes
+        self._bloom.clear()
+        for (key,) in self._connection.execute("SELECT hash FROM urls"):
+            self._bloom.add(key)
+        self._bloom.flush(self._rows)
+
+    def _first_day(self, key):
+        if self._bloom is not None and key not in self._bloom:
+            return None
+
+        row = self._connection.execute("SELECT first_day FROM urls WHERE hash = ?", (key,)).fetchone()
+        if row is None and self._bloom is not None:
+            self.false_positives += 1
+        return row
+
+    def add(self, url, day, segment_id):
+        """
+            Records that the url was found in a segment on a day. Adding the
+            same url again, e.g. when a day is resumed, is harmless.
+            Args:
+                url: The url found.
+                day: Day number in search process (number of days since start date)
+                segment_id: The segment it was found in.
+            Returns:
+                status: NEW if the url had not been seen before this day, otherwise SEEN.
+        """
+        key = _key(url)
+
+        with self._lock:
+            row = self._first_day(key)
+            if row is None:
+                self._connection.execute(
+                    "INSERT INTO urls (hash, url, first_day, last_day) VALUES (?, ?, ?, ?)",
+                    (key, url, day, day)
+                )
+                self._rows += 1
+                if self._bloom is not None:
+                    self._bloom.add(key)
+            else:
+                self._connection.execute(
+                    "UPDATE urls SET first_day = MIN(first_day, ?), last_day = MAX(last_day, ?) WHERE hash = ?",
+                    (day, day, key)
+                )
+            self._connection.execute(
+                "INSERT OR IGNORE INTO url_segments (hash, segment_id) VALUES (?, ?)", (key, segment_id)
+            )
+
+        if row is None or row[0] >= day:
+            return NEW
+        return SEEN
+
+    def add_result(self, result, day):
+        """
+            Records every link of an extracted result (see search.get_object_to_write).
+            Args:
+                result: The extracted result.
+                day: Day number in search process (number of days since start date)
+            Returns:
+                new_links: the links that had not been seen before this day.
+        """
+        new_links = []
+        for link in result["links"]:
+            if self.add(link, day, result["segment_id"]) == NEW:
+                new_links.append(link)
+        return new_links
+
+    def lookup(self, url):
+        """
+            Returns:
+                entry: a dict of the url, its first_day, last_day and segments,
+                       or None if it has never been seen.
+        """
+        key = _key(url)
+
+        with self._lock:
+            if self._bloom is not None and key not in self._bloom:
+                return None
+            row = self._connection.execute(
+                "SELECT url, first_day, last_day FROM urls WHERE hash = ?", (key,)
+            ).fetchone()
+            if row is None:
+                if self._bloom is not None:
+                    self.false_positives += 1
+                return None
+            segments = [segment_id for (segment_id,) in self._connection.execute(
+                "SELECT segment_id FROM url_segments WHERE hash = ? ORDER BY segment_id", (key,)
+            )]
+
+        return {
+            "url": row[0],
+            "first_day": row[1],
+            "last_day": row[2],
+            "segments": segments
+        }
+
+    def seen_before(self, url, day):
+        """
+            Returns:
+                seen: True if the url was found on a day before the given day.
+        """
+        with self._lock:
+            row = self._first_day(_key(url))
+        return row is not None and row[0] < day
+
+    def status(self, url, day):
+        """
+            Returns:
+                status: SEEN if the url was found on a day before the given day, otherwise NEW.
+        """
+        return SEEN if self.seen_before(url, day) else NEW
+
+    def new_urls(self, day):
+        """
+            Returns:
+                urls: every url first seen on the given day.
+        """
+        with self._lock:
+            return [url for (url,) in self._connection.execute(
+                "SELECT url FROM urls WHERE first_day = ? ORDER BY url", (day,)
+            )]
+
+    def count_new(self, day):
+        """
+            Returns:
+                count: the number of urls first seen on the given day.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM urls WHERE first_day = ?", (day,)).fetchone()[0]
+
+    def __len__(self):
+        return self._rows
+
+    def _commit(self):
+        self._connection.commit()
+        # flushed after the commit, so a crash in between is spotted by the count and the filter rebuilt
+        if self._bloom is not None:
+            self._bloom.flush(self._rows)
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._connection.close()
+            if self._bloom is not None:
+                self._bloom.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+def index_path(config):
+    """
+        Returns the path of the url index for a config: "url_index_file" if it
+        is set, otherwise url_index.sqlite in "results_output_dir".
+    """
+    return config.get('url_index_file') or os.path.join(config['results_output_dir'], DEFAULT_FILENAME)
+
+
+def index_from_config(config):
+    """
+        Opens the url index for a config, with a Bloom filter in front of it if
+        "url_index_bloom_error_rate" is set.
+        Returns:
+            index: a UrlIndex, or None if "url_index" is not set.
+    """
+    if not config.get('url_index'):
+        return None
+
+    return UrlIndex(
+        index_path(config),
+        config.get('url_index_bloom_error_rate'),
+        config.get('url_index_bloom_capacity', bloom.DEFAULT_CAPACITY)
+    )
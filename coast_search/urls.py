@@ -0,0 +1,112 @@
+"""
+    Title: urls.py
+    Author: Ashley Williams
+    Description: URL canonicalisation and hashing for deduplication. Search
+    results often link to the same page through different URLs (http and
+    https, with and without www. or a trailing slash, with a fragment or with
+    utm_* tracking parameters). A Canonicaliser maps these to one URL, and
+    url_hash gives a fixed-width 64-bit key for it, which is much smaller to
+    hold in a set than the URL itself.
+"""
+import hashlib
+
+from urllib.parse import urlsplit, urlunsplit
+
+TRACKING_PREFIXES = ("utm_",)
+TRACKING_PARAMS = ("gclid", "fbclid", "msclkid")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class Canonicaliser(object):
+    """
+        Maps variants of a URL onto a single canonical URL. Each rule can be
+        turned off. The host is always lower cased, and default ports removed.
+
+        Args:
+            https: treat http and https as the same, using https.
+            www: remove a leading "www." from the host.
+            trailing_slash: remove a trailing "/" from the path.
+            fragment: remove the fragment ("#...").
+            tracking_params: remove utm_* and click id query parameters.
+            sort_query: sort the query parameters.
+    """
+
+    def __init__(self, https=True, www=True, trailing_slash=True, fragment=True, tracking_params=True,
+                 sort_query=False):
+        self.https = https
+        self.www = www
+        self.trailing_slash = trailing_slash
+        self.fragment = fragment
+        self.tracking_params = tracking_params
+        self.sort_query = sort_query
+
+    def __call__(self, url):
+        """
+            Returns the canonical form of the url. Anything that isn't an
+            absolute URL is returned with surrounding whitespace removed.
+        """
+        url = url.strip()
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            return url
+
+        if not parts.scheme or not parts.netloc:
+            return url
+
+        scheme = parts.scheme.lower()
+        if self.https and scheme == "http":
+            scheme = "https"
+
+        host = parts.hostname or ""
+        if self.www and host.startswith("www."):
+            host = host[4:]
+
+        netloc = host
+        if port is not None and port != DEFAULT_PORTS.get(scheme):
+            netloc += ":" + str(port)
+
+        path = parts.path or "/"
+        if self.trailing_slash and len(path) > 1:
+            path = path.rstrip("/") or "/"
+
+        # work on the raw parameters, so their encoding is left untouched
+        params = [param for param in parts.query.split("&") if param]
+        if self.tracking_params:
+            params = [param for param in params if not _is_tracking_param(param)]
+        if self.sort_query:
+            params.sort()
+
+        fragment = "" if self.fragment else parts.fragment
+
+        return urlunsplit((scheme, netloc, path, "&".join(params), fragment))
+
+
+def _is_tracking_param(param):
+    name = param.split("=", 1)[0].lower()
+    return name.startswith(TRACKING_PREFIXES) or name in TRACKING_PARAMS
+
+
+def canonicaliser_from_config(option):
+    """
+        Builds a Canonicaliser from the "canonicalise_urls" config value.
+        Args:
+            option: False/None for no canonicalisation, True for the default
+                    rules, or a dict of Canonicaliser arguments.
+        Returns:
+            canonicaliser: a Canonicaliser, or None.
+    """
+    if not option:
+        return None
+    if option is True:
+        return Canonicaliser()
+    return Canonicaliser(**option)
+
+
+def url_hash(url):
+    """
+        Returns a 64-bit hash of the url, as an int.
+    """
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
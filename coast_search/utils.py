@@ -6,10 +6,16 @@
     files.
 """
 import sys
+import os
 import json
+import threading
 from pathlib import Path
 from datetime import date
 
+# (path, modification time, size) -> the lines of the file, see get_from_file_cached
+_file_cache = {}
+_file_cache_lock = threading.Lock()
+
 
 def get_from_file(filename):
     """
@@ -36,16 +42,51 @@ def get_from_file(filename):
     return res
 
 
+def get_from_file_cached(filename):
+    """
+        The cached counterpart of get_from_file. Each file is only read once
+        per process, and read again if it has changed since, so studies run
+        together (see the batch module) share the dimension files they have in common.
+
+        Args:
+            filename: The path to the file you wish to read.
+
+        Returns:
+            res: A list of strings, where each string is a line in the file.
+    """
+    stat = os.stat(filename)
+    key = (os.path.realpath(filename), stat.st_mtime_ns, stat.st_size)
+
+    with _file_cache_lock:
+        lines = _file_cache.get(key)
+
+    if lines is None:
+        lines = tuple(get_from_file(filename))
+        with _file_cache_lock:
+            _file_cache[key] = lines
+
+    return list(lines)
+
+
+def clear_file_cache():
+    """
+        Empties the cache used by get_from_file_cached.
+    """
+    with _file_cache_lock:
+        _file_cache.clear()
+
+
 def get_from_file_list(file_list):
     """
     Given a list of file names, reads from each of these and returns a dictionary with filename: list of words
+    Files are read through get_from_file_cached.
     :param file_list:
     :return:
     """
     res = {}
     # want a dictionary with filename: list of words
     for file in file_list:
-        words = get_from_file(file)
+        words = get_from_file_cached(file)
         res[Path(file).stem] = words
 
     return res
@@ -0,0 +1,112 @@
+"""
+    Title: writer.py
+    Author: Ashley Williams
+    Description: Moves file writes onto a background thread, so writing
+    backups and results to disk overlaps with waiting on the API instead of
+    holding it up. Records are passed to the thread through a bounded queue:
+    if the disk falls behind, writing blocks until there is space again.
+"""
+import queue
+import threading
+
+from time import time
+
+DEFAULT_QUEUE_SIZE = 1000
+
+_CLOSE = object()
+
+
+class BackgroundWriter(object):
+    """
+        Wraps a writer, e.g. a jsonl.JsonLinesWriter, so that its writes are
+        done by a background thread.
+
+        Any error raised by the wrapped writer is re-raised by the next call to
+        write, flush or close.
+
+        Args:
+            writer: An object with write(record) and close() methods.
+            maxsize: The largest number of records waiting to be written.
+            metrics: A metrics.Metrics to record the time taken by each write
+                     (and by closing the writer) in, or None.
+            name: What is written, e.g. "backup", to record the writes under.
+    """
+
+    def __init__(self, writer, maxsize=DEFAULT_QUEUE_SIZE, metrics=None, name="writer"):
+        self.writer = writer
+        self.metrics = metrics
+        self.name = name
+        self._queue = queue.Queue(maxsize)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._drain, name="coast-search-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def path(self):
+        return self.writer.path
+
+    def _drain(self):
+        while True:
+            record = self._queue.get()
+            try:
+                if record is _CLOSE:
+                    return
+                if self._error is None:
+                    started = time()
+                    self.writer.write(record)
+                    if self.metrics is not None:
+                        self.metrics.observe_write(self.name, time() - started)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise Exception("Background write to {0} failed: {1}".format(
+                getattr(self.writer, "path", self.writer), self._error))
+
+    def write(self, record):
+        """
+            Queues a record to be written, blocking while the queue is full.
+            Args:
+                record: The record to pass to the wrapped writer's write method.
+        """
+        if self._closed:
+            raise Exception("Cannot write to a closed BackgroundWriter.")
+        self._raise_error()
+        self._queue.put(record)
+
+    def flush(self):
+        """
+            Waits until every queued record has been written.
+        """
+        self._queue.join()
+        self._raise_error()
+        if hasattr(self.writer, "flush"):
+            self.writer.flush()
+
+    def close(self):
+        """
+            Writes every queued record, stops the background thread and closes
+            the wrapped writer.
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        started = time()
+        self.writer.close()
+        if self.metrics is not None:
+            self.metrics.observe_write(self.name, time() - started)
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
@@ -13,9 +13,17 @@ with open('HISTORY.rst') as history_file:
 
 requirements = [
     "randomwords",
-    "google-api-python-client"
+    "google-api-python-client",
+    "httplib2"
 ]
 
+extra_requirements = {
+    "async": ["aiohttp"],
+    "bench": ["pytest", "pytest-benchmark"],
+    "parquet": ["pyarrow"],
+    "zstd": ["zstandard"]
+}
+
 setup_requirements = [
 ]
 
@@ -35,17 +43,30 @@ setup(
         'Intended Audience :: Science/Research',
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
     ],
     description="Search functionality of COAST",
+    entry_points={
+        'console_scripts': [
+            'coast-search-batch=coast_search.batch:main',
+            'coast-search-mock-server=coast_search.mock_server:main',
+        ],
+    },
     install_requires=requirements,
+    extras_require=extra_requirements,
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
+    package_data={'coast_search': ['discovery/*.json']},
     keywords='coast_search',
     name='coast_search',
     packages=find_packages(include=['coast_search']),
+    python_requires='>=3.7',
     setup_requires=setup_requirements,
     test_suite='tests',
     tests_require=test_requirements,
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+fakes
+----------------------------------
+Stand-ins for the Custom Search API, shared by the tests.
+"""
+from unittest import mock
+
+
+def fake_response(query, cx, start, links=None):
+    """
+        Returns a page of results as the API would, with 10 links made from the
+        search engine id and the start index unless links are given.
+    """
+    if links is None:
+        links = ["https://example.com/" + cx + "/" + str(start + i) for i in range(10)]
+
+    return {
+        "url": {"template": "https://customsearch.googleapis.com/customsearch/v1?q={searchTerms}"},
+        "queries": {"request": [{
+            "cx": cx,
+            "count": 10,
+            "totalResults": "100",
+            "startIndex": start,
+            "searchTerms": query
+        }]},
+        "searchInformation": {"totalResults": "100", "searchTime": 0.1},
+        "items": [{"title": "result " + link, "link": link} for link in links]
+    }
+
+
+class FakeService(object):
+    """
+        Stands in for a customsearch service. Answers every page, except those
+        listed in fail_starts, with the links given for its query in links, if
+        any (see fake_response).
+    """
+
+    def __init__(self, fail_starts=(), links=None):
+        self.fail_starts = fail_starts
+        self.links = links
+        self.calls = 0
+        self.starts = []
+
+    def cse(self):
+        return self
+
+    def list(self, q, cx, start):
+        def execute():
+            self.calls += 1
+            self.starts.append(start)
+            if start in self.fail_starts:
+                raise ValueError("backend error")
+            return fake_response(q, cx, start, None if self.links is None else self.links[q])
+        return mock.Mock(execute=execute)
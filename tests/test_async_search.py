@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_async_search
+----------------------------------
+Tests for `async_search` module.
+"""
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from coast_search import async_search
+from coast_search import journal
+from coast_search import search
+from coast_search import writer
+from tests.fakes import FakeService
+from tests.fakes import fake_response
+
+
+class FakeResponse(object):
+
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def json(self, content_type=None):
+        return self.body
+
+    async def read(self):
+        return json.dumps(self.body).encode("utf-8")
+
+    async def text(self):
+        return str(self.body)
+
+
+class FakeSession(object):
+
+    def __init__(self, status=200):
+        self.status = status
+        self.calls = []
+
+    def get(self, url, params):
+        self.calls.append(params)
+        return FakeResponse(self.status, fake_response(params["q"], params["cx"], params["start"]))
+
+
+class SlowResponse(FakeResponse):
+    """Takes a while to arrive, noting whether it was cancelled while waiting."""
+
+    def __init__(self, body, cancelled):
+        super(SlowResponse, self).__init__(200, body)
+        self.cancelled = cancelled
+
+    async def __aenter__(self):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.cancelled.append(self.body["queries"]["request"][0]["startIndex"])
+            raise
+        return self
+
+
+class FailingSession(FakeSession):
+    """Fails the first page of cx-a at once, while every other page is still on its way."""
+
+    def __init__(self):
+        super(FailingSession, self).__init__()
+        self.cancelled = []
+
+    def get(self, url, params):
+        self.calls.append(params)
+        body = fake_response(params["q"], params["cx"], params["start"])
+        if params["cx"] == "cx-a" and params["start"] == 1:
+            return FakeResponse(400, body)
+        return SlowResponse(body, self.cancelled)
+
+
+class TestAsyncSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.backup_dir = tempfile.mkdtemp()
+        self.query_dict_list = [
+            {"segment_id": 2, "query": '("software")', "api_key": "key-a", "search_engine_id": "cx-a"},
+            {"segment_id": 0, "query": '"random words" -"software" ', "api_key": "key-b", "search_engine_id": "cx-b"},
+            {"segment_id": 1, "query": '"seed" -"software" ', "api_key": "key-c", "search_engine_id": "cx-c"}
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.backup_dir)
+
+    def test_same_results_as_threaded_engine(self):
+        session = FakeSession()
+        actual = asyncio.run(async_search.run_all_queries_async(
+            self.query_dict_list, 2, 20, 1, self.backup_dir, 0, session=session))
+
+        with mock.patch("coast_search.clients.get_service", return_value=FakeService()):
+            expected = search.run_all_queries(self.query_dict_list, 2, 20, 1, self.backup_dir, 0)
+
+        self.assertEqual(expected, actual)
+        self.assertEqual(3 * 2 * 2, len(session.calls))
+        self.assertEqual({"key-a", "key-b", "key-c"}, set(call["key"] for call in session.calls))
+
+    def test_http_error(self):
+        session = FakeSession(status=429)
+
+        self.assertRaises(Exception, asyncio.run, async_search.run_all_queries_async(
+            self.query_dict_list, 1, 10, 1, self.backup_dir, 0, session=session))
+
+    def test_failure_cancels_other_pages(self):
+        session = FailingSession()
+        cancelled_when_closed = []
+        close = writer.BackgroundWriter.close
+
+        def record_close(background_writer):
+            cancelled_when_closed.append(len(session.cancelled))
+            close(background_writer)
+
+        with mock.patch.object(writer.BackgroundWriter, "close", autospec=True, side_effect=record_close):
+            self.assertRaises(Exception, asyncio.run, async_search.run_all_queries_async(
+                self.query_dict_list, 1, 20, 1, self.backup_dir, 0, session=session))
+
+        # every other page, of this segment and the others, was cancelled before the backup was closed
+        self.assertEqual(6, len(session.calls))
+        self.assertEqual([5], cancelled_when_closed)
+
+    def test_journal_written_off_the_event_loop(self):
+        threads = []
+
+        class RecordingJournal(journal.RunJournal):
+            def record(self, *args, **kwargs):
+                threads.append(threading.current_thread())
+                super(RecordingJournal, self).record(*args, **kwargs)
+
+        run_journal = RecordingJournal(journal.journal_path(self.backup_dir, 1))
+        asyncio.run(async_search.run_all_queries_async(
+            self.query_dict_list, 1, 20, 1, self.backup_dir, 0, run_journal=run_journal, session=FakeSession()))
+        run_journal.close()
+
+        self.assertEqual(6, len(threads))
+        self.assertNotIn(threading.main_thread(), threads)
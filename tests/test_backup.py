@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_backup
+----------------------------------
+Tests for `backup` module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from coast_search import backup
+from coast_search import jsonl
+from coast_search import search
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class TestBackup(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.responses = [{"segment_id": 2, "response": {"items": [{"link": str(i)}]}} for i in range(5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_backup_path(self):
+        path = backup.backup_path("backups", 3)
+        self.assertEqual(os.path.join("backups", "results_day_3", "day_3.jsonl.gz"), path)
+
+    def test_round_trip(self):
+        writer = backup.open_backup(self.directory, 3, fsync_every=2)
+        for response in self.responses:
+            writer.write(response)
+        writer.close()
+
+        self.assertEqual(self.responses, list(backup.iter_backup(backup.backup_path(self.directory, 3))))
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_round_trip_zstd(self):
+        writer = backup.open_backup(self.directory, 3, jsonl.ZSTD, fsync_every=2)
+        for response in self.responses:
+            writer.write(response)
+        writer.close()
+
+        self.assertEqual(self.responses, list(backup.iter_backup(backup.backup_path(self.directory, 3, jsonl.ZSTD))))
+
+    def test_truncated_backup(self):
+        writer = backup.open_backup(self.directory, 3, fsync_every=1)
+        for response in self.responses:
+            writer.write(response)
+
+        # copy the file while it is still open, as if the process had been killed
+        path = backup.backup_path(self.directory, 3)
+        copy = os.path.join(self.directory, "copy.jsonl.gz")
+        shutil.copyfile(path, copy)
+        writer.close()
+
+        self.assertEqual(self.responses, list(backup.iter_backup(copy)))
+
+        with open(copy, "rb") as ifile:
+            data = ifile.read()
+        with open(copy, "wb") as ofile:
+            ofile.write(data[:-5])
+
+        recovered = list(backup.iter_backup(copy))
+        self.assertEqual(self.responses[:len(recovered)], recovered)
+
+    def test_reopened_after_kill(self):
+        writer = backup.open_backup(self.directory, 3, fsync_every=1)
+        for response in self.responses[:2]:
+            writer.write(response)
+
+        # keep the file as it was while still open, as if the process had been killed
+        path = backup.backup_path(self.directory, 3)
+        with open(path, "rb") as ifile:
+            data = ifile.read()
+        writer.close()
+        with open(path, "wb") as ofile:
+            ofile.write(data)
+
+        writer = backup.open_backup(self.directory, 3, fsync_every=1)
+        for response in self.responses[2:]:
+            writer.write(response)
+        writer.close()
+
+        self.assertEqual([path, backup.part_path(path, 1)], backup.backup_parts(path))
+        self.assertEqual(os.path.join(self.directory, "results_day_3", "day_3.1.jsonl.gz"), backup.part_path(path, 1))
+        self.assertEqual(self.responses, list(backup.iter_backup(path)))
+
+    def test_run_query_backs_up_responses(self):
+        service = mock.Mock()
+        service.cse.return_value.list.return_value.execute.return_value = {
+            "url": {"template": ""},
+            "queries": {"request": []},
+            "searchInformation": {"totalResults": "0", "searchTime": 0.1}
+        }
+
+        with mock.patch("coast_search.clients.get_service", return_value=service):
+            search.run_query("software", 2, 20, "key", "cx", 2, 3, self.directory, 0)
+
+        responses = list(backup.iter_backup(backup.backup_path(self.directory, 3)))
+        self.assertEqual(4, len(responses))
+        self.assertEqual("software", responses[0]["query"])
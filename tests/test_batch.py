@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_batch
+----------------------------------
+Tests for `batch` module.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import date
+from unittest import mock
+
+from coast_search import batch
+from coast_search import clients
+from coast_search import jsonl
+from coast_search import mock_server
+from coast_search import writer
+
+TEST_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_data")
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        clients.set_root_url(None)
+
+    def write_config(self, name, **overrides):
+        config = dict((key, key) for key in batch.REQUIRED_KEYS)
+        config.update(overrides)
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as ofile:
+            json.dump(config, ofile)
+        return path
+
+    def write_study(self, name, **overrides):
+        study_dir = os.path.join(self.directory, name)
+        os.makedirs(study_dir)
+        config = {
+            "dimensions": [os.path.join(TEST_DATA, "search_dimensions", dimension)
+                           for dimension in ["experience.txt", "reasoning.txt", "topic.txt"]],
+            "api_details_file": os.path.join(TEST_DATA, "test_api_config.json"),
+            "number_of_runs": 1,
+            "number_of_results": 10,
+            "search_backup_dir": os.path.join(study_dir, "backup"),
+            "results_output_dir": os.path.join(study_dir, "results"),
+            "logging_file": os.path.join(study_dir, "log.txt"),
+            "start_date": date.today().strftime("%d-%m-%Y"),
+            "sleep_wait_time": 0,
+            "random_seed": 1
+        }
+        config.update(overrides)
+        return self.write_config(name + ".json", **config)
+
+    def test_each_study_logs_to_its_own_file(self):
+        root = logging.getLogger()
+        level = root.level
+        handlers = list(root.handlers)
+        root.setLevel(logging.INFO)
+        try:
+            with mock_server.MockSearchServer() as server:
+                clients.set_root_url(server.url)
+                configs = [self.write_study(name) for name in ["a", "b"]]
+                report = batch.run_daily_searches(configs, workers=2, write_to_file_flag=False)
+        finally:
+            root.setLevel(level)
+
+        self.assertEqual(2, report["succeeded"])
+        for name, study in zip(["a", "b"], report["studies"]):
+            with open(os.path.join(self.directory, name, "log.txt")) as ifile:
+                lines = ifile.read().splitlines()
+            # every page of the study is logged once, and none of the other study's
+            self.assertEqual(study["pages"],
+                             len([line for line in lines if "Written to file" in line]))
+            self.assertTrue(any("Running 1 runs" in line for line in lines))
+        self.assertEqual(handlers, root.handlers)
+
+    def test_failed_study_logs_why(self):
+        config = self.write_study("a")
+        with mock.patch("coast_search.search._search_day", side_effect=Exception("quota exceeded")):
+            report = batch.run_daily_searches([config], workers=1)
+
+        self.assertEqual(1, report["failed"])
+        with open(os.path.join(self.directory, "a", "log.txt")) as ifile:
+            log = ifile.read()
+        self.assertIn("Daily search failed.", log)
+        self.assertIn("Exception: quota exceeded", log)
+
+    def test_root_url_is_per_study(self):
+        with mock_server.MockSearchServer() as default_server, mock_server.MockSearchServer() as study_server:
+            clients.set_root_url(default_server.url)
+            configs = [self.write_study("a", customsearch_root_url=study_server.url), self.write_study("b")]
+            report = batch.run_daily_searches(configs, workers=2, write_to_file_flag=False)
+
+        self.assertEqual(2, report["succeeded"])
+        self.assertEqual(report["studies"][0]["pages"], study_server.stats["served"])
+        self.assertEqual(report["studies"][1]["pages"], default_server.stats["served"])
+        self.assertEqual(default_server.url, clients.default_pool.root_url)
+
+    def test_results_file_fsynced(self):
+        with mock_server.MockSearchServer() as server:
+            config = self.write_study("a", customsearch_root_url=server.url, output_format="jsonl",
+                                      output_compression="gzip", output_fsync_every=1)
+            with mock.patch("coast_search.jsonl.JsonLinesWriter", wraps=jsonl.JsonLinesWriter) as writer:
+                report = batch.run_daily_searches([config], workers=1)
+
+        results_file = report["studies"][0]["results_file"]
+        self.assertIn(mock.call(results_file, 1), writer.call_args_list)
+        self.assertEqual(server.stats["served"], len(list(jsonl.iter_json_lines(results_file))))
+
+    def test_failed_backup_close_still_closes_the_rest(self):
+        textfile = os.path.join(self.directory, "coast_search.prom")
+        close = writer.BackgroundWriter.close
+        closed = []
+
+        def failing_close(background_writer):
+            close(background_writer)
+            closed.append(background_writer.name)
+            if background_writer.name == "backup":
+                raise Exception("disk full")
+
+        with mock_server.MockSearchServer() as server:
+            config = self.write_study("a", customsearch_root_url=server.url, output_format="jsonl",
+                                      metrics_textfile=textfile)
+            with mock.patch.object(writer.BackgroundWriter, "close", autospec=True, side_effect=failing_close):
+                report = batch.run_daily_searches([config], workers=1)
+
+        self.assertEqual("disk full", report["studies"][0]["error"])
+        self.assertEqual(["backup", "results"], closed)
+        self.assertTrue(os.path.exists(textfile))
+
+    def test_run_daily_searches(self):
+        good = self.write_config("good.json", output="file")
+        pages = self.write_config("pages.json", output="pages")
+        failing = self.write_config("failing.json", output="error")
+        broken = os.path.join(self.directory, "broken.json")
+        with open(broken, "w") as ofile:
+            json.dump({"dimensions": []}, ofile)
+
+        def run_daily_search(config, write_to_file_flag, engine, resume):
+            if config["output"] == "error":
+                raise Exception("quota exceeded")
+            if config["output"] == "file":
+                return {"results_file": "results.jsonl"}
+            return {"results": [[{}, {}], [{}]]}
+
+        with mock.patch("coast_search.search.run_daily_search", side_effect=run_daily_search) as run:
+            report = batch.run_daily_searches([good, broken, pages, failing], workers=2)
+
+        self.assertEqual(3, run.call_count)
+        self.assertEqual(2, report["succeeded"])
+        self.assertEqual(2, report["failed"])
+
+        studies = report["studies"]
+        self.assertEqual([good, broken, pages, failing], [study["config_file"] for study in studies])
+        self.assertEqual("results.jsonl", studies[0]["results_file"])
+        self.assertIn("missing", studies[1]["error"])
+        self.assertEqual(3, studies[2]["pages"])
+        self.assertEqual("quota exceeded", studies[3]["error"])
+
+    def test_studies_run_concurrently(self):
+        configs = [self.write_config("study_{0}.json".format(i)) for i in range(3)]
+        barrier = threading.Barrier(3, timeout=5)
+
+        def run_daily_search(config, write_to_file_flag, engine, resume):
+            barrier.wait()
+            return {"results": []}
+
+        with mock.patch("coast_search.search.run_daily_search", side_effect=run_daily_search):
+            report = batch.run_daily_searches(configs, workers=3)
+        self.assertEqual(3, report["succeeded"])
+
+    def test_main(self):
+        config = self.write_config("study.json")
+        report_path = os.path.join(self.directory, "report.json")
+
+        with mock.patch("coast_search.search.run_daily_search", return_value={"results": []}) as run, \
+                mock.patch("sys.stdout"):
+            status = batch.main([config, "--workers", "1", "--no-write", "--engine", "async",
+                                 "--report", report_path])
+
+        self.assertEqual(0, status)
+        self.assertEqual((False, "async", False), run.call_args[0][1:])
+        with open(report_path) as ifile:
+            self.assertEqual(1, json.load(ifile)["succeeded"])
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_bloom
+----------------------------------
+Tests for `bloom` module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from coast_search import bloom
+from coast_search import url_index
+from coast_search import urls
+
+
+def url(i):
+    return "https://example.com/page/" + str(i)
+
+
+class TestBloom(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "urls.bloom")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_optimal_size(self):
+        num_bits, num_hashes = bloom.optimal_size(1000, 0.01)
+        self.assertEqual(9586, num_bits)
+        self.assertEqual(7, num_hashes)
+        self.assertRaises(Exception, bloom.optimal_size, 1000, 0)
+        self.assertRaises(Exception, bloom.optimal_size, 1000, 1.5)
+
+    def test_no_false_negatives_and_false_positive_rate(self):
+        with bloom.BloomFilter(self.path, 2000, 0.01) as bloom_filter:
+            for i in range(2000):
+                bloom_filter.add(urls.url_hash(url(i)))
+
+            for i in range(2000):
+                self.assertIn(urls.url_hash(url(i)), bloom_filter)
+
+            false_positives = sum(urls.url_hash(url(i)) in bloom_filter for i in range(2000, 22000))
+            self.assertLess(false_positives / 20000, 0.02)
+
+    def test_reopen(self):
+        with bloom.BloomFilter(self.path, 100, 0.01) as bloom_filter:
+            bloom_filter.add(42)
+            bloom_filter.flush(1)
+
+        with bloom.BloomFilter(self.path, 100, 0.01) as bloom_filter:
+            self.assertFalse(bloom_filter.created)
+            self.assertEqual(1, bloom_filter.count)
+            self.assertIn(42, bloom_filter)
+
+        # different parameters start a new filter
+        with bloom.BloomFilter(self.path, 100, 0.001) as bloom_filter:
+            self.assertTrue(bloom_filter.created)
+            self.assertNotIn(42, bloom_filter)
+
+    def test_clear(self):
+        with bloom.BloomFilter(self.path, 100, 0.01) as bloom_filter:
+            bloom_filter.add(42)
+            bloom_filter.clear()
+            self.assertNotIn(42, bloom_filter)
+            self.assertEqual(0, bloom_filter.count)
+
+    def test_url_index_with_bloom(self):
+        path = os.path.join(self.directory, "url_index.sqlite")
+        index = url_index.UrlIndex(path, bloom_error_rate=0.01, bloom_capacity=1000)
+        for i in range(100):
+            index.add(url(i), 1, 1)
+        index.add(url(0), 2, 1)
+        index.close()
+
+        index = url_index.UrlIndex(path, bloom_error_rate=0.01, bloom_capacity=1000)
+        self.assertTrue(index.seen_before(url(0), 2))
+        self.assertFalse(index.seen_before(url(0), 1))
+        self.assertEqual(2, index.lookup(url(0))["last_day"])
+        # positives are confirmed against the index, so misses are always exact
+        for i in range(100, 1100):
+            self.assertFalse(index.seen_before(url(i), 2))
+            self.assertIsNone(index.lookup(url(i)))
+        self.assertLess(index.false_positives, 100)
+        index.close()
+
+    def test_url_index_rebuilds_stale_bloom(self):
+        path = os.path.join(self.directory, "url_index.sqlite")
+        with url_index.UrlIndex(path) as index:
+            index.add(url(1), 1, 1)
+
+        # a filter added to an existing index, or left behind by a crash, is refilled
+        with open(path + ".bloom", "wb") as ofile:
+            ofile.write(b"not a filter")
+        with url_index.UrlIndex(path, bloom_error_rate=0.01, bloom_capacity=1000) as index:
+            self.assertTrue(index.seen_before(url(1), 2))
+            self.assertEqual(url_index.SEEN, index.add(url(1), 2, 1))
+            self.assertEqual(1, len(index))
+
+    def test_index_from_config(self):
+        self.assertIsNone(url_index.index_from_config({"results_output_dir": self.directory}))
+        index = url_index.index_from_config({"results_output_dir": self.directory, "url_index": True,
+                                             "url_index_bloom_error_rate": 0.01,
+                                             "url_index_bloom_capacity": 1000})
+        index.close()
+        self.assertTrue(os.path.exists(os.path.join(self.directory, url_index.DEFAULT_FILENAME + ".bloom")))
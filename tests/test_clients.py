@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_clients
+----------------------------------
+Tests for `clients` module.
+"""
+import gc
+import threading
+import unittest
+import weakref
+from unittest import mock
+
+from coast_search import clients
+
+
+class TestClients(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = clients.ServicePool()
+
+    def test_service_built_once_per_key(self):
+        first = self.pool.get("aaa")
+        second = self.pool.get("aaa")
+        other = self.pool.get("bbb")
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+
+    def test_service_per_thread(self):
+        services = []
+        thread = threading.Thread(target=lambda: services.append(weakref.ref(self.pool.get("aaa"))))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(self.pool.get("aaa"), services[0]())
+        # the thread's service is not kept once the thread has finished
+        gc.collect()
+        self.assertIsNone(services[0]())
+
+    def test_service_has_timeout(self):
+        from googleapiclient.http import DEFAULT_HTTP_TIMEOUT_SEC
+
+        self.assertEqual(DEFAULT_HTTP_TIMEOUT_SEC, self.pool.get("aaa")._http.timeout)
+
+    def test_discovery_document_read_once(self):
+        with mock.patch("coast_search.clients.json.load", wraps=clients.json.load) as load:
+            self.pool.get("aaa")
+            self.pool.get("bbb")
+
+        self.assertEqual(1, load.call_count)
+
+    def test_service_uses_bundled_document(self):
+        service = self.pool.get("aaa")
+        request = service.cse().list(q="software", cx="123:abc", start=1)
+
+        self.assertIn("customsearch/v1", request.uri)
+        self.assertIn("key=aaa", request.uri)
+
+    def test_root_url(self):
+        pool = clients.ServicePool(root_url="http://127.0.0.1:8080")
+        request = pool.get("aaa").cse().list(q="software", cx="123:abc", start=1)
+        self.assertTrue(request.uri.startswith("http://127.0.0.1:8080/customsearch/v1?"))
+
+        with mock.patch.dict("os.environ", {clients.ROOT_URL_VARIABLE: "http://localhost:9000/"}):
+            self.assertEqual("http://localhost:9000/", clients.ServicePool().root_url)
+
+        pool.set_root_url(None)
+        request = pool.get("aaa").cse().list(q="software", cx="123:abc", start=1)
+        self.assertTrue(request.uri.startswith(clients.DEFAULT_ROOT_URL))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_columnar
+----------------------------------
+Tests for `columnar` module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from coast_search import search
+from coast_search import utils
+
+try:
+    import pyarrow
+    from coast_search import columnar
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestColumnar(unittest.TestCase):
+
+    def setUp(self):
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        self.test_data_folder_location = os.path.join(cwd, "test_data/")
+        self.json_data = utils.get_json_from_file(os.path.join(self.test_data_folder_location,
+                                                               "results_for_testing_extraction.json"))
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "results.parquet")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_results_to_table(self):
+        table = columnar.results_to_table(self.json_data, 3)
+        expected = search.extract_search_results_from_JSON(self.json_data)["search_results"]
+
+        self.assertEqual(len(expected), table.num_rows)
+        self.assertEqual([res["url"] for res in expected], table.column("url").to_pylist())
+        self.assertEqual([res["segment_id"] for res in expected], table.column("segment_id").to_pylist())
+        self.assertEqual([res["query"] for res in expected], table.column("query").to_pylist())
+        self.assertTrue(pyarrow.types.is_dictionary(table.schema.field("query").type))
+
+    def test_one_row_group_per_day(self):
+        columnar.export_days(self.path, {1: self.json_data, 2: self.json_data, 5: self.json_data})
+
+        metadata = pyarrow.parquet.ParquetFile(self.path).metadata
+        self.assertEqual(3, metadata.num_row_groups)
+        self.assertEqual([1], columnar.row_groups_for_days(self.path, [2]))
+
+    def test_load_selected_days_and_columns(self):
+        with columnar.ParquetExporter(self.path) as exporter:
+            exporter.write_day(1, self.json_data)
+            exporter.write_day(2, self.json_data)
+
+        table = columnar.load_results(self.path, columns=["url", "segment_id"], days=[2])
+        rows_per_day = columnar.results_to_table(self.json_data, 2).num_rows
+
+        self.assertEqual(["url", "segment_id"], table.column_names)
+        self.assertEqual(rows_per_day, table.num_rows)
+
+        everything = columnar.load_results(self.path)
+        self.assertEqual(2 * rows_per_day, everything.num_rows)
+        self.assertEqual(columnar.COLUMNS, everything.column_names)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_imports
+----------------------------------
+Tests that importing coast_search stays lazy.
+"""
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["googleapiclient", "random_words", "asyncio", "aiohttp", "pyarrow"]
+
+
+def modules_loaded_by(code):
+    """Runs code in a new interpreter, returning the heavy modules it imported."""
+    script = code + "\nimport sys\nprint(','.join(m for m in {0!r} if m in sys.modules))".format(HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, stdout=subprocess.PIPE,
+                            universal_newlines=True, check=True).stdout
+    return [module for module in output.strip().split(",") if module]
+
+
+class TestImports(unittest.TestCase):
+
+    def test_package_import_is_lazy(self):
+        self.assertEqual([], modules_loaded_by("import coast_search"))
+
+    def test_post_processing_does_not_import_google_client(self):
+        for module in ["query_generator", "streaming", "search", "records", "url_index"]:
+            self.assertEqual([], modules_loaded_by("from coast_search import " + module))
+
+    def test_submodules_load_on_attribute_access(self):
+        self.assertEqual([], modules_loaded_by("import coast_search\ncoast_search.search.page_starts(10)"))
+
+        import coast_search
+        search = coast_search.search
+        self.assertIs(sys.modules["coast_search.search"], search)
+        self.assertIn("search", dir(coast_search))
+        self.assertRaises(AttributeError, getattr, coast_search, "not_a_module")
+
+    def test_google_client_imported_when_a_service_is_built(self):
+        loaded = modules_loaded_by("from coast_search import clients\nclients.get_service('key')")
+        self.assertIn("googleapiclient", loaded)
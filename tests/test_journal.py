@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_journal
+----------------------------------
+Tests for `journal` module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from coast_search import backup
+from coast_search import journal
+from coast_search import search
+from tests.fakes import FakeService
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = journal.journal_path(self.directory, 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_record_and_resume(self):
+        run_journal = journal.RunJournal(self.path)
+        run_journal.record(2, 0, 1, {"response": "a"})
+        run_journal.close()
+
+        # simulate a write cut short by a crash
+        with open(self.path, "a") as ofile:
+            ofile.write('{"segment_id": 2, "run": 0, "st')
+
+        run_journal = journal.RunJournal(self.path, resume=True)
+        self.assertEqual({"response": "a"}, run_journal.get(2, 0, 1))
+        self.assertIsNone(run_journal.get(2, 0, 11))
+        self.assertEqual(1, len(run_journal))
+        run_journal.record(2, 0, 11, {"response": "b"})
+        run_journal.close()
+
+        # the partial line was cut off, so the page recorded after it can be read back
+        run_journal = journal.RunJournal(self.path, resume=True)
+        self.assertEqual({"response": "b"}, run_journal.get(2, 0, 11))
+        self.assertEqual(2, len(run_journal))
+        run_journal.close()
+
+    def test_recorded_units_are_not_kept(self):
+        run_journal = journal.RunJournal(self.path)
+        run_journal.record(2, 0, 1, {"response": "a"})
+        self.assertIsNone(run_journal.get(2, 0, 1))
+        self.assertEqual(0, len(run_journal))
+        run_journal.close()
+
+    def test_variants_recorded_separately(self):
+        run_journal = journal.RunJournal(self.path)
+        run_journal.record(2, 0, 1, {"response": "a"})
+        run_journal.record(2, 0, 1, {"response": "b"}, variant=1)
+        run_journal.close()
+
+        run_journal = journal.RunJournal(self.path, resume=True)
+        self.assertEqual({"response": "a"}, run_journal.get(2, 0, 1))
+        self.assertEqual({"response": "b"}, run_journal.get(2, 0, 1, 1))
+        self.assertIsNone(run_journal.get(2, 0, 1, 0))
+        run_journal.close()
+
+    def test_without_resume_starts_again(self):
+        run_journal = journal.RunJournal(self.path)
+        run_journal.record(2, 0, 1, {"response": "a"})
+        run_journal.close()
+
+        run_journal = journal.RunJournal(self.path)
+        self.assertEqual(0, len(run_journal))
+        run_journal.close()
+
+    def test_run_all_queries_resumes(self):
+        query_dict_list = [{"segment_id": 2, "query": '("software")', "api_key": "key", "search_engine_id": "cx"}]
+        backup_dir = os.path.join(self.directory, "backup")
+
+        run_journal = journal.RunJournal(self.path)
+        with mock.patch("coast_search.clients.get_service", return_value=FakeService(fail_starts=(21,))):
+            self.assertRaises(Exception, search.run_all_queries, query_dict_list, 1, 30, 4, backup_dir, 0,
+                              run_journal=run_journal)
+        run_journal.close()
+
+        service = FakeService()
+        run_journal = journal.RunJournal(self.path, resume=True)
+        self.assertEqual(2, len(run_journal))
+        with mock.patch("coast_search.clients.get_service", return_value=service):
+            resumed = search.run_all_queries(query_dict_list, 1, 30, 4, backup_dir, 0, run_journal=run_journal)
+        run_journal.close()
+
+        self.assertEqual(1, service.calls)
+        self.assertEqual([1, 11, 21], [page["response_info"]["requests"][0]["start_index"]
+                                       for page in resumed["results"][0]])
+
+        # the pages taken from the journal were backed up by the first search, and not again
+        backed_up = list(backup.iter_backup(backup.backup_path(backup_dir, 4)))
+        self.assertEqual([1, 11, 21], sorted(page["response"]["queries"]["request"][0]["startIndex"]
+                                             for page in backed_up))
+
+    def test_run_all_queries_keeps_variants_apart(self):
+        query_dict_list = [
+            {"segment_id": 2, "query": '("a")', "api_key": "key", "search_engine_id": "cx",
+             "variant": {"index": index, "count": 2, "group": index, "negative_chunk": 0, "negative_chunks": 1}}
+            for index in range(2)
+        ]
+        backup_dir = os.path.join(self.directory, "backup")
+
+        service = FakeService()
+        run_journal = journal.RunJournal(self.path)
+        with mock.patch("coast_search.clients.get_service", return_value=service):
+            results = search.run_all_queries(query_dict_list, 1, 10, 4, backup_dir, 0, run_journal=run_journal)
+        run_journal.close()
+
+        self.assertEqual(2, service.calls)
+        run_journal = journal.RunJournal(self.path, resume=True)
+        self.assertEqual(2, len(run_journal))
+        run_journal.close()
+        self.assertEqual([0, 1], [segment[0]["variant"]["index"] for segment in results["results"]])
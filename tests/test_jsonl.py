@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_jsonl
+----------------------------------
+Tests for `jsonl` module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from coast_search import jsonl
+from coast_search import search
+from coast_search import utils
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class TestJsonl(unittest.TestCase):
+
+    def setUp(self):
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        self.test_data_folder_location = os.path.join(cwd, "test_data/")
+        self.directory = tempfile.mkdtemp()
+        self.records = [{"segment_id": 2, "links": ["https://example.com"]}, {"segment_id": 0, "links": []}]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def round_trip(self, filename):
+        path = os.path.join(self.directory, "out", filename)
+
+        # two writers, as if a run was restarted, both append to the same file
+        for record in self.records:
+            with jsonl.JsonLinesWriter(path) as writer:
+                writer.write(record)
+
+        self.assertEqual(self.records, list(jsonl.iter_json_lines(path)))
+
+    def test_round_trip(self):
+        self.round_trip("results.jsonl")
+
+    def test_round_trip_gzip(self):
+        self.round_trip("results.jsonl.gz")
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_round_trip_zstd(self):
+        self.round_trip("results.jsonl.zst")
+
+    def test_compression_for_path(self):
+        self.assertEqual(jsonl.GZIP, jsonl.compression_for_path("results.jsonl.gz"))
+        self.assertEqual(jsonl.ZSTD, jsonl.compression_for_path("results.jsonl.zst"))
+        self.assertIsNone(jsonl.compression_for_path("results.jsonl"))
+
+    def test_torn_last_line(self):
+        path = os.path.join(self.directory, "results.jsonl")
+        with jsonl.JsonLinesWriter(path) as writer:
+            for record in self.records:
+                writer.write(record)
+        with open(path, "a") as ofile:
+            ofile.write('{"segment_id": 3, "li')
+
+        self.assertEqual(self.records, list(jsonl.iter_json_lines(path)))
+        self.assertEqual([self.records[0]["links"][0]],
+                         search.deduplicate_urls_stream(path)["deduplicated_urls"])
+
+        # a complete line that cannot be read is not taken for a torn one
+        with open(path, "a") as ofile:
+            ofile.write("\n")
+        self.assertRaises(ValueError, list, jsonl.iter_json_lines(path))
+
+    def test_unfinished_gzip_stream(self):
+        path = os.path.join(self.directory, "results.jsonl.gz")
+        writer = jsonl.JsonLinesWriter(path, fsync_every=1)
+        for record in self.records:
+            writer.write(record)
+
+        # copy the file while it is still open, as if the process had been killed
+        copy = os.path.join(self.directory, "copy.jsonl.gz")
+        shutil.copyfile(path, copy)
+        writer.close()
+
+        self.assertEqual(self.records, list(jsonl.iter_json_lines(copy)))
+
+    def test_results_read_from_jsonl(self):
+        json_data = utils.get_json_from_file(os.path.join(self.test_data_folder_location,
+                                                          "results_for_testing_dedup_between_seg.json"))
+        path = os.path.join(self.directory, "results.jsonl.gz")
+        with jsonl.JsonLinesWriter(path) as writer:
+            for seg in json_data["results"]:
+                for item in seg:
+                    writer.write(item)
+
+        self.assertEqual(search.extract_search_results_from_JSON(json_data),
+                         search.extract_search_results_from_JSON(jsonl.iter_json_lines(path)))
+
+        expected = search.deduplicate_urls(json_data)
+        actual = search.deduplicate_urls(jsonl.iter_json_lines(path))
+        self.assertEqual(sorted(expected["deduplicated_urls"]), sorted(actual["deduplicated_urls"]))
+        self.assertEqual(expected["warnings"], actual["warnings"])
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_metrics
+----------------------------------
+Tests for `metrics` module.
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from coast_search import async_search
+from coast_search import clients
+from coast_search import metrics
+from coast_search import mock_server
+from coast_search import rate_limit
+from coast_search import search
+
+QUERY = '("software" OR "testing")'
+API_KEY = "AIzaSecretKey1234"
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        clients.set_root_url(None)
+
+    def test_histogram(self):
+        histogram = metrics.Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+
+        self.assertEqual([(0.1, 2), (1.0, 3), ("+Inf", 4)], histogram.cumulative())
+        self.assertEqual(4, histogram.count)
+        self.assertAlmostEqual(0.9125, histogram.to_dict()["mean"])
+
+    def test_key_totals(self):
+        run_metrics = metrics.Metrics()
+        run_metrics.observe_call(API_KEY, 1, 0.2, 500)
+        run_metrics.observe_call(API_KEY, 1, 0.3, error=True)
+        run_metrics.record_retry(API_KEY)
+        run_metrics.record_cache_hit(API_KEY)
+
+        self.assertEqual({"calls": 2, "errors": 1, "retries": 1, "cache_hits": 1, "quota_used": 1,
+                          "response_bytes": 500}, run_metrics.key_totals(API_KEY))
+
+    def test_key_is_masked(self):
+        label = metrics.key_label(API_KEY)
+        self.assertTrue(label.startswith("****1234-"))
+        run_metrics = metrics.Metrics()
+        run_metrics.observe_call(API_KEY, 3, 0.2, 500)
+        run_metrics.observe_write("backup", 0.001)
+        run_metrics.observe_segment(3, 1.5)
+        run_metrics.finish()
+
+        summary = run_metrics.summary()
+        self.assertEqual([label], list(summary["keys"]))
+        self.assertEqual(1, summary["keys"][label]["latency_seconds"]["3"]["count"])
+        self.assertEqual(1.5, summary["segment_seconds"]["3"])
+        self.assertEqual(1, summary["write_seconds"]["backup"]["count"])
+
+        text = run_metrics.prometheus_text({"study": "credibility"})
+        self.assertNotIn(API_KEY, text)
+        self.assertNotIn(API_KEY, json.dumps(summary))
+        self.assertIn('coast_search_calls_total{{study="credibility",api_key="{0}"}} 1'.format(label), text)
+        self.assertIn('coast_search_request_latency_seconds_bucket{{study="credibility",api_key="{0}",'
+                      'segment_id="3",le="0.25"}} 1'.format(label), text)
+        self.assertIn('coast_search_disk_write_seconds_count{study="credibility",target="backup"} 1', text)
+
+    def test_keys_ending_alike(self):
+        other_key = "AIzaOtherKey1234"
+        run_metrics = metrics.Metrics()
+        run_metrics.observe_call(API_KEY, 1, 0.2, 500)
+        run_metrics.observe_call(other_key, 1, 0.2, 700)
+
+        keys = run_metrics.summary()["keys"]
+        self.assertEqual(2, len(keys))
+        self.assertEqual(500, keys[metrics.key_label(API_KEY)]["response_bytes"])
+        self.assertEqual(700, keys[metrics.key_label(other_key)]["response_bytes"])
+
+        samples = [line for line in run_metrics.prometheus_text().splitlines()
+                   if line.startswith("coast_search_calls_total")]
+        self.assertEqual(2, len(set(samples)))
+
+    def test_write_files(self):
+        run_metrics = metrics.Metrics()
+        run_metrics.observe_call(API_KEY, 1, 0.2, 500)
+
+        summary_path = run_metrics.write_summary(os.path.join(self.directory, "summary.json"))
+        with open(summary_path) as ifile:
+            self.assertEqual(500, json.load(ifile)["keys"][metrics.key_label(API_KEY)]["response_bytes"])
+
+        textfile = run_metrics.write_prometheus(os.path.join(self.directory, "textfile", "coast_search.prom"))
+        with open(textfile) as ifile:
+            self.assertIn("# TYPE coast_search_calls_total counter", ifile.read())
+        self.assertEqual(["coast_search.prom"], os.listdir(os.path.dirname(textfile)))
+
+    @mock.patch("coast_search.rate_limit.RETRY_BACKOFF", 0)
+    def test_run_all_queries_retries(self):
+        query_dict_list = [{"segment_id": 2, "query": QUERY, "api_key": API_KEY, "search_engine_id": "cx"}]
+        run_metrics = metrics.Metrics()
+
+        with mock_server.MockSearchServer(error_rate=0.5, seed=1) as server:
+            clients.set_root_url(server.url)
+            results = search.run_all_queries(query_dict_list, 1, 50, 1, self.directory, 0,
+                                             run_metrics=run_metrics, max_retries=10)
+
+        self.assertEqual(5, len(results["results"][0]))
+        totals = run_metrics.key_totals(API_KEY)
+        self.assertEqual(5, totals["quota_used"])
+        self.assertEqual(server.stats["errors"], totals["retries"])
+        self.assertEqual(server.stats["calls"], totals["calls"])
+        self.assertGreater(totals["retries"], 0)
+        self.assertGreater(totals["response_bytes"], 0)
+        # a write for each page, and closing the backup file
+        self.assertEqual(6, run_metrics.summary()["write_seconds"]["backup"]["count"])
+
+    def test_failed_call_is_not_retried_by_default(self):
+        query_dict_list = [{"segment_id": 2, "query": QUERY, "api_key": API_KEY, "search_engine_id": "cx"}]
+
+        with mock_server.MockSearchServer(error_rate=1.0) as server:
+            clients.set_root_url(server.url)
+            self.assertRaises(Exception, search.run_all_queries, query_dict_list, 1, 10, 1, self.directory, 0)
+        self.assertEqual(1, server.stats["calls"])
+
+    @unittest.skipIf(importlib.util.find_spec("aiohttp") is None, "aiohttp is not installed")
+    @mock.patch("coast_search.rate_limit.RETRY_BACKOFF", 0)
+    def test_async_retries(self):
+        query_dict_list = [{"segment_id": 2, "query": QUERY, "api_key": API_KEY, "search_engine_id": "cx"}]
+        run_metrics = metrics.Metrics()
+
+        with mock_server.MockSearchServer(error_rate=0.5, seed=1) as server:
+            clients.set_root_url(server.url)
+            results = asyncio.run(async_search.run_all_queries_async(
+                query_dict_list, 1, 50, 1, self.directory, 0, run_metrics=run_metrics, max_retries=10))
+
+        self.assertEqual(5, len(results["results"][0]))
+        totals = run_metrics.key_totals(API_KEY)
+        self.assertEqual(5, totals["quota_used"])
+        self.assertEqual(server.stats["errors"], totals["retries"])
+        self.assertGreater(totals["retries"], 0)
+        self.assertGreater(totals["response_bytes"], 0)
+
+    def test_retry_delay(self):
+        self.assertTrue(rate_limit.is_retryable(429))
+        self.assertTrue(rate_limit.is_retryable(None))
+        self.assertFalse(rate_limit.is_retryable(400))
+        self.assertTrue(0.5 * rate_limit.RETRY_BACKOFF <= rate_limit.retry_delay(1) <= rate_limit.RETRY_BACKOFF)
+        self.assertLessEqual(rate_limit.retry_delay(20), rate_limit.MAX_RETRY_DELAY)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_mock_server
+----------------------------------
+Tests for `mock_server` module.
+"""
+import asyncio
+import importlib.util
+import shutil
+import tempfile
+import unittest
+
+from coast_search import async_search
+from coast_search import clients
+from coast_search import mock_server
+from coast_search import search
+
+QUERY = '("software" OR "testing")'
+
+
+class TestMockServer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        clients.set_root_url(None)
+
+    def test_response_is_repeatable(self):
+        first = mock_server.make_response(QUERY, "cx", 11)
+        self.assertEqual(first, mock_server.make_response(QUERY, "cx", 11))
+        self.assertNotEqual(first["items"], mock_server.make_response(QUERY, "other", 11)["items"])
+
+        self.assertEqual(10, len(first["items"]))
+        self.assertEqual(11, first["queries"]["request"][0]["startIndex"])
+        self.assertEqual(21, first["queries"]["nextPage"][0]["startIndex"])
+        self.assertIn("searchTime", first["searchInformation"])
+        self.assertIn("template", first["url"])
+
+    def test_last_page(self):
+        response = mock_server.make_response(QUERY, "cx", 91, total=95)
+        self.assertEqual(5, len(response["items"]))
+        self.assertNotIn("nextPage", response["queries"])
+
+        self.assertNotIn("items", mock_server.make_response(QUERY, "cx", 1, total=0))
+
+    def test_page_limit(self):
+        server = mock_server.MockSearchServer(max_results=20)
+        try:
+            self.assertEqual(200, server.respond("/customsearch/v1?q=a&cx=b&key=c&start=11")[0])
+            status, body = server.respond("/customsearch/v1?q=a&cx=b&key=c&start=21")
+            self.assertEqual(400, status)
+            self.assertEqual("INVALID_ARGUMENT", body["error"]["status"])
+            self.assertEqual(404, server.respond("/other?q=a&cx=b&key=c")[0])
+        finally:
+            server.stop()
+
+    def test_quota(self):
+        server = mock_server.MockSearchServer(quota=2)
+        try:
+            statuses = [server.respond("/customsearch/v1?q=a&cx=b&key=c")[0] for _ in range(3)]
+            self.assertEqual([200, 200, 429], statuses)
+            self.assertEqual(200, server.respond("/customsearch/v1?q=a&cx=b&key=other")[0])
+
+            server.reset_quota()
+            self.assertEqual(200, server.respond("/customsearch/v1?q=a&cx=b&key=c")[0])
+            self.assertEqual(1, server.stats["quota_exceeded"])
+        finally:
+            server.stop()
+
+    def test_errors_are_repeatable(self):
+        def statuses():
+            server = mock_server.MockSearchServer(error_rate=0.5, seed=3)
+            try:
+                return [server.respond("/customsearch/v1?q=a&cx=b&key=c&start={0}".format(start))[0]
+                        for start in range(1, 91, 10) for _ in range(3)]
+            finally:
+                server.stop()
+
+        first = statuses()
+        self.assertEqual(first, statuses())
+        self.assertIn(500, first)
+        self.assertIn(200, first)
+
+    def test_run_all_queries_against_server(self):
+        query_dict_list = [{"segment_id": 2, "query": QUERY, "api_key": "key", "search_engine_id": "cx"}]
+
+        with mock_server.MockSearchServer() as server:
+            clients.set_root_url(server.url)
+            results = search.run_all_queries(query_dict_list, 1, 30, 1, self.directory, 0)
+
+        pages = results["results"][0]
+        self.assertEqual(3, len(pages))
+        self.assertEqual(3, server.stats["served"])
+        expected = search.get_object_to_write({
+            "query": QUERY, "number_of_results": 30, "api_key": "key", "search_engine_id": "cx", "segment_id": 2,
+            "response": mock_server.make_response(QUERY, "cx", 21)
+        })
+        self.assertEqual(expected, pages[2])
+
+    def test_pool_root_url(self):
+        query_dict_list = [{"segment_id": 2, "query": QUERY, "api_key": "key", "search_engine_id": "cx"}]
+
+        with mock_server.MockSearchServer() as server:
+            pool = clients.ServicePool(root_url=server.url)
+            results = search.run_all_queries(query_dict_list, 1, 20, 1, self.directory, 0, pool=pool)
+            pool.clear()
+
+        self.assertEqual(2, len(results["results"][0]))
+        self.assertEqual(2, server.stats["served"])
+        self.assertEqual(clients.DEFAULT_ROOT_URL, clients.default_pool.root_url)
+
+    @unittest.skipIf(importlib.util.find_spec("aiohttp") is None, "aiohttp is not installed")
+    def test_async_pool_root_url(self):
+        query_dict_list = [{"segment_id": 2, "query": QUERY, "api_key": "key", "search_engine_id": "cx"}]
+
+        with mock_server.MockSearchServer() as server:
+            pool = clients.ServicePool(root_url=server.url)
+            results = asyncio.run(async_search.run_all_queries_async(query_dict_list, 1, 20, 1, self.directory, 0,
+                                                                     pool=pool))
+
+        self.assertEqual(2, len(results["results"][0]))
+        self.assertEqual(2, server.stats["served"])
+
+    @unittest.skipIf(importlib.util.find_spec("aiohttp") is None, "aiohttp is not installed")
+    def test_async_against_server(self):
+        query_dict_list = [{"segment_id": 2, "query": QUERY, "api_key": "key", "search_engine_id": "cx"}]
+
+        with mock_server.MockSearchServer(quota=2) as server:
+            clients.set_root_url(server.url)
+            results = asyncio.run(async_search.run_all_queries_async(query_dict_list, 1, 20, 1, self.directory, 0))
+            self.assertEqual(2, len(results["results"][0]))
+
+            # the quota is used up
+            self.assertRaises(Exception, asyncio.run,
+                              async_search.run_all_queries_async(query_dict_list, 1, 10, 1, self.directory, 0))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_planner
+----------------------------------
+Tests for `planner` module.
+"""
+import unittest
+
+from coast_search import planner
+
+
+class TestPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.one_key = [{"segment_id": seg, "api_key": "aaa", "se_name": "cse-1"} for seg in [2, 3, 4, 0, 1]]
+        self.two_keys = [
+            {"segment_id": 2, "api_key": "aaa", "se_name": "cse-1"},
+            {"segment_id": 0, "api_key": "aaa", "se_name": "cse-1"},
+            {"segment_id": 1, "api_key": "bbb", "se_name": "cse-2"}
+        ]
+
+    def test_calls_per_query(self):
+        self.assertEqual(1, planner.calls_per_query(1, 10))
+        self.assertEqual(6, planner.calls_per_query(2, 25))
+
+    def test_key_budget(self):
+        budget = planner.key_budget(self.two_keys, 2, 30)
+
+        self.assertEqual(12, budget["aaa"]["calls"])
+        self.assertEqual([2, 0], budget["aaa"]["segments"])
+        self.assertEqual(6, budget["bbb"]["calls"])
+        self.assertEqual(["cse-2"], budget["bbb"]["se_names"])
+
+    def test_key_budget_counts_variants(self):
+        variants = self.two_keys + [{"segment_id": 2, "api_key": "aaa", "se_name": "cse-1"}]
+        budget = planner.key_budget(variants, 2, 30)
+
+        self.assertEqual([2, 0], budget["aaa"]["segments"])
+        self.assertEqual(3, budget["aaa"]["queries"])
+        self.assertEqual(18, budget["aaa"]["calls"])
+
+    def test_within_quota(self):
+        plan = planner.plan_schedule(self.one_key, 2, 100, daily_quota=100)
+
+        self.assertEqual([[2, 3, 4, 0, 1]], plan["schedule"])
+        self.assertEqual([2, 3, 4, 0, 1], planner.segments_for_day(plan, 7))
+
+    def test_no_quota(self):
+        plan = planner.plan_schedule(self.one_key, 10, 100)
+
+        self.assertEqual(1, len(plan["schedule"]))
+
+    def test_refuse(self):
+        self.assertRaises(Exception, planner.plan_schedule, self.one_key, 3, 100, 100, planner.REFUSE)
+
+    def test_spread(self):
+        # each segment costs 30 calls, so three fit on a day
+        plan = planner.plan_schedule(self.one_key, 3, 100, 100, planner.SPREAD)
+
+        self.assertEqual([[2, 3, 4], [0, 1]], plan["schedule"])
+        self.assertEqual([2, 3, 4], planner.segments_for_day(plan, 1))
+        self.assertEqual([0, 1], planner.segments_for_day(plan, 2))
+        self.assertEqual([2, 3, 4], planner.segments_for_day(plan, 3))
+
+    def test_spread_keys_independently(self):
+        plan = planner.plan_schedule(self.two_keys, 6, 100, 100, planner.SPREAD)
+
+        self.assertEqual([[2, 1], [0]], plan["schedule"])
+
+    def test_spread_segment_too_large(self):
+        self.assertRaises(Exception, planner.plan_schedule, self.one_key, 11, 100, 100, planner.SPREAD)
+
+    def test_plan_for_config(self):
+        config = {"number_of_runs": 3, "number_of_results": 100, "daily_quota": 100, "quota_policy": "spread"}
+        plan = planner.plan_for_config(config, self.one_key)
+
+        self.assertEqual(2, len(plan["schedule"]))
@@ -146,3 +146,140 @@ class TestQueryGenerator(unittest.TestCase):
 
         expect_pass_border = query_generator.check_length("seed", "random", self.dimensions_dict, 26)
         self.assertTrue(expect_pass_border)
+
+    def test_iter_segments_order_and_ids(self):
+        dimensions_data = dict((name, {"pos": "(" + name + ")", "neg": "-" + name + " "}) for name in "abc")
+
+        expected = [
+            (2, "a + b + c", "(a) AND (b) AND (c)"),
+            (3, "a + b + !(c)", "(a) AND (b) -c "),
+            (4, "a + c + !(b)", "(a) AND (c) -b "),
+            (5, "b + c + !(a)", "(b) AND (c) -a "),
+            (6, "a + !(b + c)", "(a) -b -c "),
+            (7, "b + !(a + c)", "(b) -a -c "),
+            (8, "c + !(a + b)", "(c) -a -b "),
+            (0, "random + !(a + b + c)", '"r" -a -b -c '),
+            (1, "seed + !(a + b + c)", '"s" -a -b -c ')
+        ]
+
+        segments = list(query_generator.iter_segments(dimensions_data, ["a", "b", "c"], "s", "r"))
+        self.assertEqual(expected, [(seg["segment_id"], seg["logic"], seg["query"]) for seg in segments])
+        self.assertEqual(segments, query_generator.generate_result_list(dimensions_data, ["a", "b", "c"], "s", "r"))
+
+    def test_iter_segments_is_lazy(self):
+        names = ["d" + str(i) for i in range(20)]
+        dimensions_data = dict((name, {"pos": "(" + name + ")", "neg": "-" + name + " "}) for name in names)
+
+        segments = query_generator.iter_segments(dimensions_data, names, "s", "r")
+        self.assertEqual(" + ".join(names), next(segments)["logic"])
+        self.assertEqual(" + ".join(names[:-1]) + " + !(d19)", next(segments)["logic"])
+        self.assertEqual(2 ** 20 + 1, query_generator.count_segments(20))
+
+    def test_masks_with_bits(self):
+        for width in range(6):
+            for bits in range(width + 1):
+                expected = [mask for mask in range(1 << width) if bin(mask).count("1") == bits]
+                self.assertEqual(expected, list(query_generator._masks_with_bits(width, bits)))
+
+    def test_random_query_generator(self):
+        vocabulary = ["alpha", "beta", "gamma", "delta", "because", "example", "software"]
+        words_to_exclude = ["because", "for example", "software"]
+
+        generator = query_generator.RandomQueryGenerator(words_to_exclude, "study-a", vocabulary=vocabulary)
+        self.assertEqual(("alpha", "beta", "gamma", "delta"), generator.vocabulary)
+
+        query = generator.random_query()
+        words = query.strip('"').split(" ")
+        self.assertEqual(3, len(words))
+        self.assertEqual(3, len(set(words)))
+        self.assertTrue(set(words) <= set(generator.vocabulary))
+
+    def test_random_query_generator_repeatable_per_day(self):
+        first = query_generator.RandomQueryGenerator(["software"], "study-a")
+        second = query_generator.RandomQueryGenerator(["software"], "study-a")
+        other = query_generator.RandomQueryGenerator(["software"], "study-b")
+
+        year = first.queries_for_days(range(1, 366))
+        self.assertEqual(365, len(year))
+        self.assertEqual(year[200], second.query_for_day(200))
+        self.assertNotEqual(year, other.queries_for_days(range(1, 366)))
+        self.assertGreater(len(set(year.values())), 360)
+
+    def test_random_query_generator_too_few_words(self):
+        self.assertRaises(Exception, query_generator.RandomQueryGenerator, ["a"], vocabulary=["a", "b", "c"])
+
+    def test_generate_query_strings_with_random_seed(self):
+        first = query_generator.generate_query_strings_n_dimensions(self.dimensions_dict, "software", 50, "study", 4)
+        second = query_generator.generate_query_strings_n_dimensions(self.dimensions_dict, "software", 50, "study", 4)
+        self.assertEqual(first, second)
+
+    def test_chunk_phrases(self):
+        phrases = ["because", "for example", "however", "in my experience"]
+        self.assertEqual([["because", "for example"], ["however"], ["in my experience"]],
+                         query_generator.chunk_phrases(phrases, 3))
+        self.assertEqual([phrases], query_generator.chunk_phrases(phrases, 7))
+        self.assertRaises(Exception, query_generator.chunk_phrases, phrases, 2)
+
+    def test_segment_variants_unchanged_when_they_fit(self):
+        expected = query_generator.generate_query_strings_n_dimensions(self.dimensions_dict, "software", 32,
+                                                                       "study", 2)
+        split = query_generator.generate_query_strings_n_dimensions(self.dimensions_dict, "software", 32,
+                                                                    "study", 2, split=True)
+        self.assertEqual(expected, split)
+
+    def test_segment_variants_fit_key_max(self):
+        self.assertRaises(Exception, query_generator.generate_query_strings_n_dimensions, self.dimensions_dict,
+                          "software", 10, "study", 2)
+
+        variants = query_generator.generate_query_strings_n_dimensions(self.dimensions_dict, "software", 10,
+                                                                       "study", 2, split=True)
+        for variant in variants:
+            words = variant["query"].replace(" OR ", " ").replace(" AND ", " ").split()
+            self.assertLessEqual(len(words), 10)
+
+        # every segment is still searched, in the same order
+        segment_ids = []
+        for variant in variants:
+            if variant["segment_id"] not in segment_ids:
+                segment_ids.append(variant["segment_id"])
+        self.assertEqual([2, 3, 4, 5, 6, 7, 8, 0, 1], segment_ids)
+
+    def test_segment_variants_tags(self):
+        dimensions_dict = {
+            "reasoning": ["because", "however", "but", "so"],
+            "topic": ["software", "testing"]
+        }
+        variants = list(query_generator.iter_segment_variants(dimensions_dict, "software", "a b c", 4))
+        by_segment = {}
+        for variant in variants:
+            by_segment.setdefault(variant["segment_id"], []).append(variant)
+
+        # reasoning AND topic: 2 reasoning chunks, each with the whole topic
+        self.assertEqual(['("because" OR "however") AND ("software" OR "testing")',
+                          '("but" OR "so") AND ("software" OR "testing")'],
+                         [variant["query"] for variant in by_segment[2]])
+        self.assertEqual([0, 1], [variant["variant"]["group"] for variant in by_segment[2]])
+
+        # reasoning AND NOT topic: the 2 excluded words fit in every variant
+        self.assertEqual([(0, 0, 1), (1, 0, 1)],
+                         [(variant["variant"]["group"], variant["variant"]["negative_chunk"],
+                           variant["variant"]["negative_chunks"]) for variant in by_segment[3]])
+
+        # the seed, with the 6 excluded words split over 2 variants of the same group
+        seed_variants = by_segment[1]
+        self.assertEqual(2, len(seed_variants))
+        self.assertEqual([{"index": 0, "count": 2, "group": 0, "negative_chunk": 0, "negative_chunks": 2},
+                          {"index": 1, "count": 2, "group": 0, "negative_chunk": 1, "negative_chunks": 2}],
+                         [variant["variant"] for variant in seed_variants])
+        self.assertTrue(all(variant["query"].startswith('"software" -') for variant in seed_variants))
+
+    def test_add_api_config_to_variants_per_segment(self):
+        variants = query_generator.generate_query_strings_n_dimensions(
+            {"topic": ["credibility", "assessment", "trust", "quality"]}, "software", 4, "study", 2, split=True)
+        self.assertGreater(len(variants), 3)
+
+        query_generator.add_api_config_to_queries(variants, self.three_search_engines)
+        engines = {}
+        for variant in variants:
+            engines.setdefault(variant["segment_id"], set()).add(variant["se_name"])
+        self.assertEqual({2: {"cse-1"}, 0: {"cse-2"}, 1: {"cse-3"}}, engines)
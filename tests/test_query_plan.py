@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_query_plan
+----------------------------------
+Tests for `query_plan` module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from coast_search import query_generator
+from coast_search import query_plan
+from coast_search import utils
+
+
+class TestQueryPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.directory, "plans")
+        source = os.path.join(os.path.dirname(__file__), "test_data/search_dimensions/")
+        self.dimension_files = []
+        for name in ["reasoning.txt", "experience.txt", "topic.txt"]:
+            shutil.copy(os.path.join(source, name), self.directory)
+            self.dimension_files.append(os.path.join(self.directory, name))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        utils.clear_file_cache()
+
+    def test_matches_generated_queries(self):
+        dimensions_dict = utils.get_from_file_list(self.dimension_files)
+        expected = query_generator.generate_query_strings_n_dimensions(dimensions_dict, "software", 32, "study", 3)
+
+        plan = query_plan.load_plan(self.cache_dir, self.dimension_files, "software", 32)
+        self.assertEqual(expected, query_plan.queries_for_day(plan, "study", 3))
+
+        # the random phrase is the only part that changes between days
+        other_day = query_plan.queries_for_day(plan, "study", 4)
+        self.assertNotEqual(expected[-2]["query"], other_day[-2]["query"])
+        self.assertEqual(expected[:-2] + expected[-1:], other_day[:-2] + other_day[-1:])
+
+    def test_plan_is_cached(self):
+        first = query_plan.load_plan(self.cache_dir, self.dimension_files)
+        self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+        with mock.patch("coast_search.query_plan.compile_plan") as compile_plan:
+            self.assertEqual(first, query_plan.load_plan(self.cache_dir, self.dimension_files))
+        compile_plan.assert_not_called()
+
+    def test_key_changes_with_inputs(self):
+        key = query_plan.plan_key(self.dimension_files, "software", 32)
+        self.assertEqual(key, query_plan.plan_key(self.dimension_files, "software", 32))
+        self.assertNotEqual(key, query_plan.plan_key(self.dimension_files, "testing", 32))
+        self.assertNotEqual(key, query_plan.plan_key(self.dimension_files, "software", 30))
+        self.assertNotEqual(key, query_plan.plan_key(self.dimension_files[:2], "software", 32))
+
+        with open(self.dimension_files[2], "a") as ofile:
+            ofile.write("\nquality")
+        self.assertNotEqual(key, query_plan.plan_key(self.dimension_files, "software", 32))
+
+    def test_too_many_words(self):
+        plan = query_plan.load_plan(self.cache_dir, self.dimension_files, "software", 15)
+        self.assertRaises(Exception, query_plan.queries_for_day, plan, "study", 1)
+
+    def test_split_plan(self):
+        dimensions_dict = utils.get_from_file_list(self.dimension_files)
+        expected = query_generator.generate_query_strings_n_dimensions(dimensions_dict, "software", 15, "study", 1,
+                                                                       split=True)
+
+        plan = query_plan.load_plan(self.cache_dir, self.dimension_files, "software", 15, split=True)
+        self.assertNotEqual(query_plan.plan_key(self.dimension_files, "software", 15),
+                            query_plan.plan_key(self.dimension_files, "software", 15, True))
+        self.assertEqual(expected, query_plan.queries_for_day(plan, "study", 1))
+
+    def test_truncated_plan_is_compiled_again(self):
+        plan = query_plan.load_plan(self.cache_dir, self.dimension_files)
+        path = os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0])
+        with open(path, "w") as ofile:
+            ofile.write('{"segments": [')
+        self.assertEqual(plan, query_plan.load_plan(self.cache_dir, self.dimension_files))
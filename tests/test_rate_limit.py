@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_rate_limit
+----------------------------------
+Tests for `rate_limit` module.
+"""
+import unittest
+
+from time import monotonic
+
+from coast_search import rate_limit
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def test_bucket_spaces_calls(self):
+        bucket = rate_limit.TokenBucket(20, 1)
+
+        started = monotonic()
+        for i in range(5):
+            bucket.acquire()
+        elapsed = monotonic() - started
+
+        # first call is free, the other four wait 1/20th of a second each
+        self.assertGreaterEqual(elapsed, 0.19)
+
+    def test_bucket_allows_burst(self):
+        bucket = rate_limit.TokenBucket(1, 3)
+
+        started = monotonic()
+        for i in range(3):
+            bucket.acquire()
+
+        self.assertLess(monotonic() - started, 0.5)
+
+    def test_no_rate_disables_limiting(self):
+        bucket = rate_limit.TokenBucket(None)
+
+        started = monotonic()
+        for i in range(100):
+            bucket.acquire()
+
+        self.assertLess(monotonic() - started, 0.5)
+
+    def test_invalid_capacity(self):
+        self.assertRaises(Exception, rate_limit.TokenBucket, 1, 0)
+
+    def test_get_limiter_per_key(self):
+        first = rate_limit.get_limiter("test-key-a", "cx-a", 2)
+        second = rate_limit.get_limiter("test-key-a", "cx-a", 2)
+        other = rate_limit.get_limiter("test-key-b", "cx-a", 2)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual(0.5, first.rate)
+
+        rate_limit.get_limiter("test-key-a", "cx-a", 0)
+        self.assertIsNone(first.rate)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_records
+----------------------------------
+Tests for `records` module.
+"""
+import os
+import unittest
+
+from coast_search import records
+from coast_search import search
+from coast_search import utils
+
+
+class TestRecords(unittest.TestCase):
+
+    def setUp(self):
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        path = os.path.join(cwd, "test_data/results_for_testing_extraction.json")
+        self.json_data = utils.get_json_from_file(path)
+        self.items = list(search.iter_result_items(self.json_data))
+
+    def test_page_round_trip(self):
+        pages = list(records.iter_pages(self.items))
+        self.assertEqual(self.items, [page.to_dict() for page in pages])
+
+    def test_links_only_stored_when_different(self):
+        item = dict(self.items[0])
+        item["links"] = [res["link"] for res in item["results"]]
+        page = records.SearchPage.from_dict(item)
+        self.assertIsNone(page._links)
+        self.assertEqual(item["links"], page.links)
+        self.assertEqual(item, page.to_dict())
+
+    def test_variant_round_trip(self):
+        item = dict(self.items[0])
+        item["variant"] = {"index": 1, "count": 2, "group": 0, "negative_chunk": 1, "negative_chunks": 2}
+        page = records.SearchPage.from_dict(item)
+        self.assertEqual(item["variant"], page.variant)
+        self.assertEqual(item, page.to_dict())
+        self.assertNotIn("variant", records.SearchPage.from_dict(self.items[0]).to_dict())
+
+    def test_meta_shared_between_pages(self):
+        # a second page of the same segment
+        pages = list(records.iter_pages([self.items[0], dict(self.items[0])]))
+        self.assertIs(pages[0].meta, pages[1].meta)
+        self.assertIs(pages[0].hits[0].meta, pages[1].hits[0].meta)
+
+    def test_hits_match_extracted_results(self):
+        hits = search.extract_search_hits(self.json_data)
+        expected = search.extract_search_results_from_JSON(self.json_data)["search_results"]
+        self.assertEqual(expected, [hit.to_dict() for hit in hits])
+
+    def test_records_have_no_dict(self):
+        page = list(records.iter_pages(self.items))[0]
+        for record in [page, page.meta, page.requests[0], page.hits[0]]:
+            self.assertFalse(hasattr(record, "__dict__"))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_response_cache
+----------------------------------
+Tests for `response_cache` module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from coast_search import rate_limit
+from coast_search import response_cache
+from coast_search import search
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.sqlite")
+        self.response = {"items": [{"title": "a", "link": "https://example.com/" + "a" * 200}]}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hit_and_miss(self):
+        cache = response_cache.ResponseCache(self.path)
+
+        self.assertIsNone(cache.get("software", "cx", 1, 3, 0))
+        cache.put("software", "cx", 1, 3, 0, self.response)
+
+        self.assertEqual(self.response, cache.get("software", "cx", 1, 3, 0))
+        self.assertIsNone(cache.get("software", "cx", 1, 3, 1))
+        self.assertIsNone(cache.get("software", "cx", 1, 4, 0))
+
+        stats = cache.stats()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(3, stats["misses"])
+        self.assertEqual(1, stats["entries"])
+        cache.close()
+
+    def test_persists_between_instances(self):
+        cache = response_cache.ResponseCache(self.path)
+        cache.put("software", "cx", 1, 3, 0, self.response)
+        cache.close()
+
+        cache = response_cache.ResponseCache(self.path)
+        self.assertEqual(self.response, cache.get("software", "cx", 1, 3, 0))
+        cache.close()
+
+    def test_ttl(self):
+        cache = response_cache.ResponseCache(self.path, ttl=60)
+        cache.put("software", "cx", 1, 3, 0, self.response)
+
+        with mock.patch("coast_search.response_cache.time", return_value=response_cache.time() + 120):
+            self.assertIsNone(cache.get("software", "cx", 1, 3, 0))
+
+        self.assertEqual(0, cache.stats()["entries"])
+        cache.close()
+
+    def test_size_cap_evicts_oldest(self):
+        cache = response_cache.ResponseCache(self.path, max_bytes=1)
+        cache.put("software", "cx", 1, 3, 0, self.response)
+        cache.put("software", "cx", 11, 3, 0, self.response)
+
+        stats = cache.stats()
+        self.assertEqual(0, stats["entries"])
+        self.assertEqual(0, stats["bytes"])
+
+        cache.max_bytes = 10000
+        cache.put("software", "cx", 1, 3, 0, self.response)
+        cache.put("software", "cx", 11, 3, 0, self.response)
+        self.assertEqual(2, cache.stats()["entries"])
+        cache.close()
+
+    def test_query_page_uses_cache(self):
+        cache = response_cache.ResponseCache(self.path)
+        service = mock.Mock()
+        service.cse.return_value.list.return_value.execute.return_value = self.response
+        limiter = rate_limit.TokenBucket(None)
+
+        with mock.patch("coast_search.clients.get_service", return_value=service):
+            first = search.query_page("software", 10, "key", "cx", 2, 1, limiter, cache, 3, 0)
+            second = search.query_page("software", 10, "key", "cx", 2, 1, limiter, cache, 3, 0)
+
+        self.assertEqual(first, second)
+        self.assertEqual(1, service.cse.return_value.list.return_value.execute.call_count)
+        cache.close()
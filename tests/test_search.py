@@ -9,9 +9,12 @@ Tests for `search` module.
 
 import unittest
 import os
+from unittest import mock
 
+from coast_search import rate_limit
 from coast_search import search
 from coast_search import utils
+from tests.fakes import FakeService
 
 
 class TestSearch(unittest.TestCase):
@@ -105,3 +108,63 @@ class TestSearch(unittest.TestCase):
         self.assertEqual("same url found across more than 1 segment", deduplicated_urls_object["warnings"]["message"])
         self.assertEqual("https://app.rexsoftware.com/login", deduplicated_urls_object["warnings"]["occurrences"][0]["url"])
         self.assertEqual(sorted([2, 1]), sorted(deduplicated_urls_object["warnings"]["occurrences"][0]["segments"]))
+
+    def test_page_starts(self):
+        self.assertEqual([1], list(search.page_starts(10)))
+        self.assertEqual([1, 11, 21], list(search.page_starts(25)))
+
+    def test_queryAPI_pages_in_order(self):
+        service = FakeService()
+        limiter = rate_limit.TokenBucket(None)
+
+        with mock.patch("coast_search.clients.get_service", return_value=service):
+            results = search.queryAPI("software", 50, "key", "cx", 2, limiter)
+
+        self.assertEqual([1, 11, 21, 31, 41],
+                         [res["response"]["queries"]["request"][0]["startIndex"] for res in results])
+        self.assertEqual(sorted(service.starts), [1, 11, 21, 31, 41])
+        self.assertEqual({2}, set(res["segment_id"] for res in results))
+
+    def test_queryAPI_error(self):
+        service = mock.Mock()
+        service.cse.return_value.list.return_value.execute.side_effect = ValueError("quota exceeded")
+        limiter = rate_limit.TokenBucket(None)
+
+        with mock.patch("coast_search.clients.get_service", return_value=service):
+            self.assertRaises(Exception, search.queryAPI, "software", 10, "key", "cx", 2, limiter)
+
+    def test_deduplicate_urls_segments_per_url(self):
+        json_data = {"results": [
+            [{"segment_id": 2, "links": ["https://a.com", "https://b.com", "https://a.com"]}],
+            [{"segment_id": 3, "links": ["https://a.com", "https://c.com"]}],
+            [{"segment_id": 4, "links": ["https://b.com", "https://a.com"]},
+             {"segment_id": 4, "links": ["https://d.com"]}]
+        ]}
+
+        deduplicated_urls_object = search.deduplicate_urls(json_data)
+
+        self.assertEqual(["https://a.com", "https://b.com", "https://c.com", "https://d.com"],
+                         deduplicated_urls_object["deduplicated_urls"])
+        self.assertEqual([{"url": "https://a.com", "segments": [2, 3, 4]},
+                          {"url": "https://b.com", "segments": [2, 4]}],
+                         deduplicated_urls_object["warnings"]["occurrences"])
+
+    def test_merge_segment_variants(self):
+        def item(segment_id, links, group=None, negative_chunk=0, negative_chunks=1):
+            obj = {"segment_id": segment_id, "links": links}
+            if group is not None:
+                obj["variant"] = {"group": group, "negative_chunk": negative_chunk,
+                                  "negative_chunks": negative_chunks}
+            return obj
+
+        items = [
+            item(2, ["a", "b"]),
+            item(2, ["b", "c"]),
+            # each group excluded half of the segment's excluded words
+            item(1, ["x", "y", "z"], 0, 0, 2),
+            item(1, ["y", "z"], 0, 1, 2),
+            item(1, ["w", "x"], 1, 0, 2),
+            item(1, ["x"], 1, 1, 2)
+        ]
+
+        self.assertEqual({2: ["a", "b", "c"], 1: ["y", "z", "x"]}, search.merge_segment_variants(items))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_streaming
+----------------------------------
+Tests for `streaming` module.
+"""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from coast_search import jsonl
+from coast_search import search
+from coast_search import streaming
+from coast_search import utils
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        cwd = os.path.dirname(os.path.abspath(__file__))
+        self.test_data_folder_location = os.path.join(cwd, "test_data/")
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fixture(self, filename):
+        return os.path.join(self.test_data_folder_location, filename)
+
+    def test_items_match_json_load(self):
+        for filename in ["results_for_testing_extraction.json", "results_for_testing_dedup_between_seg.json"]:
+            path = self.fixture(filename)
+            expected = list(search.iter_result_items(utils.get_json_from_file(path)))
+
+            # a tiny chunk size makes every value cross a chunk boundary
+            self.assertEqual(expected, list(streaming.iter_results_file(path, chunk_size=7)))
+            self.assertEqual(expected, list(streaming.iter_results_file(path)))
+
+    def test_other_keys_and_numbers(self):
+        path = os.path.join(self.directory, "results.json.gz")
+        data = {"day": 12345, "meta": {"a": [1, 2.5, None, True]}, "results": [[{"n": 1}, {"n": 2}], [], [{"n": 3}]],
+                "after": "x"}
+        with gzip.open(path, "wt") as ofile:
+            json.dump(data, ofile)
+
+        self.assertEqual([{"n": 1}, {"n": 2}, {"n": 3}], list(streaming.iter_results_file(path, chunk_size=3)))
+
+    def test_jsonl_file(self):
+        path = os.path.join(self.directory, "results.jsonl.gz")
+        with jsonl.JsonLinesWriter(path) as writer:
+            writer.write({"n": 1})
+
+        self.assertEqual([{"n": 1}], list(streaming.iter_results_file(path)))
+
+    def test_invalid_file(self):
+        path = os.path.join(self.directory, "results.json")
+        with open(path, "w") as ofile:
+            ofile.write('{"results": [[{"n": 1}')
+
+        self.assertRaises(ValueError, list, streaming.iter_results_file(path))
+
+    def test_iter_search_results(self):
+        path = self.fixture("results_for_testing_extraction.json")
+        expected = search.extract_search_results_from_JSON(utils.get_json_from_file(path))["search_results"]
+
+        self.assertEqual(expected, list(search.iter_search_results(path)))
+
+    def test_deduplicate_urls_stream(self):
+        path = self.fixture("results_for_testing_dedup_between_seg.json")
+        expected = search.deduplicate_urls(utils.get_json_from_file(path))
+        actual = search.deduplicate_urls_stream(path)
+
+        self.assertEqual(sorted(expected["deduplicated_urls"]), sorted(actual["deduplicated_urls"]))
+        self.assertEqual(expected["warnings"], actual["warnings"])
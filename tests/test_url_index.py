@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_url_index
+----------------------------------
+Tests for `url_index` module.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from coast_search import search
+from coast_search import url_index
+from tests.fakes import FakeService
+
+
+class TestUrlIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "index", url_index.DEFAULT_FILENAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_new_and_seen_across_days(self):
+        index = url_index.UrlIndex(self.path)
+        self.assertEqual(url_index.NEW, index.add("https://example.com/a", 1, 2))
+        self.assertEqual(url_index.NEW, index.add("https://example.com/a", 1, 3))
+        self.assertEqual(url_index.SEEN, index.add("https://example.com/a", 2, 2))
+        self.assertEqual(url_index.NEW, index.add("https://example.com/b", 2, 2))
+        index.close()
+
+        # the index persists between runs
+        index = url_index.UrlIndex(self.path)
+        self.assertEqual({"url": "https://example.com/a", "first_day": 1, "last_day": 2, "segments": [2, 3]},
+                         index.lookup("https://example.com/a"))
+        self.assertIsNone(index.lookup("https://example.com/c"))
+
+        self.assertTrue(index.seen_before("https://example.com/a", 2))
+        self.assertFalse(index.seen_before("https://example.com/a", 1))
+        self.assertFalse(index.seen_before("https://example.com/c", 2))
+        self.assertEqual(url_index.SEEN, index.status("https://example.com/a", 3))
+        self.assertEqual(url_index.NEW, index.status("https://example.com/b", 2))
+
+        self.assertEqual(["https://example.com/a"], index.new_urls(1))
+        self.assertEqual(["https://example.com/b"], index.new_urls(2))
+        self.assertEqual(1, index.count_new(2))
+        self.assertEqual(0, index.count_new(3))
+        self.assertEqual(2, len(index))
+        index.close()
+
+    def test_days_added_out_of_order(self):
+        with url_index.UrlIndex(self.path) as index:
+            index.add("https://example.com/a", 5, 1)
+            index.add("https://example.com/a", 3, 1)
+            entry = index.lookup("https://example.com/a")
+        self.assertEqual((3, 5), (entry["first_day"], entry["last_day"]))
+
+    def test_add_result(self):
+        with url_index.UrlIndex(self.path) as index:
+            index.add("https://example.com/old", 1, 1)
+            new_links = index.add_result({"segment_id": 4, "links": ["https://example.com/old",
+                                                                     "https://example.com/new"]}, 2)
+        self.assertEqual(["https://example.com/new"], new_links)
+
+    def test_index_path(self):
+        self.assertEqual(os.path.join("out", url_index.DEFAULT_FILENAME),
+                         url_index.index_path({"results_output_dir": "out"}))
+        self.assertEqual("index.sqlite", url_index.index_path({"results_output_dir": "out",
+                                                               "url_index_file": "index.sqlite"}))
+
+    def test_run_all_queries_updates_index(self):
+        query_dict_list = [{"segment_id": 2, "query": '("software")', "api_key": "key", "search_engine_id": "cx"}]
+        backup_dir = os.path.join(self.directory, "backup")
+
+        with url_index.UrlIndex(self.path) as index:
+            with mock.patch("coast_search.clients.get_service", return_value=FakeService()):
+                search.run_all_queries(query_dict_list, 1, 20, 6, backup_dir, 0, index=index)
+            self.assertEqual(sorted("https://example.com/cx/" + str(i) for i in range(1, 21)),
+                             sorted(index.new_urls(6)))
+            self.assertEqual([2], index.lookup("https://example.com/cx/11")["segments"])
+
+    def test_run_all_queries_merges_variants(self):
+        def variant(query, negative_chunk):
+            return {"segment_id": 2, "query": query, "api_key": "key", "search_engine_id": "cx",
+                    "variant": {"index": negative_chunk, "count": 2, "group": 0, "negative_chunk": negative_chunk,
+                                "negative_chunks": 2}}
+
+        # each variant excluded half of the segment's excluded words
+        query_dict_list = [variant("first", 0), variant("second", 1)]
+        service = FakeService(links={"first": ["https://a.com", "https://b.com"],
+                                     "second": ["https://b.com", "https://c.com"]})
+        backup_dir = os.path.join(self.directory, "backup")
+
+        with url_index.UrlIndex(self.path) as index:
+            with mock.patch("coast_search.clients.get_service", return_value=service):
+                results = search.run_all_queries(query_dict_list, 1, 10, 6, backup_dir, 0, index=index)
+            self.assertEqual(["https://b.com"], index.new_urls(6))
+            self.assertIsNone(index.lookup("https://a.com"))
+
+        self.assertEqual({2: ["https://b.com"]}, search.merge_segment_variants(results))
+        self.assertEqual(["https://b.com"], search.deduplicate_urls(results)["deduplicated_urls"])
+        self.assertEqual(["https://b.com"],
+                         [hit["url"] for hit in search.extract_search_results_from_JSON(results)["search_results"]])
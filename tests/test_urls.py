@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_urls
+----------------------------------
+Tests for `urls` module.
+"""
+import unittest
+
+from coast_search import search
+from coast_search import urls
+
+
+def make_item(segment_id, links):
+    return {"segment_id": segment_id, "links": links}
+
+
+class TestUrls(unittest.TestCase):
+
+    def test_canonicaliser_default_rules(self):
+        canonicaliser = urls.Canonicaliser()
+        expected = "https://example.com/page"
+        variants = [
+            "https://example.com/page",
+            "http://example.com/page",
+            "https://www.example.com/page",
+            "https://example.com/page/",
+            "https://example.com/page#section",
+            "https://EXAMPLE.com:443/page",
+            "http://www.example.com/page/?utm_source=news&utm_medium=email#top"
+        ]
+        for url in variants:
+            self.assertEqual(canonicaliser(url), expected)
+
+    def test_canonicaliser_keeps_other_params(self):
+        canonicaliser = urls.Canonicaliser()
+        self.assertEqual(canonicaliser("https://example.com/search?q=a%20b&utm_campaign=x&page=2"),
+                         "https://example.com/search?q=a%20b&page=2")
+        self.assertEqual(canonicaliser("https://example.com:8080/"), "https://example.com:8080/")
+
+    def test_canonicaliser_rules_can_be_turned_off(self):
+        canonicaliser = urls.Canonicaliser(https=False, www=False, trailing_slash=False, fragment=False,
+                                           tracking_params=False, sort_query=True)
+        self.assertEqual(canonicaliser("http://www.example.com/page/?utm_source=x&b=2&a=1#top"),
+                         "http://www.example.com/page/?a=1&b=2&utm_source=x#top")
+
+    def test_canonicaliser_leaves_relative_urls(self):
+        self.assertEqual(urls.Canonicaliser()(" /relative/path "), "/relative/path")
+
+    def test_canonicaliser_from_config(self):
+        self.assertIsNone(urls.canonicaliser_from_config(None))
+        self.assertIsNone(urls.canonicaliser_from_config(False))
+        self.assertIsInstance(urls.canonicaliser_from_config(True), urls.Canonicaliser)
+        self.assertFalse(urls.canonicaliser_from_config({"www": False}).www)
+
+    def test_url_hash(self):
+        value = urls.url_hash("https://example.com/page")
+        self.assertEqual(value, urls.url_hash("https://example.com/page"))
+        self.assertNotEqual(value, urls.url_hash("https://example.com/other"))
+        self.assertTrue(0 <= value < 2 ** 64)
+
+    def test_deduplicate_urls_with_canonicaliser(self):
+        data = [
+            make_item(1, ["http://www.example.com/a/", "https://example.com/b"]),
+            make_item(2, ["https://example.com/a#x"])
+        ]
+        self.assertEqual(search.deduplicate_urls(data)["deduplicated_urls"],
+                         ["http://www.example.com/a/", "https://example.com/b", "https://example.com/a#x"])
+
+        output = search.deduplicate_urls(data, canonicaliser=urls.Canonicaliser())
+        self.assertEqual(output["deduplicated_urls"], ["https://example.com/a", "https://example.com/b"])
+        self.assertEqual(output["warnings"]["occurrences"], [{"url": "https://example.com/a", "segments": [1, 2]}])
+
+        # the canonical urls are returned whether or not they are compared by hash
+        self.assertEqual(output, search.deduplicate_urls(data, canonicaliser=urls.Canonicaliser(), hash_keys=True))
+
+    def test_deduplicate_urls_hash_keys(self):
+        data = [
+            make_item(1, ["https://example.com/a", "https://example.com/b"]),
+            make_item(2, ["https://example.com/a"])
+        ]
+        self.assertEqual(search.deduplicate_urls(data, hash_keys=True), search.deduplicate_urls(data))
+
+        output = search.deduplicate_urls(data, hash_keys=True, url_table=False)
+        self.assertEqual(output["deduplicated_urls"],
+                         [urls.url_hash("https://example.com/a"), urls.url_hash("https://example.com/b")])
+        self.assertEqual(output["warnings"]["occurrences"][0]["url"], urls.url_hash("https://example.com/a"))
+
+    def test_get_object_to_write_canonicalises_links(self):
+        result = {
+            "response": {
+                "items": [{"title": "A", "link": "http://www.example.com/a/?utm_source=x"}],
+                "queries": {"request": []},
+                "searchInformation": {"totalResults": "1", "searchTime": 0.1},
+                "url": {"template": ""}
+            },
+            "segment_id": 1,
+            "query": "a",
+            "number_of_results": 10,
+            "api_key": "key",
+            "search_engine_id": "cx"
+        }
+        obj = search.get_object_to_write(result, urls.Canonicaliser())
+        self.assertEqual(obj["links"], ["https://example.com/a"])
+        self.assertEqual(obj["results"][0]["link"], "http://www.example.com/a/?utm_source=x")
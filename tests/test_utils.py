@@ -7,7 +7,10 @@ test_utils
 Tests for `utils` module.
 """
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
 from coast_search import utils
 
@@ -31,4 +34,24 @@ class TestUtils(unittest.TestCase):
         actual_dict = utils.get_from_file_list(file_list)
         self.assertEqual(actual_dict, expected_dict)
 
-
+    def test_get_from_file_cached(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "topic.txt")
+            with open(path, "w") as ofile:
+                ofile.write('software\n"testing"\n')
+
+            expected = utils.get_from_file(path)
+            with mock.patch("coast_search.utils.get_from_file", wraps=utils.get_from_file) as read:
+                self.assertEqual(expected, utils.get_from_file_cached(path))
+                self.assertEqual(expected, utils.get_from_file_cached(path))
+                self.assertEqual(1, read.call_count)
+
+                # a changed file is read again
+                with open(path, "w") as ofile:
+                    ofile.write("software\ntesting\nquality\n")
+                self.assertEqual(["software", "testing", "quality"], utils.get_from_file_cached(path))
+                self.assertEqual(2, read.call_count)
+        finally:
+            utils.clear_file_cache()
+            shutil.rmtree(directory)
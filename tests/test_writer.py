@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_writer
+----------------------------------
+Tests for `writer` module.
+"""
+import threading
+import unittest
+
+from coast_search import writer
+
+
+class ListWriter(object):
+    """Collects records, optionally blocking on an event or failing on a given record."""
+
+    def __init__(self, fail_on=None, gate=None):
+        self.path = "memory"
+        self.records = []
+        self.closed = False
+        self.fail_on = fail_on
+        self.gate = gate
+
+    def write(self, record):
+        if self.gate is not None:
+            self.gate.wait()
+        if record == self.fail_on:
+            raise IOError("disk full")
+        self.records.append(record)
+
+    def close(self):
+        self.closed = True
+
+
+class TestWriter(unittest.TestCase):
+
+    def test_writes_in_order(self):
+        target = ListWriter()
+        background = writer.BackgroundWriter(target)
+        for i in range(100):
+            background.write(i)
+        background.close()
+
+        self.assertEqual(list(range(100)), target.records)
+        self.assertTrue(target.closed)
+        self.assertEqual("memory", background.path)
+
+    def test_flush(self):
+        target = ListWriter()
+        background = writer.BackgroundWriter(target)
+        background.write("a")
+        background.flush()
+
+        self.assertEqual(["a"], target.records)
+        background.close()
+
+    def test_back_pressure(self):
+        gate = threading.Event()
+        background = writer.BackgroundWriter(ListWriter(gate=gate), maxsize=2)
+
+        # the thread holds one record while blocked, and the queue holds two more
+        for i in range(3):
+            background.write(i)
+
+        blocked = threading.Thread(target=background.write, args=(3,))
+        blocked.start()
+        blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+
+        gate.set()
+        blocked.join(1)
+        self.assertFalse(blocked.is_alive())
+        background.close()
+
+    def test_errors_are_raised(self):
+        target = ListWriter(fail_on=1)
+        background = writer.BackgroundWriter(target)
+        background.write(0)
+        background.write(1)
+        background.write(2)
+
+        self.assertRaises(Exception, background.close)
+        self.assertEqual([0], target.records)
+        self.assertTrue(target.closed)
+        self.assertRaises(Exception, background.write, 3)